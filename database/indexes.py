@@ -0,0 +1,196 @@
+"""Index provisioning and query-shape audit for the users collection.
+
+Users and rooms share one collection and are told apart by their "type" field.
+Every index below is partial on that type, so each index only holds the
+documents its queries can match. A query only uses a partial index when its
+filter includes the same type condition, so every filter in Server names the
+type it looks for.
+"""
+
+from typing import Dict, List
+
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+
+USER_FILTER = {"type": "user"}
+ROOM_FILTER = {"type": "room"}
+
+INDEXES = [
+    {
+        "name": "type",
+        "keys": [("type", ASCENDING)],
+    },
+    {
+        "name": "user_username",
+        "keys": [("username", ASCENDING)],
+        "unique": True,
+        "partialFilterExpression": USER_FILTER,
+    },
+    {
+        "name": "user_email",
+        "keys": [("email", ASCENDING)],
+        "unique": True,
+        "partialFilterExpression": USER_FILTER,
+    },
+    {
+        "name": "room_name_outer_ip",
+        "keys": [("name", ASCENDING), ("outer_ip", ASCENDING)],
+        "partialFilterExpression": ROOM_FILTER,
+    },
+    {
+        "name": "room_outer_ip_inner_ip",
+        "keys": [("outer_ip", ASCENDING), ("inner_ip", ASCENDING)],
+        "partialFilterExpression": ROOM_FILTER,
+    },
+    {
+        "name": "room_inner_ip",
+        "keys": [("inner_ip", ASCENDING)],
+        "partialFilterExpression": ROOM_FILTER,
+    },
+]
+
+# Every query shape Server sends, with the index expected to serve it.
+# (handlers, filter, index name)
+QUERY_SHAPES = [
+    (
+        [
+            "user_by_username",
+            "get_user_profile",
+            "update_controls",
+            "update_music",
+            "update_settings",
+            "update_online",
+            "on_connection",
+            "handle_invite",
+            "accept_friend",
+            "remove_friend",
+            "send_friend_request",
+            "add_game",
+            "update_sprint",
+            "update_marathon",
+            "update_apm",
+            "update_outer_ip",
+        ],
+        {"type": "user", "username": "x"},
+        "user_username",
+    ),
+    (
+        # The unique username index finds the one candidate, the password is
+        # then checked on the fetched document
+        ["user_matches_password"],
+        {"type": "user", "username": "x", "password": "x"},
+        "user_username",
+    ),
+    (
+        ["email_exists", "update_user_email"],
+        {"type": "user", "email": "x"},
+        "user_email",
+    ),
+    (
+        ["user_matches_password", "is_password_new"],
+        {"type": "user", "email": "x", "password": "x"},
+        "user_email",
+    ),
+    (
+        ["update_controls (all users)"],
+        {"type": "user"},
+        "type",
+    ),
+    (
+        ["get_rooms"],
+        {"type": "room"},
+        "type",
+    ),
+    (
+        ["get_players_in_room"],
+        {"type": "room", "name": "x", "outer_ip": "x"},
+        "room_name_outer_ip",
+    ),
+    (
+        ["delete_server_by_name", "delete_rooms", "delete_room"],
+        {"type": "room", "name": "x"},
+        "room_name_outer_ip",
+    ),
+    (
+        ["delete_server_by_ip", "update_player_num"],
+        {"type": "room", "outer_ip": "x", "inner_ip": "x"},
+        "room_outer_ip_inner_ip",
+    ),
+    (
+        ["get_server_by_ip"],
+        {"type": "room", "outer_ip": "x"},
+        "room_outer_ip_inner_ip",
+    ),
+    (
+        ["get_server_by_ip"],
+        {"type": "room", "inner_ip": "x"},
+        "room_inner_ip",
+    ),
+    (
+        ["get_free_server", "finished_using_server"],
+        {"_id": 0},
+        "_id_",
+    ),
+]
+
+
+def ensure_indexes(collection, indexes=INDEXES):
+    """Creates any missing index. Existing indexes with the same spec are left as is."""
+    for index in indexes:
+        options = {key: value for key, value in index.items() if key != "keys"}
+        try:
+            collection.create_index(index["keys"], **options)
+        except OperationFailure as e:
+            # Existing data breaking a unique constraint shouldn't stop the server from starting
+            print(f"Couldn't create index {index['name']}: {e}")
+
+
+def winning_index(plan: Dict):
+    """Returns the name of the index a winning plan uses, or None for a collection scan"""
+    if "indexName" in plan:
+        return plan["indexName"]
+    if plan.get("stage") == "IDHACK":
+        return "_id_"
+    for child_key in ("inputStage", "queryPlan"):
+        if child_key in plan:
+            return winning_index(plan[child_key])
+    for child in plan.get("inputStages", []):
+        index_name = winning_index(child)
+        if index_name:
+            return index_name
+    return None
+
+
+def audit_queries(collection) -> List[Dict]:
+    """Explains every query shape Server sends, and reports the index each one actually uses"""
+    report = []
+    for handlers, query_filter, expected in QUERY_SHAPES:
+        plan = collection.find(query_filter).explain()["queryPlanner"]["winningPlan"]
+        used = winning_index(plan)
+        report.append(
+            {
+                "handlers": handlers,
+                "filter": sorted(query_filter),
+                "expected": expected,
+                "used": used or "COLLSCAN",
+                "ok": used == expected,
+            }
+        )
+    return report
+
+
+def print_report(report: List[Dict]):
+    for entry in report:
+        status = "ok" if entry["ok"] else "MISMATCH"
+        print(
+            f"[{status}] {entry['filter']} -> {entry['used']} "
+            f"(expected {entry['expected']}): {', '.join(entry['handlers'])}"
+        )
+
+
+if __name__ == "__main__":
+    from server import create_mongo_client
+
+    users = create_mongo_client()["tetris"]["users"]
+    ensure_indexes(users)
+    print_report(audit_queries(users))
@@ -0,0 +1,136 @@
+"""Materialized leaderboards.
+
+Every leaderboard lives in the leaderboards collection as one entry per user
+with a numeric score, kept in order by the (board, score) index. The stat
+update routes write the entry along with the user, so reading a board is a
+walk over the index instead of loading and sorting every user.
+"""
+from typing import Dict, List
+
+from pymongo import ASCENDING, DESCENDING
+
+SPRINT_LINES = (20, 40, 100, 1000)
+# The levels a marathon can start on
+MARATHON_LEVELS = range(10)
+# Page bounds for board reads, so a response never grows with the user count
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+LEADERBOARD_INDEXES = [
+    {
+        "name": "board_score",
+        "keys": [("board", ASCENDING), ("score", ASCENDING)],
+    },
+    {
+        "name": "board_username",
+        "keys": [("board", ASCENDING), ("username", ASCENDING)],
+        "unique": True,
+    },
+]
+
+
+def sprint_board(line_num) -> str:
+    return f"sprint_{int(line_num)}"
+
+
+def board_direction(board: str) -> int:
+    """Sprints rank the lowest time first, everything else the highest score"""
+    return ASCENDING if board.startswith("sprint_") else DESCENDING
+
+
+def board_field(board: str) -> str:
+    """Returns the key the board's score is shown under in the api response"""
+    if board.startswith("sprint_"):
+        return f"{board[len('sprint_'):]}l"
+    return board
+
+
+def board_from_score_type(score_type: str) -> str:
+    """Returns the board for a score type as the client names it, e.g. apm or 40l"""
+    if score_type.endswith("l"):
+        return sprint_board(score_type[:-1])
+    return score_type
+
+
+def sprint_time_to_seconds(time_str: str) -> float:
+    time_str = time_str.split(":")
+    seconds = 0
+    # Time str to secs
+    for i in range(len(time_str)):
+        seconds += float(time_str[-i - 1]) * 60 ** i
+    return seconds
+
+
+def set_score(leaderboards, board: str, username: str, score: float, display=None):
+    """Puts a user's score on a board, replacing their previous one"""
+    leaderboards.update_one(
+        {"board": board, "username": username},
+        {
+            "$set": {
+                "score": score,
+                "display": score if display is None else display,
+            }
+        },
+        upsert=True,
+    )
+
+
+def get_board(
+    leaderboards, board: str, offset: int = 0, limit: int = DEFAULT_PAGE_SIZE
+) -> List[Dict]:
+    """Returns a page of a board's entries, best first, in the api's response format"""
+    field = board_field(board)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    entries = (
+        leaderboards.find({"board": board}, {"_id": 0, "username": 1, "display": 1})
+        .sort([("score", board_direction(board))])
+        .skip(max(0, offset))
+        .limit(limit)
+    )
+    return [
+        {"username": entry["username"], field: entry["display"]} for entry in entries
+    ]
+
+
+def get_rank(leaderboards, board: str, username: str, radius: int = 5) -> Dict:
+    """Returns a user's rank on a board along with the entries around them.
+    The rank is None for users who aren't on the board."""
+    entry = leaderboards.find_one({"board": board, "username": username})
+    if not entry:
+        return {"rank": None, "offset": 0, "entries": []}
+
+    better = "$lt" if board_direction(board) == ASCENDING else "$gt"
+    # Counting the better scores walks the (board, score) index
+    ahead = leaderboards.count_documents(
+        {"board": board, "score": {better: entry["score"]}}
+    )
+    radius = max(0, min(radius, MAX_PAGE_SIZE // 2))
+    offset = max(0, ahead - radius)
+    return {
+        "rank": ahead + 1,
+        "offset": offset,
+        "entries": get_board(leaderboards, board, offset, ahead - offset + radius + 1),
+    }
+
+
+def rebuild_leaderboards(users, leaderboards):
+    """Fills the boards from the user documents. Users without a score stay off the board."""
+    leaderboards.delete_many({})
+    for user in users.find(
+        {"type": "user"},
+        {"_id": 0, "username": 1, "apm": 1, "marathon": 1, "sprint": 1},
+    ):
+        username = user["username"]
+        if user.get("apm", 0) != 0:
+            set_score(leaderboards, "apm", username, user["apm"])
+        if user.get("marathon", 0) != 0:
+            set_score(leaderboards, "marathon", username, user["marathon"])
+        for line_num, time_str in zip(SPRINT_LINES, user.get("sprint", [])):
+            if time_str != "0":
+                set_score(
+                    leaderboards,
+                    sprint_board(line_num),
+                    username,
+                    sprint_time_to_seconds(time_str),
+                    time_str,
+                )
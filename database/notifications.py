@@ -0,0 +1,65 @@
+"""Server push channel.
+
+Clients keep a websocket open on /notifications, signed in with their username
+and password, and the server pushes them events as json messages instead of
+having them poll:
+- {"type": "section", "section", "version", "data"}: a new copy of one of the
+  home screen cache sections, under the same name and version /bootstrap uses.
+- {"type": "invite", "inviter", "invite_ip", "invite_room"}
+- {"type": "friend_request", "sender"}
+
+Routes run on worker threads, so publishing hands the sends over to the event
+loop the websockets live on.
+"""
+
+import asyncio
+from typing import Dict, Iterable, Optional, Set
+
+from fastapi import WebSocket
+
+
+class NotificationHub:
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.connections: Dict[str, Set[WebSocket]] = {}
+
+    async def connect(self, username: str, websocket: WebSocket):
+        await websocket.accept()
+        self.loop = asyncio.get_running_loop()
+        self.connections.setdefault(username, set()).add(websocket)
+
+    def disconnect(self, username: str, websocket: WebSocket):
+        websockets = self.connections.get(username, set())
+        websockets.discard(websocket)
+        if not websockets:
+            self.connections.pop(username, None)
+
+    def has_listeners(self) -> bool:
+        return bool(self.connections)
+
+    def is_connected(self, username: str) -> bool:
+        return username in self.connections
+
+    def publish(self, event: Dict, usernames: Optional[Iterable[str]] = None):
+        """Sends an event to the given users, or to everyone connected. Safe to call from any thread."""
+        if not self.loop or not self.connections:
+            return
+        asyncio.run_coroutine_threadsafe(
+            self.send(event, None if usernames is None else list(usernames)),
+            self.loop,
+        )
+
+    async def send(self, event: Dict, usernames: Optional[list]):
+        if usernames is None:
+            usernames = list(self.connections)
+        for username in usernames:
+            for websocket in list(self.connections.get(username, ())):
+                try:
+                    await websocket.send_json(event)
+                except Exception:
+                    # The receive loop of a dead connection cleans it up
+                    pass
+
+
+def section_event(section: str, version: int, data) -> Dict:
+    return {"type": "section", "section": section, "version": version, "data": data}
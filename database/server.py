@@ -1,32 +1,138 @@
+import json
 import os
 import random
 import time
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Tuple
 
 import pygame
 import uvicorn
 import yagmail
-from fastapi import Depends, FastAPI
+from fastapi import Depends, FastAPI, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from fastapi_utils.cbv import cbv
 from fastapi_utils.inferring_router import InferringRouter
 from pymongo import *
+from pymongo.errors import DuplicateKeyError, PyMongoError
 from requests import get
 
+from indexes import ensure_indexes
+from leaderboards import (
+    DEFAULT_PAGE_SIZE,
+    LEADERBOARD_INDEXES,
+    SPRINT_LINES,
+    board_field,
+    board_from_score_type,
+    get_board,
+    get_rank,
+    rebuild_leaderboards,
+    set_score,
+    sprint_board,
+    sprint_time_to_seconds,
+)
+from notifications import NotificationHub, section_event
+from verification import (
+    MAX_REPLAY_SIZE,
+    ReplayVerifier,
+    issue_seed,
+    rejected,
+    replay_hash,
+)
+from versions import ROOMS, bump, get_versions, profile_resource, profile_username
+from write_queue import WRITE_APPLIED, WRITE_FAILED, WRITE_REJECTED
+
 app = FastAPI()
 router = InferringRouter()
 
 pass_resets = {}
+notification_hub = NotificationHub()
+replay_verifier = ReplayVerifier()
 
 
-def get_collection():
+# Connection pool bounds for the process-wide client, tunable per deployment
+MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", 50))
+MONGO_MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", 5))
+# "mongomock" swaps the real cluster for an in-memory one, for local testing
+MONGO_BACKEND = os.environ.get("MONGO_BACKEND", "pymongo")
+
+mongo_client = None
+
+
+def create_mongo_client():
+    """Returns a new client for the configured backend"""
+    if MONGO_BACKEND == "mongomock":
+        import mongomock
+
+        return mongomock.MongoClient()
+
     pass_text = os.environ.get("MONGODB", get_mongo_pass)
     # In case we aren't running in heroku
     if callable(pass_text):
         pass_text = pass_text()
-    client = MongoClient(pass_text)
-    db = client["tetris"]
-    user_collection = db["users"]
-    return user_collection
+    return MongoClient(
+        pass_text,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+    )
+
+
+@app.on_event("startup")
+def open_mongo_client():
+    global mongo_client
+    if mongo_client is None:
+        mongo_client = create_mongo_client()
+        users = mongo_client["tetris"]["users"]
+        leaderboards = mongo_client["tetris"]["leaderboards"]
+        ensure_indexes(users)
+        ensure_indexes(leaderboards, LEADERBOARD_INDEXES)
+        # Backfill the boards the first time the server runs with them
+        if leaderboards.estimated_document_count() == 0:
+            rebuild_leaderboards(users, leaderboards)
+
+
+@app.on_event("shutdown")
+def close_mongo_client():
+    global mongo_client
+    if mongo_client is not None:
+        mongo_client.close()
+        mongo_client = None
+
+
+@app.on_event("shutdown")
+def close_replay_verifier():
+    replay_verifier.close()
+
+
+def get_collection():
+    """Returns the users collection, backed by the single pooled client"""
+    # Requests may arrive before the startup event in some runners
+    open_mongo_client()
+    return mongo_client["tetris"]["users"]
+
+
+def get_leaderboard_collection():
+    """Returns the materialized leaderboards collection"""
+    open_mongo_client()
+    return mongo_client["tetris"]["leaderboards"]
+
+
+def get_version_collection():
+    """Returns the per-resource version counters"""
+    open_mongo_client()
+    return mongo_client["tetris"]["versions"]
+
+
+def get_replay_collection():
+    """Returns the verdicts of every replay sent, by the replay's hash"""
+    open_mongo_client()
+    return mongo_client["tetris"]["replays"]
+
+
+def get_seed_collection():
+    """Returns every seed a game was counted on, by the player and the seed"""
+    open_mongo_client()
+    return mongo_client["tetris"]["seeds"]
 
 
 def get_mongo_pass():
@@ -38,9 +144,25 @@ def get_mongo_pass():
 class Server:
     SERVERS_QUERY = {"_id": 0}
     SPRINTS = {20: 0, 40: 1, 100: 2, 1000: 3}
+    # The writes clients may batch through /users/bulk
+    BULK_OPERATIONS = (
+        "add_game",
+        "update_controls",
+        "update_music",
+        "update_online",
+        "update_player_num",
+        "update_settings",
+        "on_connection",
+    )
+    # How many of a user's latest game ids are kept, to recognize a game that was sent twice
+    COUNTED_GAMES = 50
 
     def __init__(self):
         self.user_collection: Depends = Depends(get_collection)
+        self.leaderboard_collection: Depends = Depends(get_leaderboard_collection)
+        self.version_collection: Depends = Depends(get_version_collection)
+        self.replay_collection: Depends = Depends(get_replay_collection)
+        self.seed_collection: Depends = Depends(get_seed_collection)
         self.email = os.environ.get("GMAIL", self.get_email)
         self.email_pass = os.environ.get("PASSWORD", self.get_password)
         # In case we aren't running in heroku
@@ -59,6 +181,56 @@ class Server:
         with open(r"./resources/gmail.txt", "r") as email_file:
             return email_file.read()
 
+    def changed(self, *resources):
+        """Bumps the version of every resource a write touched"""
+        bump(self.version_collection.dependency(), *resources)
+        if notification_hub.has_listeners():
+            self.push_changes(resources)
+
+    def push_changes(self, resources):
+        """Pushes the new copy of each changed resource to the clients showing it"""
+        current = get_versions(self.version_collection.dependency(), resources)
+        for resource in resources:
+            username = profile_username(resource)
+            if resource == ROOMS:
+                notification_hub.publish(
+                    section_event("rooms", current[resource], self.load_rooms())
+                )
+            elif username is not None:
+                # Only the user themselves caches their own profile
+                if notification_hub.is_connected(username):
+                    notification_hub.publish(
+                        section_event(
+                            "user",
+                            current[resource],
+                            self.load_user_profile(username),
+                        ),
+                        [username],
+                    )
+            else:
+                entries = get_board(self.leaderboard_collection.dependency(), resource)
+                notification_hub.publish(
+                    section_event(
+                        f"{board_field(resource)}_leaderboard",
+                        current[resource],
+                        entries,
+                    )
+                )
+
+    def conditional_get(self, request: Request, resource: str, loader, variant=""):
+        """Answers 304 when the client's ETag is the resource's current version.
+        Otherwise loads the resource and tags the response with that version.
+        variant tells apart responses with other parts of the resource, e.g. pages."""
+        version = get_versions(self.version_collection.dependency(), [resource])
+        tag = f"{resource}:{version[resource]}"
+        if variant:
+            tag += f":{variant}"
+        etag = f'"{tag}"'
+        client_etags = request.headers.get("if-none-match", "")
+        if etag in [tag.strip() for tag in client_etags.split(",")]:
+            return Response(status_code=304, headers={"ETag": etag})
+        return JSONResponse(jsonable_encoder(loader()), headers={"ETag": etag})
+
     @router.get("/users/rooms/players")
     def get_players_in_room(self, room_name, outer_ip):
         room = self.user_collection.dependency().find_one(
@@ -73,12 +245,14 @@ class Server:
 
         for server in servers:
             self.user_collection.dependency().find_one_and_delete(filter=server)
+        self.changed(ROOMS)
 
     @router.post("/users/server/del-by-ip")
     def delete_server_by_ip(self, outer_ip: str, inner_ip: str):
         self.user_collection.dependency().find_one_and_delete(
             {"type": "room", "outer_ip": outer_ip, "inner_ip": inner_ip}
         )
+        self.changed(ROOMS)
 
     @router.get("/users/server/ip")
     def get_server_by_ip(self, ip: str):
@@ -92,8 +266,9 @@ class Server:
         return room
 
     @router.post("/users/update-all/controls")
-    def update_controls(self):
-        self.user_collection.dependency().update_many(
+    def reset_controls(self):
+        users = self.user_collection.dependency()
+        users.update_many(
             {"type": "user"},
             {
                 "$set": {
@@ -107,28 +282,40 @@ class Server:
                 }
             },
         )
+        # Every profile changed
+        self.changed(
+            *(
+                profile_resource(user["username"])
+                for user in users.find({"type": "user"}, {"username": 1})
+            )
+        )
 
     @router.post("/users/delete-rooms")
     def delete_rooms(self):
-        rooms = self.user_collection.dependency().find({"name": "hadar759's room"})
+        rooms = self.user_collection.dependency().find(
+            {"type": "room", "name": "hadar759's room"}
+        )
 
         for room in rooms:
             self.user_collection.dependency().find_one_and_delete(
-                {"name": "hadar759's room"}
+                {"type": "room", "name": "hadar759's room"}
             )
+        self.changed(ROOMS)
 
     @router.post("/users/controls")
     def update_controls(self, controls: Dict):
         username = controls.pop("username")
         self.user_collection.dependency().find_one_and_update(
-            {"username": username}, {"$set": {"controls": controls}}
+            {"type": "user", "username": username}, {"$set": {"controls": controls}}
         )
+        self.changed(profile_resource(username))
 
     @router.post("/users/music")
     def update_music(self, username: str, music: bool):
         self.user_collection.dependency().find_one_and_update(
-            {"username": username}, {"$set": {"music": music}}
+            {"type": "user", "username": username}, {"$set": {"music": music}}
         )
+        self.changed(profile_resource(username))
 
     @router.post("/users/settings")
     def update_settings(
@@ -138,89 +325,55 @@ class Server:
             "$set": {"DAS": das, "ARR": arr, "skin": skin, "ghost": ghost, "fade": fade}
         }
         self.user_collection.dependency().find_one_and_update(
-            {"username": username}, update_query
+            {"type": "user", "username": username}, update_query
         )
+        self.changed(profile_resource(username))
 
     @router.post("/users/friends/accept")
     def accept_friend(self, sender, recipient):
-        receiving_user = self.user_by_username(recipient)
-        sending_user = self.user_by_username(sender)
-
-        received_requests = receiving_user["requests_received"]
-        received_requests.remove(sender)
-        received_friends = receiving_user["friends"]
-        received_friends.append(sender)
-        receiving_update = {
-            "$set": {
-                "requests_received": received_requests,
-                "friends": received_friends,
-            }
-        }
-
-        sent_requests = sending_user["requests_sent"]
-        sent_requests.remove(recipient)
-        sender_friends = sending_user["friends"]
-        sender_friends.append(recipient)
-        sending_update = {
-            "$set": {"requests_sent": sent_requests, "friends": sender_friends}
-        }
-
         self.user_collection.dependency().update_one(
-            filter={"username": recipient}, update=receiving_update
+            filter={"type": "user", "username": recipient},
+            update={
+                "$pull": {"requests_received": sender},
+                "$addToSet": {"friends": sender},
+            },
         )
         self.user_collection.dependency().update_one(
-            filter={"username": sender}, update=sending_update
+            filter={"type": "user", "username": sender},
+            update={
+                "$pull": {"requests_sent": recipient},
+                "$addToSet": {"friends": recipient},
+            },
         )
+        self.changed(profile_resource(recipient), profile_resource(sender))
 
     # TODO: make friends list, make accepting and declining requests, check if triple / link works
     @router.post("/users/friends/remove")
     def remove_friend(self, sender, recipient):
-        receiving_user = self.user_by_username(recipient)
-        sending_user = self.user_by_username(sender)
-
-        if sender in receiving_user["requests_received"]:
-            received_requests = receiving_user["requests_received"]
-            received_requests.remove(sender)
-            receiving_update = {"$set": {"requests_received": received_requests}}
-
-            sent_requests = sending_user["requests_sent"]
-            sent_requests.remove(recipient)
-            sending_update = {"$set": {"requests_sent": sent_requests}}
-
-        else:
-            receiving_friends = receiving_user["friends"]
-            receiving_friends.remove(sender)
-            receiving_update = {"$set": {"friends": receiving_friends}}
-
-            sending_friends = sending_user["friends"]
-            sending_friends.remove(recipient)
-            sending_update = {"$set": {"friends": sending_friends}}
-
+        # Removes either a pending request or a friendship, whichever there is
         self.user_collection.dependency().update_one(
-            filter={"username": recipient}, update=receiving_update
+            filter={"type": "user", "username": recipient},
+            update={"$pull": {"requests_received": sender, "friends": sender}},
         )
         self.user_collection.dependency().update_one(
-            filter={"username": sender}, update=sending_update
+            filter={"type": "user", "username": sender},
+            update={"$pull": {"requests_sent": recipient, "friends": recipient}},
         )
+        self.changed(profile_resource(recipient), profile_resource(sender))
 
     @router.post("/users/friends/send")
     def send_friend_request(self, sender, recipient):
-        receiving_user = self.user_by_username(recipient)
-        sending_user = self.user_by_username(sender)
-
-        received_requests = receiving_user["requests_received"]
-        received_requests.append(sender)
-        receiving_update = {"$set": {"requests_received": received_requests}}
-
-        sent_requests = sending_user["requests_sent"]
-        sent_requests.append(recipient)
-        sending_update = {"$set": {"requests_sent": sent_requests}}
-
         self.user_collection.dependency().update_one(
-            filter={"username": recipient}, update=receiving_update
+            filter={"type": "user", "username": recipient},
+            update={"$addToSet": {"requests_received": sender}},
         )
         self.user_collection.dependency().update_one(
-            filter={"username": sender}, update=sending_update
+            filter={"type": "user", "username": sender},
+            update={"$addToSet": {"requests_sent": recipient}},
+        )
+        self.changed(profile_resource(recipient), profile_resource(sender))
+        notification_hub.publish(
+            {"type": "friend_request", "sender": sender}, [recipient]
         )
 
     # TODO test how much time this takes, and then implement it in the friends screen
@@ -229,13 +382,20 @@ class Server:
         user = self.user_by_username(username)
         friends = []
         for friend in user["friends"]:
-            friends.append(self.get_user_profile(friend))
+            friends.append(self.load_user_profile(friend))
         return friends
 
     @router.get("/users/profile")
-    def get_user_profile(self, username):
+    def get_user_profile(self, request: Request, username):
+        return self.conditional_get(
+            request,
+            profile_resource(username),
+            lambda: self.load_user_profile(username),
+        )
+
+    def load_user_profile(self, username):
         return self.user_collection.dependency().find_one(
-            {"username": username},
+            {"type": "user", "username": username},
             {
                 "_id": 0,
                 "username": 1,
@@ -258,93 +418,240 @@ class Server:
         )
 
     @router.get("/users/apms")
-    def get_apm_leaderboard(self):
-        """Returns all users sorted by highest apm"""
-        users = list(
-            self.user_collection.dependency().find(
-                {"type": "user"}, {"_id": 0, "username": 1, "apm": 1}
-            )
-        )
-        return [
-            user
-            for user in sorted(users, key=lambda user: user["apm"])[::-1]
-            if user["apm"] != 0
-        ]
+    def get_apm_leaderboard(
+        self, request: Request, offset: int = 0, limit: int = DEFAULT_PAGE_SIZE
+    ):
+        """Returns a page of users sorted by highest apm"""
+        return self.conditional_get_board(request, "apm", offset, limit)
 
     @router.get("/users/marathons")
-    def get_marathon_leaderboard(self):
-        """Returns all users sorted by highest marathon score"""
-        users = list(
-            self.user_collection.dependency().find(
-                {"type": "user"}, {"_id": 0, "username": 1, "marathon": 1}
-            )
-        )
-        # Sort users by marathon score, discard any users without a marathon score
-        return [
-            user
-            for user in sorted(users, key=lambda user: user["marathon"])[::-1]
-            if user["marathon"] != 0
-        ]
+    def get_marathon_leaderboard(
+        self, request: Request, offset: int = 0, limit: int = DEFAULT_PAGE_SIZE
+    ):
+        """Returns a page of users sorted by highest marathon score"""
+        return self.conditional_get_board(request, "marathon", offset, limit)
 
     @router.get("/users/sprints")
-    def get_sprint_leaderboard(self, line_num):
-        """Returns all users sorted by fastest sprint time"""
-        users = list(
-            self.user_collection.dependency().find(
-                {"type": "user"}, {"_id": 0, "username": 1, "sprint": 1}
+    def get_sprint_leaderboard(
+        self,
+        request: Request,
+        line_num,
+        offset: int = 0,
+        limit: int = DEFAULT_PAGE_SIZE,
+    ):
+        """Returns a page of users sorted by fastest sprint time"""
+        return self.conditional_get_board(
+            request, sprint_board(line_num), offset, limit
+        )
+
+    def conditional_get_board(self, request: Request, board, offset, limit):
+        return self.conditional_get(
+            request,
+            board,
+            lambda: get_board(
+                self.leaderboard_collection.dependency(), board, offset, limit
+            ),
+            # Every page of the board has a tag of it's own
+            variant=f"{offset}:{limit}",
+        )
+
+    @router.get("/users/rank")
+    def get_leaderboard_rank(self, score_type: str, username: str, radius: int = 5):
+        """Returns a user's rank on a leaderboard, and the users ranked around them"""
+        return get_rank(
+            self.leaderboard_collection.dependency(),
+            board_from_score_type(score_type),
+            username,
+            radius,
+        )
+
+    @router.get("/bootstrap")
+    def bootstrap(self, username: str, versions: str = "{}"):
+        """Returns everything the home screen shows in one response.
+        versions maps each section the client holds to its version, and
+        sections the client already has at the current version are left out."""
+        try:
+            known = json.loads(versions)
+        except ValueError:
+            known = None
+        if not isinstance(known, dict):
+            return JSONResponse(
+                {"detail": "versions must be a json object"}, status_code=400
+            )
+        leaderboards = self.leaderboard_collection.dependency()
+        loaders = {
+            "apm_leaderboard": ("apm", lambda: get_board(leaderboards, "apm")),
+            "marathon_leaderboard": (
+                "marathon",
+                lambda: get_board(leaderboards, "marathon"),
+            ),
+            "rooms": (ROOMS, self.load_rooms),
+            "user": (
+                profile_resource(username),
+                lambda: self.load_user_profile(username),
+            ),
+        }
+        for line_num in SPRINT_LINES:
+            board = sprint_board(line_num)
+            loaders[f"{line_num}l_leaderboard"] = (
+                board,
+                lambda board=board: get_board(leaderboards, board),
             )
-        )
-        print(users)
-        line_index = self.SPRINTS[int(line_num)]
-
-        def sprint_filter(user):
-            return self.sprint_time_to_int(user["sprint"][line_index])
 
-        # Sort the users, discard all without a score, and only save the relevant score
-        # This line does too much but I like list comprehensions too much so i'll keep it lol
-        sorted_users = [
-            {"username": user["username"], f"{line_num}l": user["sprint"][line_index]}
-            for user in sorted(users, key=sprint_filter)
-            if user["sprint"][line_index] != "0"
-        ]
-        return sorted_users
+        current = get_versions(
+            self.version_collection.dependency(),
+            [resource for resource, _ in loaders.values()],
+        )
+        section_versions = {}
+        sections = {}
+        for section, (resource, loader) in loaders.items():
+            section_versions[section] = current[resource]
+            if known.get(section) != current[resource]:
+                sections[section] = loader()
+        return {"versions": section_versions, "sections": sections}
+
+    @router.post("/users/bulk")
+    def bulk_update(self, writes: List[Dict]) -> List[str]:
+        """Applies a batch of queued client writes in order, each on it's own so one bad
+        write doesn't stop the rest. Returns the result of every write."""
+        return [self.apply_write(write) for write in writes]
+
+    def apply_write(self, write: Dict) -> str:
+        op = write.get("op")
+        if op not in self.BULK_OPERATIONS:
+            print(f"Skipping unknown bulk write {op}")
+            return WRITE_REJECTED
+        try:
+            getattr(self, op)(**write.get("args", {}))
+        except (TypeError, KeyError, ValueError) as e:
+            print(f"Rejected bulk write {op}: {e!r}")
+            return WRITE_REJECTED
+        except PyMongoError as e:
+            print(f"Bulk write {op} failed: {e!r}")
+            return WRITE_FAILED
+        return WRITE_APPLIED
 
     @router.post("/users/rooms/delete")
     def delete_room(self, room_name):
         self.user_collection.dependency().find_one_and_delete(
             filter={"type": "room", "name": room_name}
         )
+        self.changed(ROOMS)
 
     @router.post("/users/rooms/player-num")
     def update_player_num(self, outer_ip, inner_ip, player_num):
         self.user_collection.dependency().find_one_and_update(
-            {"outer_ip": outer_ip, "inner_ip": inner_ip},
+            {"type": "room", "outer_ip": outer_ip, "inner_ip": inner_ip},
             update={"$set": {"player_num": int(player_num)}},
         )
+        self.changed(ROOMS)
 
     @router.post("/users/rooms")
     def create_room(self, room: Dict):
         self.user_collection.dependency().insert_one(room)
+        self.changed(ROOMS)
 
     @router.get("/users/rooms")
-    def get_rooms(self):
+    def get_rooms(self, request: Request):
+        return self.conditional_get(request, ROOMS, self.load_rooms)
+
+    def load_rooms(self):
         rooms = self.user_collection.dependency().find({"type": "room"}, {"_id": 0})
         return list(rooms)
 
     @router.post("/users/games")
-    def add_game(self, username: str, win: bool):
-        """Updates the game and win count for a user"""
-        user = self.user_by_username(username)
-        # Add a game played to the user's query
-        new_query = {"games": user["games"] + 1}
-        # Add a win to the user's query
-        if win:
-            new_query["wins"] = user["wins"] + 1
-        self.user_collection.dependency().update_one(
-            filter={"username": username}, update={"$set": new_query}
-        )
-
-    @router.post("/users/sprint")
+    def add_game(self, username: str, win: bool, game_id: Optional[str] = None):
+        """Updates the game and win count for a user.
+        A game sent with an id is only ever counted once."""
+        query = {"type": "user", "username": username}
+        update = {"$inc": {"games": 1, "wins": int(win)}}
+        if game_id is not None:
+            query["counted_games"] = {"$ne": game_id}
+            update["$push"] = {
+                "counted_games": {"$each": [game_id], "$slice": -self.COUNTED_GAMES}
+            }
+        self.user_collection.dependency().update_one(filter=query, update=update)
+        self.changed(profile_resource(username))
+
+    @router.get("/games/seed")
+    def get_seed(self) -> str:
+        """Returns a seed to play a game on, only games played on one are verified"""
+        return issue_seed()
+
+    @router.post("/replays")
+    async def submit_replay(self, username: str, password: str, request: Request):
+        """Verifies a finished game's replay, and puts the score the replay really got on the
+        leaderboards. Returns the verdict, along with whether it's a new top score."""
+        user = await run_in_threadpool(self.user_matches_password, username, password)
+        if not user:
+            return JSONResponse(
+                {"detail": "Wrong username or password"}, status_code=401
+            )
+        username = user["username"]
+        data = await request.body()
+        if len(data) > MAX_REPLAY_SIZE:
+            return JSONResponse({"detail": "Replay too large"}, status_code=413)
+
+        digest = replay_hash(data)
+        cached = await run_in_threadpool(
+            self.replay_collection.dependency().find_one, {"_id": digest}
+        )
+        if cached:
+            return {**cached["verdict"], "new_top": False}
+
+        verdict = await replay_verifier.verify(digest, data)
+        if verdict is None:
+            return JSONResponse(
+                {"detail": "Too many replays waiting to be verified"}, status_code=503
+            )
+        verdict, new_top = await run_in_threadpool(
+            self.apply_verdict, username, digest, verdict
+        )
+        return {**verdict, "new_top": new_top}
+
+    def apply_verdict(
+        self, username: str, digest: str, verdict: Dict
+    ) -> Tuple[Dict, bool]:
+        """Keeps the verdict and updates the user's stats from a valid one.
+        Returns the verdict kept, and whether it's a new top score."""
+        if (
+            verdict["valid"]
+            and self.claim_seed(username, verdict["seed"], digest) != digest
+        ):
+            verdict = rejected("Another game was counted on this seed already")
+        try:
+            self.replay_collection.dependency().insert_one(
+                {"_id": digest, "username": username, "verdict": verdict}
+            )
+        except DuplicateKeyError:
+            # The same replay was sent again and counted already
+            return verdict, False
+        if not verdict["valid"]:
+            return verdict, False
+
+        if verdict["mode"] == "sprint":
+            new_top = self.update_sprint(
+                username, verdict["time"], verdict["lines_or_level"]
+            )
+        elif verdict["mode"] == "marathon":
+            new_top = self.update_marathon(username, verdict["score"])
+        else:
+            self.update_apm(username, verdict["total_attacks"] / verdict["time"] * 60)
+            new_top = False
+        return verdict, new_top
+
+    def claim_seed(self, username: str, seed: str, digest: str) -> str:
+        """Counts the replay as the user's game on the seed, unless another one was counted
+        already. Returns the hash of the replay the seed is counted for."""
+        claims = self.seed_collection.dependency()
+        claim_id = f"{username}:{seed}"
+        try:
+            claims.insert_one({"_id": claim_id, "replay": digest})
+        except DuplicateKeyError:
+            return claims.find_one({"_id": claim_id})["replay"]
+        return digest
+
+    # The score updates below are only reached through apply_verdict, never straight from a client
     def update_sprint(self, username: str, cur_time: float, line_num: int):
         user = self.user_by_username(username)
         line_index = self.SPRINTS[line_num]
@@ -353,51 +660,71 @@ class Server:
         old_time = self.sprint_time_to_int(sprints[line_index])
         time_str = self.seconds_to_str(cur_time)
 
-        sprints[line_index] = time_str
-        update_query = {"$set": {"sprint": sprints}}
+        # Only set this sprint's time, so a concurrent update of another sprint isn't lost
+        update_query = {"$set": {f"sprint.{line_index}": time_str}}
         # User scored a faster best time
         if old_time == 0 or cur_time < old_time:
             self.user_collection.dependency().update_one(
-                filter={"username": username}, update=update_query
+                filter={"type": "user", "username": username}, update=update_query
+            )
+            set_score(
+                self.leaderboard_collection.dependency(),
+                sprint_board(line_num),
+                username,
+                cur_time,
+                time_str,
             )
+            self.changed(profile_resource(username), sprint_board(line_num))
             return True
         return False
 
-    @router.post("/users/marathon")
     def update_marathon(self, username: str, score: int):
-        user = self.user_by_username(username)
-
-        update_query = {"$set": {"marathon": score}}
-        old_score = user["marathon"]
-        # User scored a higher score
-        if old_score == 0 or old_score < score:
-            self.user_collection.dependency().update_one(
-                filter={"username": username}, update=update_query
+        # Only matches if the user scored a higher score
+        updated = self.user_collection.dependency().find_one_and_update(
+            {"type": "user", "username": username, "marathon": {"$lt": score}},
+            {"$set": {"marathon": score}},
+            projection={"_id": 1},
+        )
+        if updated:
+            set_score(
+                self.leaderboard_collection.dependency(), "marathon", username, score
             )
+            self.changed(profile_resource(username), "marathon")
             return True
         return False
 
-    @router.post("/users/apm")
     def update_apm(self, username: str, apm: float):
-        user = self.user_by_username(username)
-        games: list = user["apm_games"]
-
-        if len(games) > 9:
-            games = games[len(games) - 9 :]
-        games.append(apm)
-        # Calculate the avg of the past 10 games
-        avg_apm = round(sum(games) / len(games), 3)
-
-        update_query = {"$set": {"apm_games": games, "apm": avg_apm}}
-        self.user_collection.dependency().update_one(
-            filter={"username": username}, update=update_query
-        )
+        # Keep the past 10 games, and average them in the same update
+        apm_games = {
+            "$slice": [{"$concatArrays": [{"$ifNull": ["$apm_games", []]}, [apm]]}, -10]
+        }
+        avg_apm = {
+            "$divide": [
+                {
+                    "$floor": {
+                        "$add": [{"$multiply": [{"$avg": "$apm_games"}, 1000]}, 0.5]
+                    }
+                },
+                1000,
+            ]
+        }
+        user = self.user_collection.dependency().find_one_and_update(
+            {"type": "user", "username": username},
+            [{"$set": {"apm_games": apm_games}}, {"$set": {"apm": avg_apm}}],
+            projection={"_id": 0, "apm": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if user and user["apm"] != 0:
+            set_score(
+                self.leaderboard_collection.dependency(), "apm", username, user["apm"]
+            )
+        self.changed(profile_resource(username), "apm")
 
     @router.post("/users/connection")
     def on_connection(self, username: str, ip: str):
         new_query = {"$set": {"ip": ip, "invite": "", "invite_ip": "", "online": True}}
         self.user_collection.dependency().update_one(
-            filter={"username": username}, update=new_query
+            filter={"type": "user", "username": username}, update=new_query
         )
 
     @router.get("/users/invite-ip")
@@ -421,7 +748,18 @@ class Server:
                 "invite_room": room_name,
             }
         }
-        self.user_collection.dependency().update_one({"username": invitee}, new_query)
+        self.user_collection.dependency().update_one(
+            {"type": "user", "username": invitee}, new_query
+        )
+        notification_hub.publish(
+            {
+                "type": "invite",
+                "inviter": inviter,
+                "invite_ip": invite_ip,
+                "invite_room": room_name,
+            },
+            [invitee],
+        )
 
     @router.get("/users/invites")
     def get_invite(self, username: str) -> str:
@@ -439,7 +777,8 @@ class Server:
     @router.post("/users/online")
     def update_online(self, username: str, online: bool):
         self.user_collection.dependency().find_one_and_update(
-            filter={"username": username}, update={"$set": {"online": online}}
+            filter={"type": "user", "username": username},
+            update={"$set": {"online": online}},
         )
 
     @router.get("/users/servers")
@@ -503,7 +842,7 @@ class Server:
         new_query = {"$set": {"ip": ip}}
 
         self.user_collection.dependency().update_one(
-            filter={"username": user["username"]}, update=new_query
+            filter={"type": "user", "username": user["username"]}, update=new_query
         )
 
     @router.get("/users/len")
@@ -539,7 +878,10 @@ class Server:
 
     def email_exists(self, email: str) -> bool:
         """Returns whether a user with a given email exists in the db"""
-        return self.user_collection.dependency().find_one({"email": email}) is not None
+        return (
+            self.user_collection.dependency().find_one({"type": "user", "email": email})
+            is not None
+        )
 
     def username_exists(self, username: str) -> bool:
         """Returns whether a user with a given username exists in the db"""
@@ -550,27 +892,24 @@ class Server:
         """Returns whether a given user identifier matches a given password in the db"""
         return (
             self.user_collection.dependency().find_one(
-                {"username": user_identifier, "password": password}, {"_id": 0}
+                {"type": "user", "username": user_identifier, "password": password},
+                {"_id": 0},
             )
             or self.user_collection.dependency().find_one(
-                {"email": user_identifier, "password": password}, {"_id": 0}
+                {"type": "user", "email": user_identifier, "password": password},
+                {"_id": 0},
             )
             or {}
         )
 
     def user_by_username(self, username):
         return self.user_collection.dependency().find_one(
-            {"username": username}, {"_id": 0}
+            {"type": "user", "username": username}, {"_id": 0}
         )
 
     @staticmethod
     def sprint_time_to_int(time_str):
-        time_str = time_str.split(":")
-        old_time = 0
-        # Time str to secs
-        for i in range(len(time_str)):
-            old_time += float(time_str[-i - 1]) * 60 ** i
-        return old_time
+        return sprint_time_to_seconds(time_str)
 
     @staticmethod
     def seconds_to_str(seconds):
@@ -603,12 +942,12 @@ class Server:
     def is_password_new(self, user_email, password):
         print(
             self.user_collection.dependency().find_one(
-                {"email": user_email, "password": password}
+                {"type": "user", "email": user_email, "password": password}
             )
         )
         return (
             self.user_collection.dependency().find_one(
-                {"email": user_email, "password": password}
+                {"type": "user", "email": user_email, "password": password}
             )
             is None
         )
@@ -616,7 +955,7 @@ class Server:
     @router.post("/pass/update")
     def update_user_email(self, user_email, password):
         self.user_collection.dependency().find_one_and_update(
-            {"email": user_email}, {"$set": {"password": password}}
+            {"type": "user", "email": user_email}, {"$set": {"password": password}}
         )
 
     @router.post("/pass/reset")
@@ -643,9 +982,32 @@ class Server:
 
 app.include_router(router)
 
-
-# if __name__ == "__main__":
-# Run Server
-print(get("https://api.ipify.org").text)
-service_port = int(os.environ.get("PORT", 43434))
-uvicorn.run(app, host="0.0.0.0", port=service_port)
+# The close code of a websocket refused for the user's credentials
+WS_POLICY_VIOLATION = 1008
+
+
+@app.websocket("/notifications")
+async def notifications(websocket: WebSocket, username: str, password: str):
+    """Keeps a push channel open to a client, until it disconnects.
+    Only a user's own password opens their channel."""
+    user = await run_in_threadpool(Server().user_matches_password, username, password)
+    if not user:
+        await websocket.close(code=WS_POLICY_VIOLATION)
+        return
+    username = user["username"]
+    await notification_hub.connect(username, websocket)
+    try:
+        # Clients never send anything meaningful, this only waits for the close
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        notification_hub.disconnect(username, websocket)
+
+
+if __name__ == "__main__":
+    # Run Server
+    print(get("https://api.ipify.org").text)
+    service_port = int(os.environ.get("PORT", 43434))
+    uvicorn.run(app, host="0.0.0.0", port=service_port)
@@ -1,29 +1,145 @@
+import asyncio
 import copy
 import json
-from typing import Dict
+import threading
+import time
+import uuid
+from functools import partial
+from typing import Callable, Dict, List, Optional
 
-from requests import post, get
+import requests
+import websocket
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from database.write_queue import WriteQueue
 
 
 class ServerCommunicator:
+    LEADERBOARD_PAGE_SIZE = 25
+    # Enough kept-alive connections for every thread that talks to the server at once
+    POOL_SIZE = 16
+    # (connect, read) seconds
+    TIMEOUT = (5, 15)
+    SEED_TIMEOUT = (2, 3)
+    WRITE_JOURNAL_PATH = "resources/write_journal.jsonl"
+    # Stat and setting writes nobody waits on go through here. It's shared by every
+    # communicator of the process, since the queue owns the journal file
+    write_queue: Optional[WriteQueue] = None
+    write_queue_lock = threading.Lock()
+    RETRIES = Retry(
+        total=3, connect=3, read=2, backoff_factor=0.3, status_forcelist=(502, 503, 504)
+    )
+    # Heroku drops websockets which are quiet for 55 seconds
+    NOTIFICATION_PING_INTERVAL = 30
+    NOTIFICATION_RECONNECT_DELAY = 5
+
     def __init__(self):
         self.SERVER_DOMAIN = f"https://tetr-net.herokuapp.com"
+        # One pooled session, so requests reuse kept-alive connections
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.POOL_SIZE, max_retries=self.RETRIES
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        with ServerCommunicator.write_queue_lock:
+            if ServerCommunicator.write_queue is None:
+                ServerCommunicator.write_queue = WriteQueue(
+                    self.send_writes, self.WRITE_JOURNAL_PATH
+                )
+        # url -> (ETag, body) of the last response for each conditional GET
+        self.validated = {}
+        # The password of the user who logged in, replays are only taken along with it
+        self.password: Optional[str] = None
+        self.notifications_connected = False
+        self.notification_thread: Optional[threading.Thread] = None
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.session.get(url, timeout=self.TIMEOUT, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.session.post(url, timeout=self.TIMEOUT, **kwargs)
+
+    async def async_get(self, url: str, **kwargs) -> requests.Response:
+        """get for coroutines, run on the default executor over the same pooled session"""
+        return await asyncio.get_running_loop().run_in_executor(
+            None, partial(self.get, url, **kwargs)
+        )
+
+    async def async_post(self, url: str, **kwargs) -> requests.Response:
+        """post for coroutines, run on the default executor over the same pooled session"""
+        return await asyncio.get_running_loop().run_in_executor(
+            None, partial(self.post, url, **kwargs)
+        )
+
+    def send_writes(self, writes: List[Dict]) -> List[str]:
+        """Sends a batch of queued writes, returns the result of each one.
+        Raises if the server didn't take the batch at all."""
+        resp = self.post(f"{self.SERVER_DOMAIN}/users/bulk", json=writes)
+        resp.raise_for_status()
+        return resp.json()
+
+    def get_validated(self, url: str):
+        """GETs a json resource, sending the ETag of the last response for it.
+        An unchanged resource comes back as an empty 304, and the kept body is used."""
+        cached = self.validated.get(url)
+        headers = {"If-None-Match": cached[0]} if cached else {}
+        resp = self.get(url, headers=headers)
+        if resp.status_code == 304 and cached:
+            # Callers may edit what they get, so never hand out the kept copy
+            return copy.deepcopy(cached[1])
+        content = json.loads(resp.content)
+        etag = resp.headers.get("ETag")
+        if etag:
+            self.validated[url] = (etag, copy.deepcopy(content))
+        return content
+
+    def listen_notifications(self, username: str, on_event: Callable[[Dict], None]):
+        """Streams the server's push events to on_event on a background thread.
+        Does nothing if already listening."""
+        if self.notification_thread and self.notification_thread.is_alive():
+            return
+        self.notification_thread = threading.Thread(
+            target=self.notification_loop, args=(username, on_event), daemon=True
+        )
+        self.notification_thread.start()
+
+    def notification_loop(self, username: str, on_event: Callable[[Dict], None]):
+        url = self.SERVER_DOMAIN.replace("http", "ws", 1)
+        app = websocket.WebSocketApp(
+            f"{url}/notifications?username={username}&password={self.password}",
+            on_open=lambda ws: self.set_notifications_connected(True),
+            on_message=lambda ws, message: on_event(json.loads(message)),
+            on_close=lambda ws, *args: self.set_notifications_connected(False),
+            on_error=lambda ws, error: self.set_notifications_connected(False),
+        )
+        # Reconnect whenever the connection drops
+        while True:
+            app.run_forever(ping_interval=self.NOTIFICATION_PING_INTERVAL)
+            self.notifications_connected = False
+            time.sleep(self.NOTIFICATION_RECONNECT_DELAY)
+
+    def set_notifications_connected(self, connected: bool):
+        self.notifications_connected = connected
 
     @staticmethod
     def bool_to_string(condition: bool):
         return str(condition).lower()
 
     def get_invite_room(self, username):
-        return get(
+        return self.get(
             f"{self.SERVER_DOMAIN}/users/invite-room?username={username}"
         ).text.replace('"', "")
 
     def get_server_by_ip(self, ip):
-        return json.loads(get(f"{self.SERVER_DOMAIN}/users/server/ip?ip={ip}").content)
+        return json.loads(
+            self.get(f"{self.SERVER_DOMAIN}/users/server/ip?ip={ip}").content
+        )
 
     def get_players_in_room(self, room):
         return int(
-            get(
+            self.get(
                 f"{self.SERVER_DOMAIN}/users/rooms/players?room_name={room['name']}&outer_ip={room['outer_ip']}"
             ).text
         )
@@ -31,178 +147,238 @@ class ServerCommunicator:
     def update_controls(self, username: str, controls: Dict):
         controls_with_username = copy.deepcopy(controls)
         controls_with_username["username"] = username
-        post(
-            f"{self.SERVER_DOMAIN}/users/controls",
-            data=json.dumps(controls_with_username),
+        self.write_queue.put(
+            "update_controls",
+            ("controls", username),
+            controls=controls_with_username,
         )
 
     def delete_server_by_ip(self, outer_ip: str, inner_ip: str):
-        post(
+        self.post(
             f"{self.SERVER_DOMAIN}/users/server/del-by-ip?outer_ip={outer_ip}&inner_ip={inner_ip}"
         )
 
     def update_music(self, username: str, music: bool):
-        post(f"{self.SERVER_DOMAIN}/users/music?username={username}&music={music}")
+        self.write_queue.put(
+            "update_music", ("music", username), username=username, music=music
+        )
 
     def update_settings(
         self, username: str, das: int, arr: int, skin: int, ghost: bool, fade: bool
     ):
-        post(
-            f"{self.SERVER_DOMAIN}/users/settings?username={username}&das={das}&arr={arr}&skin={skin}&ghost={ghost}&fade={fade}"
+        self.write_queue.put(
+            "update_settings",
+            ("settings", username),
+            username=username,
+            das=das,
+            arr=arr,
+            skin=skin,
+            ghost=ghost,
+            fade=fade,
         )
 
     def is_password_new(self, user_email, password):
         return (
-            get(
+            self.get(
                 f"{self.SERVER_DOMAIN}/pass/new?user_email={user_email}&password={password}"
             ).text
             == "true"
         )
 
     def update_password(self, user_email, password):
-        post(
+        self.post(
             f"{self.SERVER_DOMAIN}/pass/update?user_email={user_email}&password={password}"
         )
 
     def check_code(self, user_email, code):
         return (
-            get(
+            self.get(
                 f"{self.SERVER_DOMAIN}/pass/check?user_email={user_email}&code={code}"
             ).text
             == "true"
         )
 
     def user_create_code(self, user_email):
-        post(f"{self.SERVER_DOMAIN}/users/create/code?user_email={user_email}")
+        self.post(f"{self.SERVER_DOMAIN}/users/create/code?user_email={user_email}")
 
     def reset_password(self, user_email):
-        post(f"{self.SERVER_DOMAIN}/pass/reset?user_email={user_email}")
+        self.post(f"{self.SERVER_DOMAIN}/pass/reset?user_email={user_email}")
 
     def accept_friend_request(self, sender, recipient):
-        post(
+        self.post(
             f"{self.SERVER_DOMAIN}/users/friends/accept?sender={sender}&recipient={recipient}"
         )
 
     def send_friend_request(self, sender, recipient):
-        post(
+        self.post(
             f"{self.SERVER_DOMAIN}/users/friends/send?sender={sender}&recipient={recipient}"
         )
 
     def remove_friend(self, sender, recipient):
-        post(
+        self.post(
             f"{self.SERVER_DOMAIN}/users/friends/remove?sender={sender}&recipient={recipient}"
         )
 
     def get_user_profile(self, username):
-        return json.loads(
-            get(f"{self.SERVER_DOMAIN}/users/profile?username={username}").content
+        return self.get_validated(
+            f"{self.SERVER_DOMAIN}/users/profile?username={username}"
+        )
+
+    def get_apm_leaderboard(self, offset=0, limit=LEADERBOARD_PAGE_SIZE):
+        return self.get_validated(
+            f"{self.SERVER_DOMAIN}/users/apms?offset={offset}&limit={limit}"
+        )
+
+    def get_marathon_leaderboard(self, offset=0, limit=LEADERBOARD_PAGE_SIZE):
+        return self.get_validated(
+            f"{self.SERVER_DOMAIN}/users/marathons?offset={offset}&limit={limit}"
         )
 
-    def get_apm_leaderboard(self):
-        return json.loads(get(f"{self.SERVER_DOMAIN}/users/apms").content)
+    def get_sprint_leaderboard(self, line_num, offset=0, limit=LEADERBOARD_PAGE_SIZE):
+        return self.get_validated(
+            f"{self.SERVER_DOMAIN}/users/sprints?line_num={line_num}&offset={offset}&limit={limit}"
+        )
 
-    def get_marathon_leaderboard(self):
-        return json.loads(get(f"{self.SERVER_DOMAIN}/users/marathons").content)
+    def get_leaderboard_page(
+        self, score_type: str, offset=0, limit=LEADERBOARD_PAGE_SIZE
+    ):
+        """Returns a page of the leaderboard for a score type, e.g. apm or 40l"""
+        if score_type == "apm":
+            return self.get_apm_leaderboard(offset, limit)
+        if score_type == "marathon":
+            return self.get_marathon_leaderboard(offset, limit)
+        return self.get_sprint_leaderboard(score_type[:-1], offset, limit)
+
+    def get_leaderboard_rank(self, score_type: str, username: str, radius: int = 5):
+        """Returns the user's rank in a leaderboard, and the entries around them"""
+        return json.loads(
+            self.get(
+                f"{self.SERVER_DOMAIN}/users/rank?score_type={score_type}&username={username}&radius={radius}"
+            ).content
+        )
 
-    def get_sprint_leaderboard(self, line_num):
+    def get_bootstrap(self, username: str, versions: Dict):
+        """Returns the home screen sections that changed since the given versions, and every section's current version"""
         return json.loads(
-            get(f"{self.SERVER_DOMAIN}/users/sprints?line_num={line_num}").content
+            self.get(
+                f"{self.SERVER_DOMAIN}/bootstrap",
+                params={"username": username, "versions": json.dumps(versions)},
+            ).content
         )
 
     def remove_room(self, room_name):
-        post(f"{self.SERVER_DOMAIN}/users/rooms/delete?room_name={room_name}")
+        self.post(f"{self.SERVER_DOMAIN}/users/rooms/delete?room_name={room_name}")
 
     def update_player_num(self, outer_ip, inner_ip, player_num):
-        post(
-            f"{self.SERVER_DOMAIN}/users/rooms/player-num?outer_ip={outer_ip}&inner_ip={inner_ip}&player_num={player_num}"
+        self.write_queue.put(
+            "update_player_num",
+            ("player_num", outer_ip, inner_ip),
+            outer_ip=outer_ip,
+            inner_ip=inner_ip,
+            player_num=player_num,
         )
 
     def create_room(self, room: Dict):
         """Adds a new room to the database"""
-        post(f"{self.SERVER_DOMAIN}/users/rooms", data=json.dumps(room))
+        self.post(f"{self.SERVER_DOMAIN}/users/rooms", data=json.dumps(room))
 
     def add_game(self, username: str, win: bool):
         """Updates the user's stats after a game is played"""
-        post(f"{self.SERVER_DOMAIN}/users/games?username={username}&win={win}")
-
-    def update_sprint(self, username: str, time: float, line_num: int):
-        """Updates the user top sprint time to the given time, and returns true if it's a new fastest time"""
-        return (
-            post(
-                f"{self.SERVER_DOMAIN}/users/sprint?username={username}&cur_time={time}&line_num={line_num}"
-            ).text
-            == "true"
+        # Every game counts, so these are never coalesced. The id keeps the server from
+        # counting the game twice if it's sent again from the journal.
+        self.write_queue.put(
+            "add_game", username=username, win=win, game_id=uuid.uuid4().hex
         )
 
-    def update_marathon(self, username: str, score: int):
-        """Updates the top marathon score, and returns true if it's a new high score"""
-        return (
-            post(
-                f"{self.SERVER_DOMAIN}/users/marathon?username={username}&score={score}"
-            ).text
-            == "true"
-        )
-
-    def update_apm(self, username: str, attacks: int, time: float):
-        """Updates the apm for the player"""
-        # Add the game to the players list of games, and make the apm the attacks / the time in mins
-        apm = (attacks / time) * 60
-        post(f"{self.SERVER_DOMAIN}/users/apm?username={username}&apm={apm}")
+    def get_seed(self) -> Optional[str]:
+        """Returns a seed issued by the server to play a game on, or None if the server can't
+        be reached, in which case the game won't be verified"""
+        try:
+            # The game waits for it, so it gets less time than other requests
+            return self.session.get(
+                f"{self.SERVER_DOMAIN}/games/seed", timeout=self.SEED_TIMEOUT
+            ).json()
+        except requests.RequestException as e:
+            print(f"Couldn't get a seed for the game: {e}")
+            return None
+
+    def submit_replay(self, username: str, replay: bytes) -> Optional[bool]:
+        """Sends the replay of a finished game, which the server plays again to verify before
+        updating the user's stats. Returns true if it's a new top score, None if the game
+        couldn't be submitted."""
+        try:
+            resp = self.post(
+                f"{self.SERVER_DOMAIN}/replays?username={username}&password={self.password}",
+                data=replay,
+                headers={"Content-Type": "application/octet-stream"},
+            )
+            if not resp.ok:
+                print(f"Couldn't verify the game: {resp.text}")
+                return None
+            verdict = resp.json()
+        except (requests.RequestException, ValueError) as e:
+            print(f"Couldn't submit the game: {e}")
+            return None
+        if not verdict["valid"]:
+            print(f"The game was rejected: {verdict['reason']}")
+        return verdict["new_top"]
 
     def get_rooms(self):
         """Returns the list containing all active rooms"""
-        rooms = get(f"{self.SERVER_DOMAIN}/users/rooms")
-        return json.loads(rooms.content)
+        return self.get_validated(f"{self.SERVER_DOMAIN}/users/rooms")
 
     def on_connection(self, username: str, ip: str):
-        post(f"{self.SERVER_DOMAIN}/users/connection?username={username}&ip={ip}")
+        self.write_queue.put(
+            "on_connection", ("connection", username), username=username, ip=ip
+        )
 
     def get_invite_ip(self, username: str) -> str:
-        return get(
+        return self.get(
             f"{self.SERVER_DOMAIN}/users/invite-ip?username={username}"
         ).text.replace('"', "")
 
     def dismiss_invite(self, invitee: str):
-        post(
+        self.post(
             f"{self.SERVER_DOMAIN}/users/invites?inviter={''}&invitee={invitee}&invite_ip={''}&invite_room={''}"
         )
 
     def get_invite(self, username: str) -> str:
         """Return the current invite for the user"""
-        return get(
+        return self.get(
             f"{self.SERVER_DOMAIN}/users/invites?username={username}"
         ).text.replace('"', "")
 
     def invite_user(self, inviter: str, invitee: str, invite_ip: str, room_name: str):
         """Invites a given player to a given server ip"""
-        post(
+        self.post(
             f"{self.SERVER_DOMAIN}/users/invites?inviter={inviter}&invitee={invitee}&invite_ip={invite_ip}&room_name={room_name}"
         )
 
     def update_online(self, username: str, online: bool):
         """Changes the online state of a given player"""
-        post(
-            f"{self.SERVER_DOMAIN}/users/online?username={username}&online={self.bool_to_string(online)}"
+        self.write_queue.put(
+            "update_online", ("online", username), username=username, online=online
         )
 
     def is_online(self, foe_name: str) -> bool:
         """Returns whether a given player is online"""
         return (
-            get(f"{self.SERVER_DOMAIN}/users/online?username={foe_name}").text == "true"
+            self.get(f"{self.SERVER_DOMAIN}/users/online?username={foe_name}").text
+            == "true"
         )
 
     def create_user(self, db_post: dict):
         """Adds a new user to the database"""
-        post(f"{self.SERVER_DOMAIN}/users", data=json.dumps(db_post))
+        self.post(f"{self.SERVER_DOMAIN}/users", data=json.dumps(db_post))
 
     def estimated_document_count(self) -> int:
         """Returns num of queries in the database. Mainly used for testing"""
-        return int(get(f"{self.SERVER_DOMAIN}/users/len").text)
+        return int(self.get(f"{self.SERVER_DOMAIN}/users/len").text)
 
     def user_identifier_exists(self, user_identifier: str) -> bool:
         """Returns whether a user with a given user identifier exists in the database"""
         return (
-            get(
+            self.get(
                 f"{self.SERVER_DOMAIN}/users/find?user_identifier={user_identifier}"
             ).text
             == "true"
@@ -211,17 +387,21 @@ class ServerCommunicator:
     def username_exists(self, username: str) -> bool:
         """Returns whether a user with a given username exists in the database"""
         return (
-            get(f"{self.SERVER_DOMAIN}/users/find?username={username}").text == "true"
+            self.get(f"{self.SERVER_DOMAIN}/users/find?username={username}").text
+            == "true"
         )
 
     def email_exists(self, email: str) -> bool:
         """Returns whether a user with a given email exists in the database"""
-        return get(f"{self.SERVER_DOMAIN}/users/find?email={email}").text == "true"
+        return self.get(f"{self.SERVER_DOMAIN}/users/find?email={email}").text == "true"
 
     def get_user(self, user_identifier: str, password: str) -> dict:
         """Returns a dict of a user in the database with the given user_identifier and password"""
-        resp = get(
+        resp = self.get(
             f"{self.SERVER_DOMAIN}/users?user_identifier={user_identifier}&password={password}"
         )
         # Load the user's information onto a tuple
-        return json.loads(resp.text)
+        user = json.loads(resp.text)
+        if user:
+            self.password = password
+        return user
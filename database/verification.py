@@ -0,0 +1,192 @@
+"""Score verification by replay.
+
+Clients send the replay of a finished game instead of its score. The replay is
+played again on the headless engine in a pool of worker processes, and only the
+score the engine ends up with goes on the leaderboards. Verdicts are kept by
+the replay's hash, so a replay is only ever played, and counted, once.
+
+Only the player's inputs are in the replay, the engine runs the game's timers
+itself. The seed is issued by the server and signed, so a game can't be played
+on pieces the player picked, and every seed counts once per player.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import os
+import secrets
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+
+# The engine lives at the root of the repository, next to the client
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tetris_engine.replay import GARBAGE, Replay
+from tetris_engine.tetris_engine import TetrisEngine, TimerLimitExceeded
+
+from leaderboards import MARATHON_LEVELS, SPRINT_LINES
+
+VERIFY_WORKERS = int(os.environ.get("VERIFY_WORKERS", 2))
+# Replays are a few KB, the size bounds the work a single submission can cause
+MAX_REPLAY_SIZE = 256 * 1024
+# The timers a game may fire, enough for minutes of the fastest gravity. It's what keeps a
+# worker from playing a replay for too long, the timeout only stops waiting for it.
+TIMER_LIMIT = 300_000
+VERIFY_TIMEOUT = 10
+# Replays waiting for a worker before new ones are turned away
+MAX_PENDING = 64
+MODES = ("sprint", "marathon", "multiplayer")
+# The least time between two hard drops (in ms). Pieces locked by gravity don't count, at the
+# fastest gravity they lock sooner than this on their own.
+MIN_PIECE_TIME = 50
+# Signs the seeds. Without it set every run of the server signs with a key of it's own, and
+# seeds issued before a restart aren't valid anymore.
+SEED_KEY = os.environ.get("SEED_KEY", "").encode() or secrets.token_bytes(32)
+# How long a seed can be played on after it's issued (in seconds)
+SEED_TTL = 3 * 60 * 60
+
+
+def replay_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def rejected(reason: str) -> Dict:
+    return {"valid": False, "reason": reason}
+
+
+def sign_seed(nonce: str, issued: int, key: bytes) -> str:
+    return hmac.new(key, f"{nonce}.{issued}".encode(), hashlib.sha256).hexdigest()
+
+
+def issue_seed(key: bytes = SEED_KEY) -> str:
+    """Returns a new seed for a game, signed so the server can tell it issued it"""
+    nonce = secrets.token_hex(8)
+    issued = int(time.time())
+    return f"{nonce}.{issued}.{sign_seed(nonce, issued, key)}"
+
+
+def seed_issue_time(seed: str, key: bytes) -> Optional[int]:
+    """Returns when the seed was issued, or None if the server didn't issue it"""
+    try:
+        nonce, issued, signature = seed.split(".")
+        issued = int(issued)
+    except ValueError:
+        return None
+    if not hmac.compare_digest(
+        signature.encode(), sign_seed(nonce, issued, key).encode()
+    ):
+        return None
+    return issued
+
+
+class PlayedTooFast(Exception):
+    """The replay has inputs no player could have made"""
+
+
+class VerifyingEngine(TetrisEngine):
+    """The engine replays are played on, which stops as soon as the game is played faster
+    than a player can, or runs for too long"""
+
+    def __init__(self, replay: Replay):
+        super().__init__(
+            replay.mode, replay.lines_or_level, replay.das, replay.arr, replay.seed
+        )
+        self.timer_limit = TIMER_LIMIT
+        # The last time a piece was hard dropped, or the start of the game (in ms)
+        self.last_hard_drop_time = 0
+
+    def hard_drop(self):
+        if self.cur_piece:
+            if self.time - self.last_hard_drop_time < MIN_PIECE_TIME:
+                raise PlayedTooFast("Pieces were placed faster than the game allows")
+            self.last_hard_drop_time = self.time
+        super().hard_drop()
+
+
+def verify_replay(data: bytes, key: bytes = SEED_KEY) -> Dict:
+    """Plays a replay on the engine and returns the verdict. Runs in a worker process."""
+    try:
+        replay = Replay.from_bytes(data)
+    except (ValueError, UnicodeDecodeError) as e:
+        return rejected(str(e))
+
+    if replay.mode not in MODES:
+        return rejected(f"Unknown mode {replay.mode}")
+    if replay.mode == "sprint" and replay.lines_or_level not in SPRINT_LINES:
+        return rejected(f"Unknown sprint of {replay.lines_or_level} lines")
+    if replay.mode == "marathon" and replay.lines_or_level not in MARATHON_LEVELS:
+        return rejected(f"Unknown marathon level {replay.lines_or_level}")
+    if replay.mode != "multiplayer" and any(
+        kind == GARBAGE for _, kind, _ in replay.events
+    ):
+        return rejected("Garbage was received outside of a multiplayer game")
+
+    issued = seed_issue_time(replay.seed, key)
+    if issued is None:
+        return rejected("The game's seed wasn't issued by the server")
+    # The game has to have been played between when the seed was issued and now
+    seed_age = time.time() - issued
+    if seed_age > SEED_TTL or replay.events[-1][0] / 1000 > seed_age + 1:
+        return rejected("The game's seed expired")
+
+    try:
+        engine = replay.play(VerifyingEngine(replay))
+    except PlayedTooFast as e:
+        return rejected(str(e))
+    except TimerLimitExceeded:
+        return rejected("The game ran for too long")
+    if replay.mode == "sprint" and not engine.win:
+        return rejected("The sprint wasn't finished")
+    if engine.time <= 0:
+        return rejected("The game didn't last any time")
+    return {
+        "valid": True,
+        "reason": "",
+        "seed": replay.seed,
+        "mode": replay.mode,
+        "lines_or_level": replay.lines_or_level,
+        "time": engine.get_current_time_since_start(),
+        "score": engine.score,
+        "lines_cleared": engine.lines_cleared,
+        "total_attacks": engine.total_attacks,
+    }
+
+
+class ReplayVerifier:
+    """Verifies replays on a pool of worker processes, so the api's event loop never runs a game.
+    The same replay sent again while it's verified waits on the same job."""
+
+    def __init__(self, workers: int = VERIFY_WORKERS):
+        self.workers = workers
+        self.pool: Optional[ProcessPoolExecutor] = None
+        # Replay hash -> the job verifying it
+        self.jobs: Dict[str, asyncio.Future] = {}
+
+    async def verify(self, digest: str, data: bytes) -> Optional[Dict]:
+        """Returns the replay's verdict, or None if too many replays are waiting already"""
+        if digest not in self.jobs:
+            if len(self.jobs) >= MAX_PENDING:
+                return None
+            job = asyncio.ensure_future(self.run(data))
+            job.add_done_callback(lambda _: self.jobs.pop(digest, None))
+            self.jobs[digest] = job
+        return await asyncio.shield(self.jobs[digest])
+
+    async def run(self, data: bytes) -> Dict:
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.workers)
+        loop = asyncio.get_running_loop()
+        try:
+            return await asyncio.wait_for(
+                loop.run_in_executor(self.pool, verify_replay, data, SEED_KEY),
+                VERIFY_TIMEOUT,
+            )
+        except asyncio.TimeoutError:
+            return rejected("Verification took too long")
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+            self.pool = None
@@ -0,0 +1,40 @@
+"""Per-resource version counters.
+
+Each resource the clients poll, e.g. a leaderboard, the room list or a user's
+profile, has a counter in the versions collection that every write to it
+bumps. Comparing counters tells a client whether its copy is current without
+reading the resource itself.
+"""
+
+from typing import Dict, Iterable, Optional
+
+ROOMS = "rooms"
+
+
+PROFILE_PREFIX = "profile:"
+
+
+def profile_resource(username: str) -> str:
+    return f"{PROFILE_PREFIX}{username}"
+
+
+def profile_username(resource: str) -> Optional[str]:
+    """Returns whose profile a resource is, or None if it isn't a profile"""
+    if resource.startswith(PROFILE_PREFIX):
+        return resource[len(PROFILE_PREFIX) :]
+    return None
+
+
+def bump(versions, *resources: str):
+    """Marks the given resources as changed"""
+    for resource in resources:
+        versions.update_one({"_id": resource}, {"$inc": {"version": 1}}, upsert=True)
+
+
+def get_versions(versions, resources: Iterable[str]) -> Dict[str, int]:
+    """Returns the current version of each resource. Resources never written are at version 0."""
+    resources = list(resources)
+    current = {resource: 0 for resource in resources}
+    for doc in versions.find({"_id": {"$in": resources}}):
+        current[doc["_id"]] = doc["version"]
+    return current
@@ -0,0 +1,144 @@
+import atexit
+import itertools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional
+
+import requests
+
+# The result the server gives every write of a batch
+WRITE_APPLIED = "applied"
+# The write can never be applied, e.g. it has the wrong arguments
+WRITE_REJECTED = "rejected"
+# The server couldn't apply the write this time, it may be sent again
+WRITE_FAILED = "failed"
+
+
+class WriteQueue:
+    """Sends fire-and-forget writes to the server from one background thread.
+
+    Writes given the same key replace each other while queued, so only the
+    latest one is sent. Whatever is queued goes to the server as one batch,
+    which applies every write on its own. Writes that couldn't reach the
+    server, or failed on it, are kept in a journal file, which is retried
+    before the next batch and on the next start. Writes the server rejected
+    are dropped, so they never hold up the ones after them."""
+
+    # Time given to more writes to arrive and coalesce before a batch is sent
+    BATCH_DELAY = 0.2
+    RETRY_INTERVAL = 30
+    CLOSE_TIMEOUT = 5
+
+    def __init__(
+        self,
+        send_batch: Callable[[List[Dict]], List[str]],
+        journal_path: str,
+        max_pending: int = 256,
+    ):
+        self.send_batch = send_batch
+        self.journal_path = journal_path
+        self.max_pending = max_pending
+        self.pending: "OrderedDict[Hashable, Dict]" = OrderedDict()
+        self.condition = threading.Condition()
+        self.unique_keys = itertools.count()
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def put(self, op: str, key: Optional[Hashable] = None, **args):
+        """Queues a write. Writes without a key are never coalesced.
+        Writes put after the queue was closed are dropped, nothing would send them."""
+        with self.condition:
+            # Bounded - wait for the writer rather than grow without limit
+            while (
+                len(self.pending) >= self.max_pending
+                and key not in self.pending
+                and not self.closed
+            ):
+                self.condition.wait()
+            if self.closed:
+                print(f"The write queue is closed, dropping the write {op}")
+                return
+            if key is None:
+                key = next(self.unique_keys)
+            else:
+                self.pending.pop(key, None)
+            self.pending[key] = {"op": op, "args": args}
+            self.condition.notify_all()
+
+    def close(self):
+        """Sends everything still queued and stops the writer"""
+        with self.condition:
+            if self.closed:
+                return
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join(self.CLOSE_TIMEOUT)
+
+    def run(self):
+        # Retry whatever an earlier run couldn't send
+        self.send([])
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    # Wake up now and then to retry journaled writes
+                    timed_out = not self.condition.wait(self.RETRY_INTERVAL)
+                    if timed_out and os.path.exists(self.journal_path):
+                        break
+            if not self.closed:
+                time.sleep(self.BATCH_DELAY)
+            with self.condition:
+                batch = list(self.pending.values())
+                self.pending.clear()
+                closed = self.closed
+                self.condition.notify_all()
+            self.send(batch)
+            if closed:
+                return
+
+    def send(self, batch: List[Dict]):
+        batch = self.read_journal() + batch
+        if not batch:
+            return
+        try:
+            results = self.send_batch(batch)
+        except requests.RequestException as e:
+            response = getattr(e, "response", None)
+            # The server answered and won't ever take the batch, sending it again won't help
+            if response is not None and response.status_code < 500:
+                print(f"The server refused {len(batch)} writes, dropping them: {e}")
+                self.write_journal([])
+            else:
+                print(f"Couldn't send {len(batch)} writes, journaling them: {e}")
+                self.write_journal(batch)
+            return
+
+        retry = []
+        for write, result in zip(batch, results):
+            if result == WRITE_FAILED:
+                retry.append(write)
+            elif result == WRITE_REJECTED:
+                print(f"The server rejected the write {write}, dropping it")
+        if retry:
+            print(f"{len(retry)} writes failed on the server, journaling them")
+        self.write_journal(retry)
+
+    def read_journal(self) -> List[Dict]:
+        if not os.path.exists(self.journal_path):
+            return []
+        with open(self.journal_path, "r") as journal:
+            return [json.loads(line) for line in journal if line.strip()]
+
+    def write_journal(self, batch: List[Dict]):
+        """Replaces the journal with the given writes, removing it if there are none"""
+        if not batch:
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            return
+        with open(self.journal_path, "w") as journal:
+            for write in batch:
+                journal.write(json.dumps(write) + "\n")
@@ -0,0 +1,260 @@
+import asyncio
+import itertools
+import json
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+from network import board_protocol
+from network import ProtocolError
+from network.framing import pack_frame, HEADER, MAX_FRAME_SIZE, TEXT, JSON, BINARY
+
+# Called with the winner's name (empty if there is none) and the players who disconnected
+MATCH_FINISHED_CALLBACK = Callable[[str, List[str]], None]
+
+
+class MatchConnection:
+    """A player's connection to the match server"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        # Every frame waiting to be sent to the player, None closes the connection
+        self.write_queue: asyncio.Queue = asyncio.Queue()
+        self.username = ""
+
+    async def read_message(self) -> Optional[Tuple[int, bytes]]:
+        """Returns the next (type, payload) the player sent, None if the connection closed"""
+        try:
+            length, message_type = HEADER.unpack(
+                await self.reader.readexactly(HEADER.size)
+            )
+            if length > MAX_FRAME_SIZE:
+                return None
+            return message_type, await self.reader.readexactly(length)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return None
+
+    def send(self, message_type: int, payload: bytes):
+        self.write_queue.put_nowait(pack_frame(payload, message_type))
+
+    def close(self):
+        self.write_queue.put_nowait(None)
+
+    async def write_loop(self):
+        """Sends the queued frames to the player one after the other"""
+        try:
+            while True:
+                frame = await self.write_queue.get()
+                if frame is None:
+                    break
+                self.writer.write(frame)
+                await self.writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.writer.close()
+
+
+class Match:
+    """A single game between players, passing each player's messages to the others"""
+
+    def __init__(
+        self, match_id: int, players: List[str], on_finished: MATCH_FINISHED_CALLBACK
+    ):
+        self.match_id = match_id
+        self.players = players
+        self.on_finished = on_finished
+        self.connections: Dict[str, MatchConnection] = {}
+        # Messages sent to players who haven't connected yet
+        self.pending_frames: Dict[str, List[Tuple[int, bytes]]] = {
+            player: [] for player in players
+        }
+        self.winner = ""
+        # The players who disconnected in the middle of the match
+        self.disconnected: List[str] = []
+        self.finished = False
+        # Closes the match if not every player joined it in time
+        self.join_deadline: Optional[asyncio.TimerHandle] = None
+
+    def join(self, connection: MatchConnection) -> bool:
+        """Adds a player's connection to the match, returns whether it's allowed to join"""
+        if connection.username not in self.pending_frames or self.finished:
+            return False
+        self.connections[connection.username] = connection
+        # The player waits for the ok before reading anything else
+        connection.send(TEXT, b"ok")
+        for message_type, payload in self.pending_frames.pop(connection.username):
+            connection.send(message_type, payload)
+        if not self.pending_frames and self.join_deadline:
+            self.join_deadline.cancel()
+        return True
+
+    def send_to_opponents(self, sender: MatchConnection, message_type, payload):
+        for player in self.players:
+            if player == sender.username:
+                continue
+            if player in self.connections:
+                self.connections[player].send(message_type, payload)
+            elif player in self.pending_frames:
+                self.pending_frames[player].append((message_type, payload))
+
+    def leave(self, connection: MatchConnection):
+        """A player disconnected, the match can't go on without them"""
+        if self.connections.get(connection.username) is connection:
+            self.connections.pop(connection.username)
+            if not self.finished:
+                self.disconnected.append(connection.username)
+        self.finish()
+
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        if self.join_deadline:
+            self.join_deadline.cancel()
+        for connection in self.connections.values():
+            connection.close()
+        self.on_finished(self.winner, self.disconnected)
+
+
+class MatchServer:
+    """Hosts every match of the process on a single port, players say which match they're
+    joining when they connect"""
+
+    PORT = 44446
+    # Seconds the players of a match have to join it before it's closed
+    JOIN_TIMEOUT = 30
+    # Seconds start waits for the server to listen
+    START_TIMEOUT = 10
+    # Every match server of the process, by the ip it listens on
+    shared_servers: Dict[str, "MatchServer"] = {}
+    shared_servers_lock = threading.Lock()
+
+    def __init__(self, listen_ip: str, port: int = PORT):
+        self.listen_ip = listen_ip
+        self.port = port
+        self.matches: Dict[int, Match] = {}
+        self.match_ids = itertools.count(1)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        # Done once the server listens, or with the error which kept it from listening
+        self.started: Future = Future()
+
+    @classmethod
+    def get_shared(cls, listen_ip: str) -> "MatchServer":
+        """Returns the process' match server for an ip, starting it if needed"""
+        with cls.shared_servers_lock:
+            if listen_ip not in cls.shared_servers:
+                match_server = cls(listen_ip)
+                match_server.start()
+                cls.shared_servers[listen_ip] = match_server
+            return cls.shared_servers[listen_ip]
+
+    def start(self):
+        """Starts serving in a background thread, raises what kept the server from
+        listening, e.g. the port being taken"""
+        threading.Thread(target=self.run, daemon=True).start()
+        self.started.result(self.START_TIMEOUT)
+
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        except Exception as e:
+            # start gives the error to it's caller
+            if self.started.done():
+                raise
+            self.started.set_exception(e)
+
+    async def serve(self):
+        server = await asyncio.start_server(
+            self.handle_connection, self.listen_ip, self.port
+        )
+        self.loop = asyncio.get_running_loop()
+        self.started.set_result(None)
+        async with server:
+            await server.serve_forever()
+
+    def create_match(
+        self, players: List[str], on_finished: MATCH_FINISHED_CALLBACK
+    ) -> int:
+        """Opens a match for the given players and returns it's id, can be called from any
+        thread. on_finished is called from the match server's thread."""
+        match_id = next(self.match_ids)
+        # The matches are only ever touched from the match server's thread
+        self.loop.call_soon_threadsafe(
+            self.add_match, Match(match_id, players, on_finished)
+        )
+        return match_id
+
+    def add_match(self, match: Match):
+        self.matches[match.match_id] = match
+        match.join_deadline = self.loop.call_later(
+            self.JOIN_TIMEOUT, self.close_match, match
+        )
+
+    def close_match(self, match: Match):
+        """Closes a match not every player joined, the players who did are disconnected"""
+        self.matches.pop(match.match_id, None)
+        match.finish()
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        connection = MatchConnection(reader, writer)
+        write_task = asyncio.create_task(connection.write_loop())
+
+        match = await self.join_match(connection)
+        if match is None:
+            connection.close()
+            await write_task
+            return
+
+        while not match.finished:
+            message = await connection.read_message()
+            if message is None:
+                break
+            message_type, payload = message
+            if message_type == BINARY:
+                self.handle_board_message(match, connection, payload)
+
+        match.leave(connection)
+        self.matches.pop(match.match_id, None)
+        await write_task
+
+    async def join_match(self, connection: MatchConnection) -> Optional[Match]:
+        """The first message of a player says which match they're joining"""
+        message = await connection.read_message()
+        if message is None or message[0] != JSON:
+            return None
+        try:
+            join_request = json.loads(message[1])
+            match = self.matches.get(join_request["match_id"])
+            connection.username = join_request["username"]
+        except (ValueError, KeyError, TypeError):
+            return None
+
+        if match is None or not match.join(connection):
+            return None
+        return match
+
+    @staticmethod
+    def handle_board_message(match: Match, connection: MatchConnection, payload: bytes):
+        try:
+            message_type = board_protocol.get_message_type(payload)
+        except ProtocolError as e:
+            print(e)
+            return
+
+        # Game ended, the player who sent it has lost
+        if message_type == board_protocol.GAME_RESULT:
+            won_message = board_protocol.encode_result(board_protocol.RESULT_WON)
+            for player, other_connection in match.connections.items():
+                if other_connection is connection:
+                    continue
+                other_connection.send(BINARY, won_message)
+                match.winner = player
+            match.finish()
+            return
+
+        # Pass the board on to the other players
+        match.send_to_opponents(connection, BINARY, payload)
@@ -3,6 +3,7 @@ from typing import Tuple, Dict
 
 import pygame
 from tetris.colors import Colors
+from tetris.asset_registry import AssetRegistry
 
 
 class Button:
@@ -56,24 +57,15 @@ class Button:
         if not text_color:
             text_color = self.text_color
 
-        split_text = inp.split("\n")
-        lines = []
-        if inp.isascii():
-            for line in split_text:
-                lines.append(
-                    pygame.font.Font(
-                        "tetris/tetris-resources/joystix-monospace.ttf", font_size
-                    ).render(line, True, text_color)
-                )
-            return lines
-        else:
-            for line in split_text:
-                lines.append(
-                    pygame.font.Font(
-                        "tetris/tetris-resources/seguisym.ttf", font_size
-                    ).render(line, True, text_color)
-                )
-            return lines
+        font_file = (
+            AssetRegistry.FONT_FILE
+            if inp.isascii()
+            else AssetRegistry.SYMBOLS_FONT_FILE
+        )
+        return [
+            AssetRegistry.render_text(line, font_size, text_color, font_file)
+            for line in inp.split("\n")
+        ]
 
     def calculate_center_text_position(
         self, x_space: int, y_space: int
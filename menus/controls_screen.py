@@ -164,8 +164,7 @@ class ControlsScreen(MenuScreen):
         ]
 
     def save_controls(self):
-        threading.Thread(
-            target=self.server_communicator.update_controls,
-            args=(self.cache["user"]["username"], self.controls),
-        ).start()
+        self.server_communicator.update_controls(
+            self.cache["user"]["username"], self.controls
+        )
         self.quit()
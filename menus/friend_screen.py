@@ -220,8 +220,12 @@ class FriendsScreen(ListScreen):
 
     def refresh_list(self):
         self.offset = 0
-        self.user = self.server_communicator.get_user_profile(self.user["username"])
-        self.cache["user"] = self.user
+        # The push channel keeps the cached profile current
+        if not self.server_communicator.notifications_connected:
+            self.cache["user"] = self.server_communicator.get_user_profile(
+                self.user["username"]
+            )
+        self.user = self.cache["user"]
         self.entry_list = self.user[self.type]
         self.loading = False
         self.create_screen()
@@ -29,6 +29,8 @@ class LeaderboardScreen(ListScreen):
             refresh_rate,
             background_path,
         )
+        # Whether the whole leaderboard was already fetched
+        self.board_exhausted = False
 
     def create_screen(self):
         self.buttons = {}
@@ -107,16 +109,33 @@ class LeaderboardScreen(ListScreen):
         self.running = False
 
     def sprint_leaderboard(self, line_num):
-        self.entry_list = self.cache[f"{line_num}l_leaderboard"]
-        self.display_leaderboard(str(line_num) + "l")
+        self.open_leaderboard(str(line_num) + "l")
 
     def marathon_leaderboard(self):
-        self.entry_list = self.cache["marathon_leaderboard"]
-        self.display_leaderboard("marathon")
+        self.open_leaderboard("marathon")
 
     def apm_leaderboard(self):
-        self.entry_list = self.cache["apm_leaderboard"]
-        self.display_leaderboard("apm")
+        self.open_leaderboard("apm")
+
+    def open_leaderboard(self, score_type):
+        # The cache only holds the pages fetched so far
+        self.entry_list = self.cache[f"{score_type}_leaderboard"]
+        self.board_exhausted = (
+            len(self.entry_list) % self.server_communicator.LEADERBOARD_PAGE_SIZE != 0
+        )
+        self.display_leaderboard(score_type)
+
+    def load_next_page(self, score_type):
+        """Fetches the next page of the leaderboard when scrolling gets within a screen of its end"""
+        loaded = len(self.entry_list)
+        if self.board_exhausted or self.offset + self.num_on_screen * 2 < loaded:
+            return
+        page = self.server_communicator.get_leaderboard_page(score_type, loaded)
+        self.board_exhausted = (
+            len(page) < self.server_communicator.LEADERBOARD_PAGE_SIZE
+        )
+        self.entry_list = self.entry_list + page
+        self.cache[f"{score_type}_leaderboard"] = self.entry_list
 
     def sprint_leaderboard_menu(self):
         self.buttons = {}
@@ -348,6 +367,7 @@ class LeaderboardScreen(ListScreen):
         self.display_leaderboard(score_type)
 
     def scroll_down(self, score_type):
+        self.load_next_page(score_type)
         offset = self.offset
         self.offset = self.offset = min(
             max(0, len(self.entry_list) - self.num_on_screen), self.offset + 1
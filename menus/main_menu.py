@@ -9,6 +9,7 @@ from typing import Optional, Dict
 import pygame
 
 from database.server_communicator import ServerCommunicator
+from network import FramedSocket
 from menus.friend_screen import FriendsScreen
 from menus.leaderboard_screen import LeaderboardScreen
 from menus.menu_screen import MenuScreen
@@ -24,6 +25,9 @@ class MainMenu(MenuScreen):
     """The starting screen of the game"""
 
     GAME_PORT = 44444
+    CACHE_POLL_INTERVAL = 10
+    # While the push channel is up, polling is only a safety net for missed events
+    PUSHED_CACHE_POLL_INTERVAL = 120
     BUTTON_PRESS = pygame.MOUSEBUTTONDOWN
     BACKGROUND_MUSIC = {"theme": pygame.mixer.Sound("sounds/01. Main Menu.mp3")}
     for sound in BACKGROUND_MUSIC.values():
@@ -48,6 +52,9 @@ class MainMenu(MenuScreen):
         self.text_cursor_ticks = pygame.time.get_ticks()
         self.socket = socket.socket()
         self.cache = cache
+        # Set by pushed events, shown by the menu loop
+        self.pending_invite = ""
+        self.pending_popups = []
 
     def run(self):
         """Main loop of the main menu"""
@@ -68,16 +75,37 @@ class MainMenu(MenuScreen):
                 self.run_once()
 
                 # Display invites
+                if self.pending_invite:
+                    self.display_invite(self.pending_invite)
+                    self.pending_invite = ""
+                while self.pending_popups:
+                    self.create_popup_button(
+                        self.pending_popups.pop(0), color=Colors.BLUE
+                    )
                 cur_time = round(time.time())
-                if cur_time % 10 == 0 and cur_time != old_time:
+                # Without the push channel, poll for invites instead
+                if (
+                    cur_time % 10 == 0
+                    and cur_time != old_time
+                    and not self.server_communicator.notifications_connected
+                ):
                     old_time = cur_time
                     threading.Thread(target=self.check_invite, daemon=True).start()
                 pygame.display.flip()
 
     def keep_cache_updated(self):
+        last_update = time.time()
         while self.running:
-            time.sleep(10)
-            new_cache = self.cache_stats(self.user["username"])
+            time.sleep(self.CACHE_POLL_INTERVAL)
+            if (
+                self.server_communicator.notifications_connected
+                and time.time() - last_update < self.PUSHED_CACHE_POLL_INTERVAL
+            ):
+                continue
+            last_update = time.time()
+            new_cache = self.cache_stats(
+                self.user["username"], self.cache.get("versions")
+            )
             # Update the relevant cache parts
             for key in new_cache:
                 self.cache[key] = new_cache[key]
@@ -87,6 +115,21 @@ class MainMenu(MenuScreen):
         self.running = True
         threading.Thread(target=self.update_mouse_pos, daemon=True).start()
         threading.Thread(target=self.keep_cache_updated, daemon=True).start()
+        self.server_communicator.listen_notifications(
+            self.user["username"], self.handle_notification
+        )
+
+    def handle_notification(self, event: Dict):
+        """Applies an event pushed by the server"""
+        if event["type"] == "section":
+            # Update the cache in place, every screen shares it
+            self.cache[event["section"]] = event["data"]
+            self.cache.setdefault("versions", {})[event["section"]] = event["version"]
+        elif event["type"] == "invite":
+            # An empty inviter means the invite was dismissed
+            self.pending_invite = event["inviter"]
+        elif event["type"] == "friend_request":
+            self.pending_popups.append(f"{event['sender']}\nsent you a friend request")
 
     def check_invite(self):
         """Check whether the user was invited"""
@@ -190,6 +233,7 @@ class MainMenu(MenuScreen):
     def connect_to_room(self, room: Dict):
         sock = socket.socket()
         sock.connect((room["ip"], 44444))
+        sock = FramedSocket(sock)
         # Start the main menu
         waiting_room = WaitingRoom(
             self.cache["user"],
@@ -214,7 +258,7 @@ class MainMenu(MenuScreen):
         invite_ip = self.server_communicator.get_invite_ip(self.user["username"])
         self.socket.connect((invite_ip, 44444))
         # Notify the server of declination
-        self.socket.send(f"Declined%{self.user['username']}".encode())
+        FramedSocket(self.socket).send_text(f"Declined%{self.user['username']}")
         # Close the connection
         self.socket.close()
         self.socket = socket.socket()
@@ -395,9 +439,7 @@ class MainMenu(MenuScreen):
         user = self.cache["user"]
         user["music"] = music
         self.cache["user"] = user
-        threading.Thread(
-            target=self.server_communicator.update_music, args=(user["username"], music)
-        ).start()
+        self.server_communicator.update_music(user["username"], music)
 
     def settings(self):
         """A screen in which the user can change his settings"""
@@ -1,9 +1,7 @@
-import concurrent
 import socket
 import threading
 import time
 from abc import ABC
-from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Dict, Tuple
 
 import pygame
@@ -535,64 +533,11 @@ class MenuScreen(ABC):
         if flip:
             pygame.display.update()
 
-    def cache_stats(self, username):
-        start_time = time.time()
-        cache = {}
-        with ThreadPoolExecutor() as executor:
-            futures = []
-
-            cur_future = executor.submit(self.server_communicator.get_apm_leaderboard)
-            futures.append(cur_future)
-            cache[cur_future] = "apm_leaderboard"
-
-            cur_future = executor.submit(
-                self.server_communicator.get_marathon_leaderboard
-            )
-            futures.append(cur_future)
-            cache[cur_future] = "marathon_leaderboard"
-
-            cur_future = executor.submit(
-                self.server_communicator.get_sprint_leaderboard, 20
-            )
-            futures.append(cur_future)
-            cache[cur_future] = "20l_leaderboard"
-
-            cur_future = executor.submit(
-                self.server_communicator.get_sprint_leaderboard, 40
-            )
-            futures.append(cur_future)
-            cache[cur_future] = "40l_leaderboard"
-
-            cur_future = executor.submit(
-                self.server_communicator.get_sprint_leaderboard, 100
-            )
-            futures.append(cur_future)
-            cache[cur_future] = "100l_leaderboard"
-
-            cur_future = executor.submit(
-                self.server_communicator.get_sprint_leaderboard, 1000
-            )
-            futures.append(cur_future)
-            cache[cur_future] = "1000l_leaderboard"
-
-            cur_future = executor.submit(self.server_communicator.get_rooms)
-            futures.append(cur_future)
-            cache[cur_future] = "rooms"
-
-            cur_future = executor.submit(
-                self.server_communicator.get_user_profile, username
-            )
-            futures.append(cur_future)
-            cache[cur_future] = "user"
-
-        new_cache = {}
-
-        for future in concurrent.futures.as_completed(futures):
-            new_cache[cache[future]] = future.result()
-
-        # print(new_cache)
-        # print(f"it took: {time.time() - start_time}secs")
-
+    def cache_stats(self, username, versions: Optional[Dict] = None):
+        """Returns the cache sections which changed since the given versions, along with their new versions"""
+        bootstrap = self.server_communicator.get_bootstrap(username, versions or {})
+        new_cache = bootstrap["sections"]
+        new_cache["versions"] = bootstrap["versions"]
         return new_cache
 
     def change_binary_button(self, button):
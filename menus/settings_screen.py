@@ -286,17 +286,14 @@ class SettingsScreen(MenuScreen):
             # Update the cache
             self.cache["user"] = user
             # Update the server
-            threading.Thread(
-                target=self.server_communicator.update_settings,
-                args=(
-                    user["username"],
-                    int(das_speed),
-                    int(arr_speed) * 10,
-                    self.skin,
-                    ghost,
-                    fade,
-                ),
-            ).start()
+            self.server_communicator.update_settings(
+                user["username"],
+                int(das_speed),
+                int(arr_speed) * 10,
+                self.skin,
+                ghost,
+                fade,
+            )
             self.quit()
             return
         # In case some entries weren't valid and we haven't quit
@@ -1,5 +1,4 @@
 import math
-import pickle
 import socket
 import threading
 from typing import Optional, Dict
@@ -10,8 +9,11 @@ from menus.menu_screen import MenuScreen
 from tetris.tetris_client import TetrisClient
 from tetris.tetris_game import TetrisGame
 from tetris.colors import Colors
+from tetris.asset_registry import AssetRegistry
 from menus.text_box import TextBox
 from database.server_communicator import ServerCommunicator
+from network import FramedSocket
+from network.framing import TEXT
 from menus.user_profile_screen import UserProfile
 
 
@@ -34,7 +36,7 @@ class WaitingRoom(MenuScreen):
         is_admin: bool,
         room_name: str,
         cache: Dict,
-        server_socket: socket.socket,
+        server_socket: FramedSocket,
         server_communicator: ServerCommunicator,
         width: int,
         height: int,
@@ -92,17 +94,17 @@ class WaitingRoom(MenuScreen):
     def establish_connection(self):
         """Sends and receives the appropriate data from the server on connection"""
         # Receive the player list from the server
-        self.players = pickle.loads(self.sock.recv(25600))
+        self.players = self.sock.recv_json()
         # Send confirmation to server
-        self.sock.send("received".encode())
+        self.sock.send_text("received")
         self.display_players()
         # Receive the ready players list from the server
-        self.ready_players = pickle.loads(self.sock.recv(25600))
+        self.ready_players = self.sock.recv_json()
         # Display player readiness
         for user in self.ready_players:
             self.handle_buttons_when_ready(user)
         # Send the server our username
-        self.sock.send(self.user["username"].encode())
+        self.sock.send_text(self.user["username"])
 
     def challenge_player(self):
         self.buttons[self.invite_btn] = (None, ())
@@ -138,7 +140,7 @@ class WaitingRoom(MenuScreen):
             (),
         )
 
-    def start_client_game(self, server_ip, bag_seed, port):
+    def start_client_game(self, server_ip, bag_seed, port, match_id):
         client_game = TetrisGame(
             500 + 200,
             1000,
@@ -148,7 +150,9 @@ class WaitingRoom(MenuScreen):
             75,
         )
         client_game.set_bag_seed(bag_seed)
-        client = TetrisClient(client_game, server_ip, port, self.user["username"])
+        client = TetrisClient(
+            client_game, server_ip, port, self.user["username"], match_id
+        )
         client.run()
         # threading.Thread(target=client.run).start()
 
@@ -156,17 +160,28 @@ class WaitingRoom(MenuScreen):
         while self.running:
             try:
                 self.sock.settimeout(1)
-                msg = self.sock.recv(1024).decode()
-                print("msg:", msg)
-            # Messages from last game (the tetris game which just ended)
-            except (UnicodeDecodeError, socket.timeout):
-                print("skipped")
+                message = self.sock.recv_message()
+            except socket.timeout:
+                continue
+            # The server closed the connection
+            if message is None:
+                return
+            message_type, msg = message
+            # Only chat and room updates are sent as text
+            if message_type != TEXT:
                 continue
+            msg = msg.decode()
+            print("msg:", msg)
             # Game started
             if msg[: len("Started%")] == "Started%":
                 msg = msg.replace("Started%", "")
-                seed, port = msg.split(",")
-                self.start_args = (self.sock.getpeername()[0], float(seed), int(port))
+                seed, port, match_id = msg.split(",")
+                self.start_args = (
+                    self.sock.getpeername()[0],
+                    seed,
+                    int(port),
+                    int(match_id),
+                )
                 return
             # Someone readied
             elif msg[: len("Ready%")] == "Ready%":
@@ -237,13 +252,12 @@ class WaitingRoom(MenuScreen):
             cur_y = ref_button.starting_y + ref_button.height
 
             font_size = 20
+            font = AssetRegistry.get_font(font_size)
             messages = []
             sentence = ""
             for word in msg.split(" "):
-                rendered_sentence = pygame.font.Font(
-                    "tetris/tetris-resources/joystix-monospace.ttf", font_size
-                ).render(sentence + word, True, Colors.WHITE)
-                if rendered_sentence.get_rect()[2] > button_width:
+                sentence_width = font.size(sentence + word)[0]
+                if sentence_width > button_width:
                     messages.append(sentence)
                     sentence = ""
                 sentence += word + " "
@@ -425,7 +439,7 @@ class WaitingRoom(MenuScreen):
         self.text_offset -= 1
 
     def send_message(self):
-        self.sock.send(f"{self.user['username']}: {self.message}".encode())
+        self.sock.send_text(f"{self.user['username']}: {self.message}")
 
     def create_room(self):
         # Create the back arrow
@@ -582,7 +596,7 @@ class WaitingRoom(MenuScreen):
 
     def quit(self):
         pygame.mixer.stop()
-        self.sock.send("disconnect".encode())
+        self.sock.send_text("disconnect")
         self.running = False
         self.sock.detach()
 
@@ -672,7 +686,7 @@ class WaitingRoom(MenuScreen):
     def pressed_ready(self, username: str = ""):
         send_to_server = self.handle_buttons_when_ready(username)
         if send_to_server:
-            self.sock.send(f"Ready%{self.user['username']}".encode())
+            self.sock.send_text(f"Ready%{self.user['username']}")
 
     def handle_buttons_when_ready(self, username: str = ""):
         if username:
@@ -386,14 +386,7 @@ class WelcomeScreen(MenuScreen):
             new_outer_ip = self.get_outer_ip()
             # Update routine user stats (online, ip etc...)
             print("hello")
-            threading.Thread(
-                target=self.server_communicator.on_connection,
-                args=(
-                    user["username"],
-                    new_outer_ip,
-                ),
-                daemon=True,
-            ).start()
+            self.server_communicator.on_connection(user["username"], new_outer_ip)
             # Cache stats
             cache = self.cache_stats(user["username"])
             # Close the welcome screen
@@ -0,0 +1,3 @@
+from .framing import pack_frame, FrameBuffer, FramingError
+from .framed_socket import FramedSocket
+from .board_protocol import BoardEncoder, BoardDecoder, BoardUpdate, ProtocolError
@@ -0,0 +1,218 @@
+"""The binary messages multiplayer games send each other through the game server.
+
+Every message starts with the protocol version and the message type. A board is sent as 4 bit
+cell codes, 5 bytes per row, either in full (a keyframe) or as only the rows that changed since
+the last message (a delta)."""
+import struct
+from typing import List, NamedTuple, Optional
+
+PROTOCOL_VERSION = 1
+
+# Message types
+BOARD_KEYFRAME = 1
+BOARD_DELTA = 2
+GAME_RESULT = 3
+
+# Game results
+RESULT_LOST = 0
+RESULT_WON = 1
+
+BOARD_HEIGHT = 20
+BOARD_WIDTH = 10
+CELL_BITS = 4
+ROW_SIZE = BOARD_WIDTH * CELL_BITS // 8
+# Every symbol a cell of the board can hold, by it's cell code - "N" is an empty cell
+CELL_SYMBOLS = ("N", "I", "J", "L", "O", "S", "T", "Z", "G")
+CELL_CODES = {symbol: code for code, symbol in enumerate(CELL_SYMBOLS)}
+# The amount of skins a player can pick from
+SKIN_COUNT = 11
+
+# version, type
+HEADER = struct.Struct("!BB")
+# sequence number, garbage lines, skin
+KEYFRAME_FIELDS = struct.Struct("!HBB")
+# sequence number, base sequence number, garbage lines, skin, changed rows mask
+DELTA_FIELDS = struct.Struct("!HHBBI")
+# result
+RESULT_FIELDS = struct.Struct("!B")
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+class BoardUpdate(NamedTuple):
+    # The opponent's screen, None if it couldn't be updated
+    screen: Optional[List[List[str]]]
+    garbage_lines: int
+    skin: int
+
+
+def get_message_type(payload: bytes) -> int:
+    """Returns the type of a message, after making sure it's of a version we can read"""
+    if len(payload) < HEADER.size:
+        raise ProtocolError("Message is too short")
+    version, message_type = HEADER.unpack_from(payload)
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f"Unsupported protocol version {version}")
+    return message_type
+
+
+def encode_row(row: List[str]) -> int:
+    """Packs the symbols of a row into a single number, 4 bits per cell"""
+    packed_row = 0
+    for column, symbol in enumerate(row):
+        packed_row |= CELL_CODES[symbol] << column * CELL_BITS
+    return packed_row
+
+
+def decode_row(packed_row: int) -> List[str]:
+    row = []
+    for column in range(BOARD_WIDTH):
+        code = packed_row >> column * CELL_BITS & 0xF
+        if code >= len(CELL_SYMBOLS):
+            raise ProtocolError(f"Unknown cell code {code}")
+        row.append(CELL_SYMBOLS[code])
+    return row
+
+
+def check_skin(skin: int):
+    if skin >= SKIN_COUNT:
+        raise ProtocolError(f"Unknown skin {skin}")
+
+
+def encode_result(result: int) -> bytes:
+    return HEADER.pack(PROTOCOL_VERSION, GAME_RESULT) + RESULT_FIELDS.pack(result)
+
+
+def decode_result(payload: bytes) -> int:
+    return RESULT_FIELDS.unpack_from(payload, HEADER.size)[0]
+
+
+class BoardEncoder:
+    """Encodes a player's board, sending only the rows that changed since the last message and
+    a full keyframe every once in a while"""
+
+    def __init__(self, keyframe_interval: int = 40):
+        self.keyframe_interval = keyframe_interval
+        self.last_rows: Optional[List[int]] = None
+        self.sequence = 0
+        self.messages_since_keyframe = 0
+
+    def has_changed(self, screen: List[List[str]]) -> bool:
+        """Returns whether the board is any different from the last one sent"""
+        return self.last_rows != [encode_row(row) for row in screen]
+
+    def encode(self, screen: List[List[str]], garbage_lines: int, skin: int) -> bytes:
+        """Returns the message to send for the current board"""
+        rows = [encode_row(row) for row in screen]
+        base_sequence = self.sequence
+        self.sequence = (self.sequence + 1) & 0xFFFF
+
+        if (
+            self.last_rows is None
+            or self.messages_since_keyframe >= self.keyframe_interval
+        ):
+            message = self.encode_keyframe(rows, garbage_lines, skin)
+        else:
+            message = self.encode_delta(rows, base_sequence, garbage_lines, skin)
+
+        self.last_rows = rows
+        return message
+
+    def encode_keyframe(self, rows: List[int], garbage_lines: int, skin: int) -> bytes:
+        self.messages_since_keyframe = 0
+        message = HEADER.pack(PROTOCOL_VERSION, BOARD_KEYFRAME)
+        message += KEYFRAME_FIELDS.pack(self.sequence, garbage_lines, skin)
+        return message + b"".join(row.to_bytes(ROW_SIZE, "big") for row in rows)
+
+    def encode_delta(
+        self, rows: List[int], base_sequence: int, garbage_lines: int, skin: int
+    ) -> bytes:
+        self.messages_since_keyframe += 1
+        changed_rows = [
+            index for index, row in enumerate(rows) if row != self.last_rows[index]
+        ]
+        changed_rows_mask = 0
+        for index in changed_rows:
+            changed_rows_mask |= 1 << index
+
+        message = HEADER.pack(PROTOCOL_VERSION, BOARD_DELTA)
+        message += DELTA_FIELDS.pack(
+            self.sequence, base_sequence, garbage_lines, skin, changed_rows_mask
+        )
+        return message + b"".join(
+            rows[index].to_bytes(ROW_SIZE, "big") for index in changed_rows
+        )
+
+
+class BoardDecoder:
+    """Rebuilds the opponent's board from the messages it sent"""
+
+    def __init__(self):
+        self.rows = [0] * BOARD_HEIGHT
+        # The sequence number of the last board applied, None until a keyframe arrives
+        self.sequence: Optional[int] = None
+
+    def decode(self, payload: bytes) -> BoardUpdate:
+        """Applies a board message, the screen of the update is None if it's a delta to a
+        board we don't have - the garbage lines always count"""
+        message_type = get_message_type(payload)
+        if message_type == BOARD_KEYFRAME:
+            return self.decode_keyframe(payload)
+        if message_type == BOARD_DELTA:
+            return self.decode_delta(payload)
+        raise ProtocolError(f"Not a board message: {message_type}")
+
+    def decode_keyframe(self, payload: bytes) -> BoardUpdate:
+        offset = HEADER.size
+        sequence, garbage_lines, skin = KEYFRAME_FIELDS.unpack_from(payload, offset)
+        offset += KEYFRAME_FIELDS.size
+        if len(payload) != offset + BOARD_HEIGHT * ROW_SIZE:
+            raise ProtocolError("Keyframe has the wrong size")
+        check_skin(skin)
+
+        rows = [
+            int.from_bytes(payload[start : start + ROW_SIZE], "big")
+            for start in range(offset, len(payload), ROW_SIZE)
+        ]
+        # Decoded before the board is replaced, so a bad message leaves it as it was
+        screen = [decode_row(row) for row in rows]
+        self.rows = rows
+        self.sequence = sequence
+        return BoardUpdate(screen, garbage_lines, skin)
+
+    def decode_delta(self, payload: bytes) -> BoardUpdate:
+        offset = HEADER.size
+        (
+            sequence,
+            base_sequence,
+            garbage_lines,
+            skin,
+            changed_rows_mask,
+        ) = DELTA_FIELDS.unpack_from(payload, offset)
+        offset += DELTA_FIELDS.size
+        changed_rows = [
+            index for index in range(BOARD_HEIGHT) if changed_rows_mask >> index & 1
+        ]
+        if len(payload) != offset + len(changed_rows) * ROW_SIZE:
+            raise ProtocolError("Delta has the wrong size")
+        check_skin(skin)
+
+        # We missed a message, wait for the next keyframe
+        if self.sequence is None or base_sequence != self.sequence:
+            self.sequence = None
+            return BoardUpdate(None, garbage_lines, skin)
+
+        rows = self.rows.copy()
+        for index in changed_rows:
+            rows[index] = int.from_bytes(payload[offset : offset + ROW_SIZE], "big")
+            offset += ROW_SIZE
+        # Decoded before the board is replaced, so a bad message leaves it as it was
+        screen = [decode_row(row) for row in rows] if changed_rows else None
+        self.rows = rows
+        self.sequence = sequence
+        return BoardUpdate(screen, garbage_lines, skin)
+
+    def get_screen(self) -> List[List[str]]:
+        return [decode_row(row) for row in self.rows]
@@ -0,0 +1,94 @@
+import json
+import socket
+from collections import deque
+from typing import Any, Deque, List, Optional, Tuple
+
+from network.framing import pack_frame, FrameBuffer, TEXT, JSON, BINARY
+
+
+class FramedSocket:
+    """Sends and receives whole typed messages over a TCP socket, no matter how the stream
+    splits or joins them"""
+
+    RECV_SIZE = 4096
+
+    def __init__(self, sock: socket.socket):
+        self.socket = sock
+        self.frame_buffer = FrameBuffer()
+        # Messages which were received but not handed out yet
+        self.messages: Deque[Tuple[int, bytes]] = deque()
+        self.closed = False
+
+    def connect(self, address: Tuple[str, int]):
+        self.socket.connect(address)
+
+    def fileno(self) -> int:
+        """Lets the framed socket be used in select"""
+        return self.socket.fileno()
+
+    def send_message(self, message_type: int, payload: bytes):
+        self.socket.sendall(pack_frame(payload, message_type))
+
+    def send_text(self, text: str):
+        self.send_message(TEXT, text.encode())
+
+    def send_json(self, data: Any):
+        self.send_message(JSON, json.dumps(data).encode())
+
+    def send_binary(self, data: bytes):
+        self.send_message(BINARY, data)
+
+    def recv_available(self) -> List[Tuple[int, bytes]]:
+        """Reads from the socket once, and returns every message completed by the read.
+        Used when select says the socket is readable. Sets closed if the peer closed it."""
+        # Messages left over from a blocking read are handed out first
+        if not self.messages:
+            data = self.socket.recv(self.RECV_SIZE)
+            if not data:
+                self.closed = True
+            self.messages.extend(self.frame_buffer.feed(data))
+        messages = list(self.messages)
+        self.messages.clear()
+        return messages
+
+    def recv_message(self) -> Optional[Tuple[int, bytes]]:
+        """Blocks until a whole message arrives, returns None if the connection was closed"""
+        while not self.messages:
+            if self.closed:
+                return None
+            data = self.socket.recv(self.RECV_SIZE)
+            if not data:
+                self.closed = True
+            self.messages.extend(self.frame_buffer.feed(data))
+        return self.messages.popleft()
+
+    def recv_text(self) -> Optional[str]:
+        """Blocks until a text message arrives, messages of other types are dropped"""
+        return self.recv_of_type(TEXT, lambda payload: payload.decode())
+
+    def recv_json(self) -> Any:
+        """Blocks until a json message arrives, messages of other types are dropped"""
+        return self.recv_of_type(JSON, json.loads)
+
+    def recv_of_type(self, message_type: int, decode):
+        while True:
+            message = self.recv_message()
+            if message is None:
+                return None
+            if message[0] == message_type:
+                return decode(message[1])
+
+    def settimeout(self, timeout: Optional[float]):
+        self.socket.settimeout(timeout)
+
+    def getpeername(self):
+        return self.socket.getpeername()
+
+    def getsockname(self):
+        return self.socket.getsockname()
+
+    def close(self):
+        self.socket.close()
+
+    def detach(self):
+        return self.socket.detach()
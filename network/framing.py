@@ -0,0 +1,48 @@
+import struct
+from typing import List, Tuple
+
+# Every frame starts with the length of it's payload and the type of message it holds
+HEADER = struct.Struct("!IB")
+# Frames bigger than this are considered garbage
+MAX_FRAME_SIZE = 1 << 20
+
+# Message types
+TEXT = 1
+JSON = 2
+BINARY = 3
+
+
+class FramingError(ValueError):
+    pass
+
+
+def pack_frame(payload: bytes, message_type: int = BINARY) -> bytes:
+    """Prefixes a payload with it's header so it can be read back from a stream"""
+    if len(payload) > MAX_FRAME_SIZE:
+        raise FramingError(f"Frame of {len(payload)} bytes is too big")
+    return HEADER.pack(len(payload), message_type) + payload
+
+
+class FrameBuffer:
+    """Collects the bytes received from a stream and splits them back into frames - a read can
+    hold a part of a frame, or many of them"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data: bytes) -> List[Tuple[int, bytes]]:
+        """Adds received bytes to the buffer, returns the (type, payload) of every complete
+        frame"""
+        self.buffer += data
+        frames = []
+        while len(self.buffer) >= HEADER.size:
+            length, message_type = HEADER.unpack_from(self.buffer)
+            if length > MAX_FRAME_SIZE:
+                raise FramingError(f"Frame of {length} bytes is too big")
+            frame_end = HEADER.size + length
+            # The rest of the frame hasn't arrived yet
+            if len(self.buffer) < frame_end:
+                break
+            frames.append((message_type, bytes(self.buffer[HEADER.size : frame_end])))
+            del self.buffer[:frame_end]
+        return frames
@@ -30,6 +30,13 @@ class Game:
         self.event_handlers: Dict[int, EVENT_HANDLER_TYPE] = {}
         self.game_objects: List[GameObject, GridGameObject] = []
         self.last_pressed_key = 0
+        # Whether only the parts of the screen that changed are pushed to the display every
+        # frame, instead of the whole screen
+        self.dirty_rects_mode = False
+        # The parts of the screen that changed since the last frame
+        self.dirty_rects: List[pygame.Rect] = []
+        # Whether the whole screen should be pushed to the display on the next frame
+        self.full_update = True
 
         self.background_image = (
             pygame.image.load(background_path) if background_path else None
@@ -61,7 +68,7 @@ class Game:
 
             self.end_of_loop()
 
-            pygame.display.flip()
+            self.update_display()
 
             clock.tick(self.refresh_rate)
 
@@ -69,6 +76,23 @@ class Game:
         for game_object in self.game_objects:
             game_object.display_object(self.screen)
 
+    def mark_dirty(self, rect):
+        """Mark a part of the screen as changed, so it will be pushed to the display"""
+        self.dirty_rects.append(pygame.Rect(rect))
+
+    def mark_full_update(self):
+        """Push the whole screen to the display on the next frame"""
+        self.full_update = True
+
+    def update_display(self):
+        """Push the current frame to the display"""
+        if not self.dirty_rects_mode or self.full_update:
+            pygame.display.flip()
+        elif self.dirty_rects:
+            pygame.display.update(self.dirty_rects)
+        self.dirty_rects = []
+        self.full_update = False
+
     def set_event_handler(self, event_num: int, func: EVENT_HANDLER_TYPE):
         self.event_handlers[event_num] = func
 
@@ -1,15 +1,47 @@
-import pickle
+import queue
 import socket
 import threading
 import time
+from concurrent.futures import Future
 from select import select
-from typing import List
+from typing import Callable, Dict, List, Optional
 
 from requests import get
 
 from database.db_post_creator import DBPostCreator
 from database.server_communicator import ServerCommunicator
-from game_server import GameServer
+from match_server import MatchServer
+from network import FramedSocket
+from network.framing import TEXT
+
+
+class Outbox:
+    """Sends the messages queued for a client from a thread of it's own, in order, so the room
+    never waits on a slow client. Closes the client's socket once it's closed."""
+
+    def __init__(self, client: FramedSocket):
+        self.client = client
+        # Every text waiting to be sent, None closes the connection
+        self.messages: queue.Queue = queue.Queue()
+        threading.Thread(target=self.write_loop, daemon=True).start()
+
+    def send_text(self, text: str):
+        self.messages.put(text)
+
+    def close(self):
+        self.messages.put(None)
+
+    def write_loop(self):
+        try:
+            while True:
+                text = self.messages.get()
+                if text is None:
+                    break
+                self.client.send_text(text)
+        except OSError:
+            pass
+        finally:
+            self.client.socket.close()
 
 
 class RoomServer:
@@ -26,18 +58,22 @@ class RoomServer:
         private: bool = False,
         admin="",
     ):
-        self.client_list: List[socket.socket] = []
+        self.client_list: List[FramedSocket] = []
+        # The messages waiting to be sent to every client
+        self.outboxes: Dict[FramedSocket, Outbox] = {}
         self.players = {}
         self.reversed_players = {}
         self.players_wins = {}
         self.ready_clients = []
         self.responses_list = []
-        self.data_dict = {}
-        self.game_running = False
+        # Calls other threads made to the room, run by the room's own loop
+        self.calls: queue.Queue = queue.Queue()
+        # Written to whenever a call is queued, so the loop's select wakes up for it
+        self.wakeup_reader, self.wakeup_writer = socket.socketpair()
         self.room_name = room_name
         self.admin = admin
         self.default = default
-        self.current_game_port = self.SERVER_PORT + 2
+        self.match_server: Optional[MatchServer] = None
 
         self.server_socket = socket.socket()
         self.outer_ip = outer_ip
@@ -71,56 +107,19 @@ class RoomServer:
             self.server_socket.listen(1)
             # Always accept new clients
             threading.Thread(target=self.connect_clients, daemon=True).start()
+            # Games are played on the process' match server, so the room keeps running
+            self.match_server = MatchServer.get_shared(listen_ip)
             while True:
-                if not self.client_list:
-                    continue
-                read_list, write_list, _ = select(
-                    self.client_list, self.client_list, []
+                # Sleeps until a client sent something or another thread called the room
+                read_list, _, _ = select(
+                    [self.wakeup_reader] + self.client_list, [], []
                 )
+                if self.wakeup_reader in read_list:
+                    read_list.remove(self.wakeup_reader)
+                    self.handle_calls()
                 self.handle_read(read_list)
-                self.handle_write(write_list)
-                if len(self.ready_clients) < 2:
-                    continue
-                else:
-                    # Start the game
-                    game_server = GameServer(
-                        listen_ip, self.current_game_port, self.ready_clients
-                    )
-
-                    self.game_running = True
-                    print(self.client_list)
-                    winner, players = game_server.run()
-                    self.game_running = False
-
-                    # Update the player's on the winner
-                    if winner:
-                        self.players_wins[winner] += 1
-
-                    player_left = None
-                    temp_players = {
-                        player: self.players[player]
-                        for player in self.players
-                        if self.players[player] in players
-                    }
-                    for player in self.players:
-                        if player not in temp_players:
-                            player_left = player
-
-                    if winner:
-                        for client in self.client_list:
-                            client.send(f"Win%{winner}".encode())
-                    else:
-                        self.handle_message("disconnect", player_left)
-                        self.players = temp_players
-                        self.client_list = list(self.players.keys())
-
-                    # Accept clients again
-                    threading.Thread(target=self.connect_clients, daemon=True).start()
-
-                    self.current_game_port += 1
-
-                    self.ready_clients = []
-                    # self.client_list = new_clients
+                if len(self.ready_clients) >= 2:
+                    self.start_match()
 
         except Exception as e:
             print("bruhhh", e)
@@ -128,23 +127,93 @@ class RoomServer:
     def remove_server(self):
         self.server_communicator.remove_room(self.room_name)
 
-    @staticmethod
-    def notify_client_of_game_start(client, time_at_start, server_port):
-        client.send(f"Started%{time_at_start},{server_port}".encode())
+    def call_soon(self, function: Callable, *args):
+        """Has the room's loop call the function, can be called from any thread"""
+        self.calls.put((function, args))
+        self.wakeup_writer.send(b"\0")
+
+    def call(self, function: Callable, *args):
+        """Has the room's loop call the function and waits for what it returns"""
+        result = Future()
+        self.call_soon(lambda: result.set_result(function(*args)))
+        return result.result()
+
+    def handle_calls(self):
+        self.wakeup_reader.recv(4096)
+        while not self.calls.empty():
+            function, args = self.calls.get()
+            function(*args)
+
+    def send(self, client: FramedSocket, text: str):
+        self.outboxes[client].send_text(text)
+
+    def start_match(self):
+        """Opens a match for the ready players and tells them where to join it"""
+        players = {self.players[client]: client for client in self.ready_clients}
+        match_id = self.match_server.create_match(
+            list(players.keys()),
+            lambda winner, disconnected: self.call_soon(
+                self.handle_finished_match,
+                winner,
+                [players[player] for player in disconnected],
+            ),
+        )
+        # Getting the match's seed from the server shouldn't hold up the room
+        threading.Thread(
+            target=self.send_game_start,
+            args=(self.ready_clients, match_id),
+            daemon=True,
+        ).start()
+        self.ready_clients = []
+
+    def send_game_start(self, clients: List[FramedSocket], match_id: int):
+        """Both players play on the same pieces, from a seed the server issued so their
+        replays are verified"""
+        bag_seed = self.server_communicator.get_seed() or str(time.time())
+        for client in clients:
+            self.call_soon(
+                self.notify_client_of_game_start,
+                client,
+                bag_seed,
+                self.match_server.port,
+                match_id,
+            )
 
-    def handle_read(self, read_list: List[socket.socket]):
+    def notify_client_of_game_start(self, client, bag_seed, server_port, match_id):
+        # The player may have left while the seed was on the way
+        if client in self.outboxes:
+            self.send(client, f"Started%{bag_seed},{server_port},{match_id}")
+
+    def handle_finished_match(self, winner: str, disconnected: List[FramedSocket]):
+        """Updates the players on the match's winner, or on the players who left it"""
+        if winner in self.players_wins:
+            self.players_wins[winner] += 1
+            for client in self.client_list:
+                self.send(client, f"Win%{winner}")
+
+        # Someone left in the middle of the match
+        for client in disconnected:
+            if client in self.client_list:
+                self.handle_message("disconnect", client)
+
+    def handle_read(self, read_list: List[FramedSocket]):
         """Handles reading from the clients"""
         for client in read_list:
-            data = client.recv(25600)
-
-            try:
-                data = data.decode()
-            # Info from the last game
-            except UnicodeDecodeError:
-                print("skipped")
+            # The client may have been removed while handling the calls
+            if client not in self.client_list:
                 continue
-
-            self.handle_message(data, client)
+            try:
+                messages = client.recv_available()
+            except OSError:
+                messages = []
+                client.closed = True
+            for message_type, message in messages:
+                if message_type == TEXT:
+                    self.handle_message(message.decode(), client)
+
+            # The client disconnected without saying so
+            if client.closed and client in self.client_list:
+                self.handle_message("disconnect", client)
 
     def handle_message(self, data, client):
         # The client pressed the ready button
@@ -162,6 +231,7 @@ class RoomServer:
                 self.remove_server()
                 closed = True
             self.client_list.remove(client)
+            self.outboxes.pop(client).close()
             player_name = self.players[client]
             self.players.pop(client)
             if client in self.ready_clients:
@@ -170,7 +240,7 @@ class RoomServer:
 
             for other_client in self.client_list:
                 text_to_send = "closed" if closed else f"!{player_name}"
-                other_client.send(text_to_send.encode())
+                self.send(other_client, text_to_send)
             if closed:
                 quit()
             # Update the removed player in the database
@@ -180,54 +250,61 @@ class RoomServer:
         elif data == self.players[client]:
             return
 
-        # Send the message to every client
-        for other_client in self.client_list:
-            self.data_dict[other_client] = data.encode()
-
-    def handle_write(self, write_list: List[socket.socket]):
-        """Handles writing from the client"""
-        # Send every client their foe's screen
-        for client in write_list:
-            foe_data = self.data_dict.get(client)
-            # A screen is available to send
-            if foe_data:
-                self.data_dict.pop(client)
-                if foe_data.decode() != "got info":
-                    client.send(foe_data)
+        self.broadcast(data)
+
+    def broadcast(self, data: str):
+        """Sends a message to every client"""
+        if data == "got info":
+            return
+        for client in self.client_list:
+            self.send(client, data)
 
     def connect_clients(self):
-        while not self.game_running:
+        """Accepts new clients and greets them. The room's state is only read and changed
+        by the room's loop, so this thread asks the loop for it."""
+        while True:
             client, addr = self.server_socket.accept()
-            if client in self.client_list:
-                continue
+            client = FramedSocket(client)
 
             # Send the client the player name list
-            client.send(pickle.dumps(self.players_wins))
+            client.send_json(self.call(dict, self.players_wins))
             # Receive ok/declination from client
-            msg = ""
-            ok = client.recv(1024).decode()
-            if ok[0 : len("Declined%")] == "Declined%":
-                msg = f"{ok[len('Declined%'):]} declined an invitation"
+            ok = client.recv_text()
+            # The client left before answering
+            if ok is None:
+                client.socket.close()
+                continue
             # The client declined an invitation
-            if msg:
-                self.handle_message(msg, client)
-                return
+            if ok[0 : len("Declined%")] == "Declined%":
+                self.call_soon(
+                    self.broadcast, f"{ok[len('Declined%'):]} declined an invitation"
+                )
+                client.socket.close()
+                continue
 
             # Send the client all ready players
-            ready_players = [self.players[client] for client in self.ready_clients]
-            client.send(pickle.dumps(ready_players))
+            client.send_json(self.call(self.get_ready_players))
+
+            name = client.recv_text()
+            if name is None:
+                client.socket.close()
+                continue
+            self.call_soon(self.add_client, client, name)
 
-            # Add the client to the relevant lists
-            self.client_list.append(client)
-            name = client.recv(1024).decode()
-            self.players[client] = name
-            self.reversed_players[name] = client
-            self.players_wins[name] = 0
+    def get_ready_players(self) -> List[str]:
+        return [self.players[client] for client in self.ready_clients]
 
-            for client in self.client_list:
-                client.send(name.encode())
+    def add_client(self, client: FramedSocket, name: str):
+        """Add the client to the relevant lists"""
+        self.client_list.append(client)
+        self.outboxes[client] = Outbox(client)
+        self.players[client] = name
+        self.reversed_players[name] = client
+        self.players_wins[name] = 0
 
-            threading.Thread(target=self.update_player_num).start()
+        self.broadcast(name)
+
+        threading.Thread(target=self.update_player_num).start()
 
     def update_player_num(self):
         print(len(self.client_list))
@@ -0,0 +1,48 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The tests import the packages from the root of the repository, like the client does,
+# and the server's modules from it's own directory, like the server does
+sys.path.insert(0, ROOT)
+sys.path.insert(1, os.path.join(ROOT, "database"))
+
+# The server runs on an in-memory database, and never reads the mail credentials from files
+os.environ.setdefault("MONGO_BACKEND", "mongomock")
+os.environ.setdefault("GMAIL", "tests@example.com")
+os.environ.setdefault("PASSWORD", "password")
+# Games open their window without a display
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+
+@pytest.fixture
+def server():
+    """The server's module, with a new empty database for every test"""
+    import server
+
+    server.mongo_client = None
+    yield server
+    server.close_mongo_client()
+
+
+@pytest.fixture
+def client(server):
+    from fastapi.testclient import TestClient
+
+    return TestClient(server.app)
+
+
+@pytest.fixture
+def users(server):
+    from db_post_creator import DBPostCreator
+
+    collection = server.get_collection()
+    for name in ("alice", "bob"):
+        collection.insert_one(
+            DBPostCreator.create_user_post(
+                f"{name}@example.com", name, f"{name}-password", "127.0.0.1"
+            )
+        )
+    return collection
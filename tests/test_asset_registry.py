@@ -0,0 +1,72 @@
+import importlib.util
+import os
+
+import pygame
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Importing the tetris package loads the game's music, which isn't kept in the repository,
+# so the registry's module is loaded on its own
+spec = importlib.util.spec_from_file_location(
+    "asset_registry", os.path.join(ROOT, "tetris", "asset_registry.py")
+)
+asset_registry = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(asset_registry)
+AssetRegistry = asset_registry.AssetRegistry
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Every sprite read from the disk, by a registry with nothing loaded yet"""
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setattr(AssetRegistry, "surfaces", {})
+    paths = []
+    load = pygame.image.load
+    monkeypatch.setattr(
+        pygame.image, "load", lambda path: paths.append(path) or load(path)
+    )
+    return paths
+
+
+def test_a_sprite_is_loaded_once(loads):
+    first = AssetRegistry.get("T", 1)
+
+    assert AssetRegistry.get("T", 1) is first
+    assert AssetRegistry.get("T", 2) is not first
+    assert loads == [
+        "tetris/tetris-resources/tpiece-sprite1.png",
+        "tetris/tetris-resources/tpiece-sprite2.png",
+    ]
+
+
+def test_ghosts_dont_change_the_sprite(loads):
+    ghost = AssetRegistry.get_ghost("S")
+
+    assert ghost.get_alpha() == AssetRegistry.GHOST_ALPHA
+    assert AssetRegistry.get("S").get_alpha() != AssetRegistry.GHOST_ALPHA
+    assert AssetRegistry.get_ghost("S") is ghost
+    assert len(loads) == 1
+
+
+def test_preloading_a_skin_loads_every_sprite_before_the_game(loads):
+    AssetRegistry.preload_skin(3)
+    loaded = len(loads)
+
+    for kind in AssetRegistry.PIECE_KINDS:
+        AssetRegistry.get(kind, 3)
+        AssetRegistry.get(f"next_{kind}", 3)
+        AssetRegistry.get_ghost(kind, 3)
+    AssetRegistry.get("G", 3)
+
+    assert loaded == len(AssetRegistry.ASSET_FILES)
+    assert len(loads) == loaded
+
+
+def test_fonts_and_texts_are_shared(monkeypatch):
+    monkeypatch.chdir(ROOT)
+    pygame.font.init()
+
+    assert AssetRegistry.get_font(20) is AssetRegistry.get_font(20)
+    assert AssetRegistry.get_font(20) is not AssetRegistry.get_font(21)
+    text = AssetRegistry.render_text("SCORE", 20, [255, 255, 255])
+    assert AssetRegistry.render_text("SCORE", 20, (255, 255, 255)) is text
@@ -0,0 +1,148 @@
+from typing import List, Tuple
+
+import numpy as np
+import pytest
+
+from tetris_engine import rules
+from tetris_engine.batch_engine import PIECES, WIDTH, BatchEngine
+from tetris_engine.bitboard_grid import BitboardGrid
+from tetris_engine.piece_data import ROTATION_STATES
+from tetris_engine.piece_logic import EnginePiece
+from tetris_engine.tetris_engine import TetrisEngine
+
+
+class FloatRandom:
+    """Gives the same floats to generate_seven_bag's choice and to the batch engine's random"""
+
+    def __init__(self, floats: List[float]):
+        self.floats = iter(floats)
+
+    def choice(self, sequence):
+        return sequence[int(next(self.floats) * len(sequence))]
+
+    def random(self, shape):
+        return np.array([next(self.floats) for _ in range(np.prod(shape))]).reshape(
+            shape
+        )
+
+
+def test_bags_are_filled_like_generate_seven_bag():
+    # Half of the picks are the S piece, so bags are often filled with a lot of them
+    s_float = (PIECES.index("S") + 0.5) / len(PIECES)
+    generator = np.random.default_rng(3)
+    floats = [
+        s_float if generator.random() < 0.5 else generator.random() for _ in range(2000)
+    ]
+
+    bag: List[str] = []
+    rng = FloatRandom(floats)
+    expected = []
+    for _ in range(1000):
+        rules.generate_seven_bag(bag, rng)
+        expected.append(bag.pop(0))
+
+    engine = BatchEngine(1)
+    engine.rng = FloatRandom(floats)
+    engine.bags = engine.fill_bags(np.zeros((1, 0), dtype=np.int8))
+    pieces = []
+    for _ in range(1000):
+        engine.generate_new_pieces(np.ones(1, dtype=bool))
+        pieces.append(PIECES[engine.cur_pieces[0]])
+
+    assert pieces == expected
+
+
+def placed_position(name: str, rotation: int, leftmost: int) -> List[List[int]]:
+    """Where the batch engine places a piece - in the rotation state, with it's top at the top
+    of the grid and it's leftmost block in the given column"""
+    offsets = ROTATION_STATES[name][rotation]
+    top = min(row for row, _ in offsets)
+    left = min(column for _, column in offsets)
+    return [[row - top, column - left + leftmost] for row, column in offsets]
+
+
+def grid_penalty(grid: BitboardGrid) -> float:
+    """How bad the stack looks, the usual heights, holes and bumpiness weights"""
+    heights = []
+    holes = 0
+    for column in range(grid.width):
+        filled = [row for row in range(grid.height) if grid.is_occupied(row, column)]
+        heights.append(grid.height - filled[0] if filled else 0)
+        if filled:
+            holes += grid.height - filled[0] - len(filled)
+    bumpiness = sum(abs(a - b) for a, b in zip(heights, heights[1:]))
+    return 0.51 * sum(heights) + 0.36 * holes + 0.18 * bumpiness
+
+
+def plan_placement(engine: TetrisEngine) -> Tuple[int, int]:
+    """The placement the stack looks best after"""
+    best = None
+    name = engine.cur_piece.NAME
+    for rotation in range(4):
+        offsets = ROTATION_STATES[name][rotation]
+        width = max(column for _, column in offsets) - min(
+            column for _, column in offsets
+        )
+        for column in range(WIDTH - width):
+            grid = BitboardGrid()
+            grid.rows = list(engine.grid.rows)
+            piece = EnginePiece(name)
+            piece.position = placed_position(name, rotation, column)
+            if not grid.fits(piece.position):
+                continue
+            while grid.fits([[row + 1, column] for row, column in piece.position]):
+                piece.position = [[row + 1, column] for row, column in piece.position]
+            grid.freeze_piece(piece)
+            lines_cleared = grid.full_rows()
+            grid.clear_rows(lines_cleared)
+            value = 0.76 * len(lines_cleared) - grid_penalty(grid)
+            if best is None or value > best[0]:
+                best = (value, rotation, column)
+    return (0, 0) if best is None else best[1:]
+
+
+def place(engine: TetrisEngine, rotation: int, column: int):
+    """Drops the engine's current piece from where the batch engine places it"""
+    piece = engine.cur_piece
+    piece.position = placed_position(piece.NAME, rotation, column)
+    piece.rotation_state = rotation
+    engine.update_should_freeze()
+    engine.press(TetrisEngine.HARD_DROP)
+
+
+@pytest.mark.parametrize(
+    "mode, lines_or_level, turns",
+    [("marathon", 0, 80), ("marathon", 8, 80), ("multiplayer", None, 50)],
+)
+def test_games_on_the_same_seeds_play_like_the_engine(mode, lines_or_level, turns):
+    seeds = [f"batch:{game}" for game in range(4)]
+    engines = [TetrisEngine(mode, lines_or_level, seed=seed) for seed in seeds]
+    batch = BatchEngine(len(seeds), mode, lines_or_level, seeds=seeds)
+
+    for turn in range(turns):
+        assert [PIECES[piece] for piece in batch.cur_pieces] == [
+            engine.cur_piece.NAME for engine in engines
+        ]
+        if mode == "multiplayer" and turn % 10 == 0:
+            garbage = [1 + (turn + game) % 2 for game in range(len(seeds))]
+            batch.receive_garbage(np.array(garbage))
+            for engine, lines in zip(engines, garbage):
+                engine.receive_garbage(lines)
+
+        placements = [plan_placement(engine) for engine in engines]
+        for engine, (rotation, column) in zip(engines, placements):
+            place(engine, rotation, column)
+        batch.step(*np.array(placements).T)
+
+        # The bot keeps the stack low, the engines top out on other rules than the batch
+        assert batch.running.all()
+        assert all(engine.running for engine in engines)
+
+    assert sum(engine.lines_cleared for engine in engines) > 0
+    for game, engine in enumerate(engines):
+        assert batch.lines_cleared[game] == engine.lines_cleared
+        assert batch.score[game] == engine.score
+        assert batch.level[game] == engine.level
+        assert batch.pieces_placed[game] == engine.pieces_placed
+        assert batch.total_attacks[game] == engine.total_attacks
+        assert list(batch.boards[game]) == engine.grid.rows
@@ -0,0 +1,107 @@
+import random
+from typing import List
+
+from pygamepp.grid import Grid
+from tetris_engine.bitboard_grid import BitboardGrid
+from tetris_engine.piece_logic import EnginePiece
+
+
+def random_grids(seed: int, fill: float = 0.5):
+    """A bitboard and a list grid with the same random blocks occupied"""
+    rng = random.Random(seed)
+    bitboard = BitboardGrid()
+    grid = Grid(bitboard.height, bitboard.width, 50)
+    for row in range(bitboard.height):
+        for column in range(bitboard.width):
+            if rng.random() < fill:
+                bitboard.occupy_block([row, column])
+                grid.occupy_block([row, column])
+    return bitboard, grid
+
+
+def occupied(grid: BitboardGrid) -> List[List[bool]]:
+    return [
+        [grid.is_occupied(row, column) for column in range(grid.width)]
+        for row in range(grid.height)
+    ]
+
+
+def test_legal_moves_match_the_list_grid():
+    for seed in range(20):
+        bitboard, grid = random_grids(seed)
+        # Positions just outside of the grid on every side too
+        for row in range(-2, bitboard.height + 2):
+            for column in range(-2, bitboard.width + 2):
+                assert bitboard.is_a_legal_move([row, column]) == (
+                    grid.is_a_legal_move([row, column])
+                )
+
+
+def test_fits_like_every_block_is_a_legal_move():
+    rng = random.Random(0)
+    for seed in range(20):
+        bitboard, _ = random_grids(seed, fill=0.2)
+        for _ in range(100):
+            position = [
+                [rng.randrange(bitboard.height), rng.randrange(-1, bitboard.width + 1)]
+                for _ in range(4)
+            ]
+            assert bitboard.fits(position) == all(
+                bitboard.is_a_legal_move(block) for block in position
+            )
+
+
+def test_blocks_above_the_grid_fit_unless_they_are_out_of_the_columns():
+    grid = BitboardGrid()
+    grid.rows = [grid.full_row] * grid.height
+
+    assert grid.fits([[-1, 0], [-2, 9]])
+    assert not grid.fits([[-1, 10]])
+    assert not grid.fits([[-1, 0], [0, 0]])
+    assert not grid.fits([[grid.height, 0]])
+
+
+def test_freezing_and_unoccupying_blocks():
+    grid = BitboardGrid()
+    piece = EnginePiece("T")
+    piece.position = [[18, 3], [18, 4], [18, 5], [19, 4]]
+
+    grid.freeze_piece(piece)
+    grid.unoccupy_block([18, 3])
+
+    assert [
+        [row, column]
+        for row in range(grid.height)
+        for column in range(grid.width)
+        if grid.is_occupied(row, column)
+    ] == [[18, 4], [18, 5], [19, 4]]
+
+
+def test_line_clears_match_removing_the_rows_from_a_list():
+    for seed in range(50):
+        grid, _ = random_grids(seed)
+        rng = random.Random(seed)
+        for row in rng.sample(range(grid.height), rng.randint(0, 4)):
+            grid.rows[row] = grid.full_row
+        expected = occupied(grid)
+
+        full_rows = grid.full_rows()
+        grid.clear_rows(full_rows)
+
+        assert full_rows == [row for row, blocks in enumerate(expected) if all(blocks)]
+        kept = [blocks for blocks in expected if not all(blocks)]
+        empty = [[False] * grid.width for _ in range(len(full_rows))]
+        assert occupied(grid) == empty + kept
+
+
+def test_garbage_pushes_the_rows_up():
+    grid, _ = random_grids(1)
+    grid.rows[:2] = [0, 0]
+    expected = occupied(grid)
+
+    assert not grid.add_garbage(2, 3)
+
+    garbage = [column != 3 for column in range(grid.width)]
+    assert occupied(grid) == expected[2:] + [garbage, garbage]
+    # Now the top row isn't empty
+    assert grid.add_garbage(1, 3)
@@ -0,0 +1,72 @@
+import pytest
+
+from network import board_protocol
+from network.board_protocol import BoardDecoder, BoardEncoder, ProtocolError
+
+
+def empty_screen():
+    return [
+        ["N"] * board_protocol.BOARD_WIDTH for _ in range(board_protocol.BOARD_HEIGHT)
+    ]
+
+
+def test_keyframe_and_delta_round_trip():
+    encoder = BoardEncoder()
+    decoder = BoardDecoder()
+    screen = empty_screen()
+    screen[19] = ["G"] * 9 + ["N"]
+
+    update = decoder.decode(encoder.encode(screen, 2, 3))
+    assert update == (screen, 2, 3)
+
+    screen[18][:4] = ["I"] * 4
+    delta = encoder.encode(screen, 0, 3)
+    assert board_protocol.get_message_type(delta) == board_protocol.BOARD_DELTA
+    assert decoder.decode(delta) == (screen, 0, 3)
+
+
+def test_delta_to_a_missed_board_only_counts_the_garbage():
+    encoder = BoardEncoder()
+    decoder = BoardDecoder()
+    screen = empty_screen()
+    encoder.encode(screen, 0, 0)
+    screen[19][0] = "T"
+
+    assert decoder.decode(encoder.encode(screen, 4, 0)) == (None, 4, 0)
+
+
+def test_result_round_trip():
+    message = board_protocol.encode_result(board_protocol.RESULT_WON)
+
+    assert board_protocol.get_message_type(message) == board_protocol.GAME_RESULT
+    assert board_protocol.decode_result(message) == board_protocol.RESULT_WON
+
+
+def test_unknown_cell_code_is_a_protocol_error():
+    encoder = BoardEncoder()
+    decoder = BoardDecoder()
+    screen = empty_screen()
+    decoder.decode(encoder.encode(screen, 0, 0))
+
+    message = bytearray(BoardEncoder().encode(screen, 0, 0))
+    # The first cell of the last row gets code 15, which isn't a symbol
+    message[-1] = 0x0F
+    with pytest.raises(ProtocolError):
+        decoder.decode(bytes(message))
+    # The board the decoder had stays as it was
+    assert decoder.get_screen() == screen
+
+
+def test_unknown_skin_is_a_protocol_error():
+    message = BoardEncoder().encode(empty_screen(), 0, board_protocol.SKIN_COUNT)
+
+    with pytest.raises(ProtocolError):
+        BoardDecoder().decode(message)
+
+
+def test_other_versions_are_rejected():
+    message = bytearray(board_protocol.encode_result(board_protocol.RESULT_LOST))
+    message[0] = board_protocol.PROTOCOL_VERSION + 1
+
+    with pytest.raises(ProtocolError):
+        board_protocol.get_message_type(bytes(message))
@@ -0,0 +1,52 @@
+import pygame
+import pytest
+
+from pygamepp.game import Game
+
+
+@pytest.fixture
+def game(monkeypatch):
+    """A game which records every push to the display"""
+    game = Game(200, 100)
+    game.pushes = []
+    monkeypatch.setattr(pygame.display, "flip", lambda: game.pushes.append("flip"))
+    monkeypatch.setattr(
+        pygame.display, "update", lambda rects: game.pushes.append(list(rects))
+    )
+    return game
+
+
+def test_without_dirty_rects_every_frame_is_pushed_whole(game):
+    game.mark_dirty((0, 0, 10, 10))
+    game.update_display()
+    game.update_display()
+
+    assert game.pushes == ["flip", "flip"]
+
+
+def test_only_the_dirty_rects_are_pushed(game):
+    game.dirty_rects_mode = True
+    # The first frame is always pushed whole
+    game.update_display()
+    game.mark_dirty((0, 0, 10, 10))
+    game.mark_dirty(pygame.Rect(50, 50, 5, 5))
+    game.update_display()
+    # Nothing changed
+    game.update_display()
+
+    assert game.pushes == [
+        "flip",
+        [pygame.Rect(0, 0, 10, 10), pygame.Rect(50, 50, 5, 5)],
+    ]
+
+
+def test_a_full_update_pushes_the_whole_screen_once(game):
+    game.dirty_rects_mode = True
+    game.update_display()
+    game.mark_dirty((0, 0, 10, 10))
+    game.mark_full_update()
+    game.update_display()
+    game.mark_dirty((0, 0, 10, 10))
+    game.update_display()
+
+    assert game.pushes == ["flip", "flip", [pygame.Rect(0, 0, 10, 10)]]
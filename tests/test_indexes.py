@@ -0,0 +1,29 @@
+import mongomock
+
+from indexes import ensure_indexes
+
+
+def test_indexes_are_created():
+    users = mongomock.MongoClient()["tetris"]["users"]
+    ensure_indexes(users)
+    # Creating them again leaves them as they are
+    ensure_indexes(users)
+
+    assert {"user_username", "user_email", "room_inner_ip"} <= set(
+        users.index_information()
+    )
+
+
+def test_a_broken_unique_index_doesnt_stop_the_rest(capsys):
+    users = mongomock.MongoClient()["tetris"]["users"]
+    users.insert_many(
+        [
+            {"type": "user", "username": "alice", "email": "alice@example.com"},
+            {"type": "user", "username": "alice", "email": "other@example.com"},
+        ]
+    )
+    ensure_indexes(users)
+
+    assert "Couldn't create index user_username" in capsys.readouterr().out
+    assert "user_username" not in users.index_information()
+    assert "user_email" in users.index_information()
@@ -0,0 +1,76 @@
+import mongomock
+
+from db_post_creator import DBPostCreator
+from indexes import ensure_indexes
+from leaderboards import (
+    LEADERBOARD_INDEXES,
+    get_board,
+    rebuild_leaderboards,
+    set_score,
+    sprint_board,
+    sprint_time_to_seconds,
+)
+
+
+def new_collections():
+    database = mongomock.MongoClient()["tetris"]
+    ensure_indexes(database["leaderboards"], LEADERBOARD_INDEXES)
+    return database["users"], database["leaderboards"]
+
+
+def test_a_users_score_replaces_their_previous_one():
+    _, leaderboards = new_collections()
+
+    set_score(leaderboards, "marathon", "alice", 100)
+    set_score(leaderboards, "marathon", "alice", 50)
+
+    assert get_board(leaderboards, "marathon") == [
+        {"username": "alice", "marathon": 50}
+    ]
+
+
+def test_boards_are_sorted_best_first():
+    _, leaderboards = new_collections()
+    for username, score in (("alice", 10), ("bob", 30), ("carol", 20)):
+        set_score(leaderboards, "apm", username, score)
+        set_score(leaderboards, sprint_board(40), username, score, f"0:{score:02}.000")
+
+    assert [entry["username"] for entry in get_board(leaderboards, "apm")] == [
+        "bob",
+        "carol",
+        "alice",
+    ]
+    # The fastest sprint first, shown the way the client shows times
+    assert get_board(leaderboards, sprint_board(40)) == [
+        {"username": "alice", "40l": "0:10.000"},
+        {"username": "carol", "40l": "0:20.000"},
+        {"username": "bob", "40l": "0:30.000"},
+    ]
+
+
+def test_rebuilding_leaves_users_without_a_score_off_the_boards():
+    users, leaderboards = new_collections()
+    alice = DBPostCreator.create_user_post("alice@example.com", "alice", "pw", "")
+    alice.update({"apm": 12.5, "marathon": 3000, "sprint": ["0", "1:02.500", "0", "0"]})
+    users.insert_one(alice)
+    users.insert_one(DBPostCreator.create_user_post("bob@example.com", "bob", "pw", ""))
+    # Entries which aren't backed by a user are dropped
+    set_score(leaderboards, "apm", "ghost", 99)
+
+    rebuild_leaderboards(users, leaderboards)
+
+    assert get_board(leaderboards, "apm") == [{"username": "alice", "apm": 12.5}]
+    assert get_board(leaderboards, "marathon") == [
+        {"username": "alice", "marathon": 3000}
+    ]
+    assert get_board(leaderboards, sprint_board(20)) == []
+    assert get_board(leaderboards, sprint_board(40)) == [
+        {"username": "alice", "40l": "1:02.500"}
+    ]
+    assert leaderboards.find_one({"board": sprint_board(40)})["score"] == 62.5
+
+
+def test_sprint_times_to_seconds():
+    assert sprint_time_to_seconds("12.250") == 12.25
+    assert sprint_time_to_seconds("2:03.5") == 123.5
+    assert sprint_time_to_seconds("1:00:00") == 3600
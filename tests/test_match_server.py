@@ -0,0 +1,122 @@
+import queue
+import socket
+import threading
+
+import pytest
+
+from match_server import MatchServer
+from room_server import RoomServer
+from network import FramedSocket
+from network import board_protocol
+from network.framing import BINARY
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(join_timeout: float = MatchServer.JOIN_TIMEOUT) -> MatchServer:
+    match_server = MatchServer("127.0.0.1", free_port())
+    match_server.JOIN_TIMEOUT = join_timeout
+    match_server.start()
+    return match_server
+
+
+def join(match_server: MatchServer, match_id: int, username: str) -> FramedSocket:
+    player = FramedSocket(socket.create_connection(("127.0.0.1", match_server.port)))
+    player.socket.settimeout(5)
+    player.send_json({"match_id": match_id, "username": username})
+    return player
+
+
+def test_boards_are_passed_to_the_opponent():
+    match_server = start_server()
+    results = queue.Queue()
+    match_id = match_server.create_match(
+        ["alice", "bob"], lambda *result: results.put(result)
+    )
+    alice = join(match_server, match_id, "alice")
+    assert alice.recv_text() == "ok"
+    screen = [["N"] * board_protocol.BOARD_WIDTH] * board_protocol.BOARD_HEIGHT
+    board = board_protocol.BoardEncoder().encode(screen, 0, 0)
+    alice.send_binary(board)
+
+    bob = join(match_server, match_id, "bob")
+    assert bob.recv_text() == "ok"
+    # Bob gets what alice sent before he joined
+    assert bob.recv_message() == (BINARY, board)
+
+    # Bob topped out
+    bob.send_binary(board_protocol.encode_result(board_protocol.RESULT_LOST))
+    assert alice.recv_message() == (
+        BINARY,
+        board_protocol.encode_result(board_protocol.RESULT_WON),
+    )
+    assert results.get(timeout=5) == ("alice", [])
+
+
+def test_matches_nobody_joins_are_closed():
+    match_server = start_server(join_timeout=0.2)
+    results = queue.Queue()
+    match_id = match_server.create_match(
+        ["alice", "bob"], lambda *result: results.put(result)
+    )
+    alice = join(match_server, match_id, "alice")
+    assert alice.recv_text() == "ok"
+
+    assert results.get(timeout=5) == ("", [])
+    # Alice is disconnected, and the match can't be joined anymore
+    assert alice.recv_message() is None
+    assert match_id not in match_server.matches
+    bob = join(match_server, match_id, "bob")
+    assert bob.recv_message() is None
+
+
+def test_a_server_which_cant_listen_raises():
+    taken = MatchServer("127.0.0.1", free_port())
+    taken.start()
+
+    with pytest.raises(OSError):
+        MatchServer("127.0.0.1", taken.port).start()
+
+
+def start_room(monkeypatch) -> RoomServer:
+    # The room isn't added to the database
+    monkeypatch.setattr(RoomServer, "create_server_db", lambda room: None)
+    monkeypatch.setattr(RoomServer, "update_player_num", lambda room: None)
+    monkeypatch.setattr(RoomServer, "SERVER_PORT", free_port())
+    monkeypatch.setitem(MatchServer.shared_servers, "127.0.0.1", start_server())
+    room = RoomServer("127.0.0.1", "127.0.0.1", False, "room")
+    threading.Thread(target=room.run, daemon=True).start()
+    # Returns once the room's loop runs, so it's listening
+    room.call(lambda: None)
+    return room
+
+
+def enter_room(room: RoomServer) -> FramedSocket:
+    player = FramedSocket(
+        socket.create_connection(("127.0.0.1", room.SERVER_PORT), timeout=5)
+    )
+    player.socket.settimeout(5)
+    return player
+
+
+def test_players_who_leave_before_saying_their_name_arent_added(monkeypatch):
+    room = start_room(monkeypatch)
+    quitter = enter_room(room)
+    assert quitter.recv_json() == {}
+    quitter.send_text("ok")
+    assert quitter.recv_json() == []
+    quitter.socket.close()
+
+    alice = enter_room(room)
+    assert alice.recv_json() == {}
+    alice.send_text("ok")
+    assert alice.recv_json() == []
+    alice.send_text("alice")
+
+    # Alice is told about herself once the room's loop added her
+    assert alice.recv_text() == "alice"
+    assert room.call(dict, room.players_wins) == {"alice": 0}
@@ -0,0 +1,86 @@
+import pytest
+
+from tetris_engine.bitboard_grid import BitboardGrid
+from tetris_engine.piece_logic import EnginePiece, PieceLogic
+
+CLOCKWISE = PieceLogic.CLOCKWISE
+COUNTER_CLOCKWISE = PieceLogic.COUNTER_CLOCKWISE
+
+
+def place_piece(name: str, grid: BitboardGrid, rotations: int, shift: int):
+    """A piece 8 rows under where it spawns, rotated clockwise and moved along the row"""
+    piece = EnginePiece(name)
+    piece.position = [[row + 8, column] for row, column in piece.position]
+    for _ in range(rotations):
+        piece.rotate(grid, CLOCKWISE)
+    direction = piece.RIGHT if shift > 0 else piece.LEFT
+    for _ in range(abs(shift)):
+        piece.shift(direction, grid)
+    return piece
+
+
+# Where each rotation ended up with the recursive move-then-rotate kicks the pieces had before
+# the kick table
+@pytest.mark.parametrize(
+    "name, rotations, shift, direction, blocks, rotated",
+    [
+        # The I piece is pushed two blocks out of the left wall
+        ("I", 0, -9, CLOCKWISE, [], [[10, 3], [10, 2], [10, 1], [10, 0]]),
+        ("I", 0, 9, CLOCKWISE, [], [[10, 9], [10, 8], [10, 7], [10, 6]]),
+        ("I", 0, 9, COUNTER_CLOCKWISE, [], [[10, 6], [10, 7], [10, 8], [10, 9]]),
+        ("T", 1, -9, COUNTER_CLOCKWISE, [], [[8, 1], [9, 0], [9, 1], [9, 2]]),
+        ("T", 3, 9, CLOCKWISE, [], [[8, 8], [9, 7], [9, 8], [9, 9]]),
+        # Kicked off the stack
+        (
+            "J",
+            1,
+            0,
+            CLOCKWISE,
+            [(9, 3), (10, 3), (11, 3)],
+            [[10, 6], [9, 6], [9, 5], [9, 4]],
+        ),
+        # A block keeps the piece from moving left, so the kicks after it go right
+        (
+            "Z",
+            1,
+            -7,
+            COUNTER_CLOCKWISE,
+            [(8, 2)],
+            [[8, 3], [8, 4], [9, 4], [9, 5]],
+        ),
+        ("I", 1, -7, CLOCKWISE, [(9, 1)], [[12, 2], [11, 2], [10, 2], [9, 2]]),
+    ],
+)
+def test_wall_kicks(name, rotations, shift, direction, blocks, rotated):
+    grid = BitboardGrid()
+    for row, column in blocks:
+        grid.rows[row] |= 1 << column
+    piece = place_piece(name, grid, rotations, shift)
+
+    piece.rotate(grid, direction)
+
+    assert piece.position == rotated
+
+
+def test_a_piece_no_kick_fits_stays_where_it_was():
+    grid = BitboardGrid()
+    for row in (8, 9, 10):
+        grid.rows[row] |= 1 << 3 | 1 << 6
+    piece = place_piece("L", grid, 3, 0)
+    position = piece.position
+    rotation_state = piece.rotation_state
+
+    piece.rotate(grid, CLOCKWISE)
+
+    assert piece.position == position
+    assert piece.rotation_state == rotation_state
+
+
+def test_rotating_four_times_brings_the_piece_back():
+    grid = BitboardGrid()
+    for name in "IJLSTZ":
+        piece = place_piece(name, grid, 0, 0)
+        position = piece.position
+        for _ in range(4):
+            piece.rotate(grid, CLOCKWISE)
+        assert sorted(piece.position) == sorted(position)
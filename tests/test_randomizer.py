@@ -0,0 +1,115 @@
+import random
+
+import numpy as np
+
+from tetris_engine import rules
+from tetris_engine.batch_engine import BatchEngine
+from tetris_engine.bitboard_grid import BitboardGrid
+from tetris_engine.randomizer import PieceRandomizer
+
+
+def holes(row: int, width: int = rules.GRID_WIDTH) -> int:
+    return sum(1 for column in range(width) if not row & (1 << column))
+
+
+def test_every_garbage_line_has_one_hole():
+    randomizer = PieceRandomizer("garbage")
+    grid = BitboardGrid()
+
+    for _ in range(500):
+        grid.add_garbage(1, randomizer.garbage_hole())
+        assert holes(grid.rows[-1]) == 1
+
+
+def test_every_batch_garbage_line_has_one_hole():
+    engine = BatchEngine(500, "multiplayer", seed=1)
+    games = np.ones(engine.games, dtype=bool)
+    engine.receive_garbage(np.full(engine.games, 3))
+
+    engine.handle_garbage(games, np.zeros(engine.games, dtype=np.int64))
+
+    assert all(holes(int(row)) == 1 for row in engine.boards[:, -3:].flat)
+
+
+def test_the_same_seed_gives_the_same_game():
+    first, second = PieceRandomizer("same"), PieceRandomizer("same")
+
+    assert [first.next_piece() for _ in range(200)] == [
+        second.next_piece() for _ in range(200)
+    ]
+    assert [first.garbage_hole() for _ in range(50)] == [
+        second.garbage_hole() for _ in range(50)
+    ]
+    other = PieceRandomizer("other")
+    assert [other.next_piece() for _ in range(200)] != [
+        PieceRandomizer("same").next_piece() for _ in range(200)
+    ]
+
+
+def test_garbage_doesnt_change_the_pieces():
+    quiet, attacked = PieceRandomizer(7), PieceRandomizer(7)
+
+    pieces = []
+    for index in range(100):
+        if index % 3 == 0:
+            attacked.garbage_hole()
+        pieces.append(attacked.next_piece())
+
+    assert pieces == [quiet.next_piece() for _ in range(100)]
+
+
+def test_the_pieces_dont_depend_on_the_global_random():
+    first, second = PieceRandomizer(3), PieceRandomizer(3)
+    random.seed(1)
+    first_pieces = [first.next_piece() for _ in range(50)]
+    random.seed(2)
+
+    assert first_pieces == [second.next_piece() for _ in range(50)]
+
+
+def test_peeking_doesnt_draw():
+    randomizer = PieceRandomizer(5)
+
+    upcoming = randomizer.peek(100)
+
+    assert randomizer.pieces_drawn == 0
+    assert [randomizer.next_piece() for _ in range(100)] == upcoming
+
+
+def test_fast_forward_skips_like_drawing():
+    drawn = PieceRandomizer("ff")
+    for _ in range(150):
+        drawn.next_piece()
+    for _ in range(12):
+        drawn.garbage_hole()
+
+    skipped = PieceRandomizer("ff")
+    skipped.fast_forward(150, 12)
+
+    assert skipped.to_dict() == drawn.to_dict()
+    assert [skipped.next_piece() for _ in range(20)] == [
+        drawn.next_piece() for _ in range(20)
+    ]
+    assert skipped.garbage_hole() == drawn.garbage_hole()
+
+
+def test_a_saved_randomizer_goes_on_where_it_stopped():
+    randomizer = PieceRandomizer(9)
+    for _ in range(33):
+        randomizer.next_piece()
+    randomizer.garbage_hole()
+
+    restored = PieceRandomizer.from_dict(randomizer.to_dict())
+
+    assert restored.to_dict() == {"seed": 9, "pieces_drawn": 33, "holes_drawn": 1}
+    assert restored.peek(30) == randomizer.peek(30)
+    assert restored.garbage_hole() == randomizer.garbage_hole()
+
+
+def test_no_bag_has_more_than_two_s_or_z_pieces():
+    randomizer = PieceRandomizer(11)
+    bag = randomizer.seven_bag
+    for _ in range(500):
+        randomizer.next_piece()
+        assert set(bag) <= set(rules.SEVEN_PIECE_SET)
+        assert bag.count("S") <= 2 and bag.count("Z") <= 2
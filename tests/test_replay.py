@@ -0,0 +1,135 @@
+import copy
+import random
+from typing import List, Tuple
+
+import pytest
+
+from tetris_engine.bitboard_grid import BitboardGrid
+from tetris_engine.replay import Replay
+from tetris_engine.tetris_engine import TetrisEngine
+
+# A step of the script is the action pressed and the amount of frames it's held for
+Step = Tuple[str, int]
+
+
+def grid_penalty(grid: BitboardGrid) -> float:
+    """How bad the stack looks, the usual heights, holes and bumpiness weights"""
+    heights = []
+    holes = 0
+    for column in range(grid.width):
+        filled = [row for row in range(grid.height) if grid.is_occupied(row, column)]
+        heights.append(grid.height - filled[0] if filled else 0)
+        if filled:
+            holes += sum(
+                1
+                for row in range(filled[0], grid.height)
+                if not grid.is_occupied(row, column)
+            )
+    bumpiness = sum(abs(a - b) for a, b in zip(heights, heights[1:]))
+    return 0.51 * sum(heights) + 0.36 * holes + 0.18 * bumpiness
+
+
+def plan_piece(engine: TetrisEngine, script: random.Random) -> List[Step]:
+    """Picks where the current piece goes by trying every rotation and column of it on a copy
+    of the grid, and returns the steps that put it there"""
+    best = None
+    for rotations in range(4):
+        for shift in range(-6, 7):
+            grid = copy.deepcopy(engine.grid)
+            piece = copy.deepcopy(engine.cur_piece)
+            for _ in range(rotations):
+                piece.rotate(grid, piece.CLOCKWISE)
+            direction = piece.RIGHT if shift > 0 else piece.LEFT
+            if not all(piece.shift(direction, grid) for _ in range(abs(shift))):
+                continue
+            piece.position = piece.get_lowest_position(grid)
+            if min(row for row, _ in piece.position) < 0:
+                continue
+            grid.freeze_piece(piece)
+            lines_cleared = grid.full_rows()
+            grid.clear_rows(lines_cleared)
+            value = 0.76 * len(lines_cleared) - grid_penalty(grid)
+            if best is None or value > best[0]:
+                best = (value, rotations, shift)
+    if best is None:
+        return [(TetrisEngine.HARD_DROP, 1)]
+
+    _, rotations, shift = best
+    direction = TetrisEngine.RIGHT if shift > 0 else TetrisEngine.LEFT
+    shifts = abs(shift)
+    steps = [(TetrisEngine.FLIP_CLOCK, 1)] * rotations
+    if shifts >= 5:
+        # Far moves are held, so the DAS and ARR take the piece to the wall
+        steps.append((direction, 40))
+    else:
+        steps += [(direction, 1)] * shifts
+    if script.random() < 0.5:
+        steps.append((TetrisEngine.HARD_DROP, 1))
+    else:
+        steps.append((TetrisEngine.DOWN, 200))
+    return steps
+
+
+def play_scripted_game(mode: str, lines_or_level, frames: int) -> TetrisEngine:
+    """Plays a game the way the client does - the clock moves a frame at a time, and every
+    input happens at the time of the frame it's in"""
+    script = random.Random(7)
+    engine = TetrisEngine(mode, lines_or_level, das=100, arr=20, seed="scripted")
+    engine.recorder = Replay(mode, "scripted", lines_or_level, 100, 20)
+    steps: List[Step] = []
+    held = None
+    pieces_placed = -1
+    for frame in range(frames):
+        if not engine.running:
+            break
+        engine.advance(script.randint(15, 18))
+        if mode == "multiplayer" and frame % 150 == 0:
+            engine.receive_garbage(script.randint(1, 2))
+
+        if engine.pieces_placed != pieces_placed:
+            pieces_placed = engine.pieces_placed
+            if held:
+                engine.release(held[0])
+                held = None
+            steps = plan_piece(engine, script)
+        if held and held[1] <= frame:
+            engine.release(held[0])
+            held = None
+        if not held and steps:
+            action, frames_held = steps.pop(0)
+            engine.press(action)
+            held = (action, frame + frames_held)
+
+        if mode == "multiplayer":
+            engine.take_lines_to_send()
+
+    engine.recorder.record_end(engine.time)
+    return engine
+
+
+@pytest.mark.parametrize(
+    "mode, lines_or_level", [("marathon", 1), ("sprint", 10), ("multiplayer", None)]
+)
+def test_replay_ends_like_the_game(mode, lines_or_level):
+    game = play_scripted_game(mode, lines_or_level, 3000)
+    replay = Replay.from_bytes(game.recorder.to_bytes())
+
+    engine = replay.play()
+
+    assert game.lines_cleared > 0
+    assert engine.time == game.time
+    assert engine.running == game.running
+    assert engine.win == game.win
+    assert engine.score == game.score
+    assert engine.lines_cleared == game.lines_cleared
+    assert engine.pieces_placed == game.pieces_placed
+    assert engine.total_attacks == game.total_attacks
+    assert engine.grid.rows == game.grid.rows
+
+
+def test_replay_without_an_end_is_rejected():
+    replay = Replay("marathon", 1, 1)
+    replay.record_press(10, TetrisEngine.HARD_DROP)
+
+    with pytest.raises(ValueError):
+        Replay.from_bytes(replay.to_bytes())
@@ -0,0 +1,203 @@
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+
+def get_user(users, username):
+    return users.find_one({"type": "user", "username": username})
+
+
+def test_bulk_applies_every_write_on_its_own(client, users):
+    writes = [
+        {"op": "update_music", "args": {"username": "alice", "music": False}},
+        {"op": "update_music", "args": {"username": "alice"}},
+        {"op": "update_apm", "args": {"username": "alice", "apm": 500}},
+        {"op": "update_player_num", "args": {"outer_ip": "", "inner_ip": ""}},
+        {"op": "add_game", "args": {"username": "bob", "win": True}},
+    ]
+    response = client.post("/users/bulk", json=writes)
+
+    assert response.status_code == 200
+    assert response.json() == ["applied", "rejected", "rejected", "rejected", "applied"]
+    assert get_user(users, "alice")["music"] is False
+    assert get_user(users, "alice")["apm"] == 0
+    assert get_user(users, "bob")["games"] == 1
+
+
+def test_bulk_counts_a_game_once(client, users):
+    write = {
+        "op": "add_game",
+        "args": {"username": "alice", "win": True, "game_id": "game-1"},
+    }
+    client.post("/users/bulk", json=[write])
+    # The same game again, e.g. sent from the journal after the response was lost
+    client.post("/users/bulk", json=[write])
+
+    alice = get_user(users, "alice")
+    assert (alice["games"], alice["wins"]) == (1, 1)
+
+    write["args"]["game_id"] = "game-2"
+    client.post("/users/bulk", json=[write])
+    assert get_user(users, "alice")["games"] == 2
+
+
+def test_bulk_rejects_a_batch_that_isnt_writes(client, users):
+    assert client.post("/users/bulk", json={"op": "add_game"}).status_code == 422
+
+
+def test_friend_requests(client, users):
+    client.post("/users/friends/send?sender=alice&recipient=bob")
+    assert get_user(users, "bob")["requests_received"] == ["alice"]
+    assert get_user(users, "alice")["requests_sent"] == ["bob"]
+
+    # Accepting twice doesn't add the friend twice
+    client.post("/users/friends/accept?sender=alice&recipient=bob")
+    client.post("/users/friends/accept?sender=alice&recipient=bob")
+    bob = get_user(users, "bob")
+    alice = get_user(users, "alice")
+    assert (bob["friends"], bob["requests_received"]) == (["alice"], [])
+    assert (alice["friends"], alice["requests_sent"]) == (["bob"], [])
+
+    client.post("/users/friends/remove?sender=alice&recipient=bob")
+    assert get_user(users, "bob")["friends"] == []
+    assert get_user(users, "alice")["friends"] == []
+
+
+def test_marathon_only_keeps_the_top_score(server, users):
+    stats = server.Server()
+
+    assert stats.update_marathon("alice", 1000)
+    assert not stats.update_marathon("alice", 500)
+    assert get_user(users, "alice")["marathon"] == 1000
+    assert (
+        server.get_leaderboard_collection().find_one(
+            {"board": "marathon", "username": "alice"}
+        )["score"]
+        == 1000
+    )
+
+
+def test_apm_averages_the_last_games(server, users):
+    stats = server.Server()
+    for apm in range(1, 13):
+        stats.update_apm("alice", apm)
+
+    alice = get_user(users, "alice")
+    assert alice["apm_games"] == list(range(3, 13))
+    assert alice["apm"] == 7.5
+    assert (
+        server.get_leaderboard_collection().find_one(
+            {"board": "apm", "username": "alice"}
+        )["score"]
+        == 7.5
+    )
+
+
+def test_every_page_of_a_board_has_its_own_etag(client, users):
+    first = client.get("/users/marathons?offset=0&limit=1")
+    etag = first.headers["ETag"]
+
+    assert (
+        client.get(
+            "/users/marathons?offset=0&limit=1", headers={"If-None-Match": etag}
+        ).status_code
+        == 304
+    )
+    second = client.get(
+        "/users/marathons?offset=1&limit=1", headers={"If-None-Match": etag}
+    )
+    assert second.status_code == 200
+    assert second.headers["ETag"] != etag
+
+
+def test_resetting_every_users_controls_changes_their_profiles(client, users):
+    etag = client.get("/users/profile?username=alice").headers["ETag"]
+
+    client.post("/users/update-all/controls")
+
+    response = client.get(
+        "/users/profile?username=alice", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 200
+
+
+def test_notifications_need_the_users_password(client, users):
+    with pytest.raises(WebSocketDisconnect) as disconnect:
+        with client.websocket_connect("/notifications?username=alice&password=wrong"):
+            pass
+    assert disconnect.value.code == 1008
+
+    with client.websocket_connect(
+        "/notifications?username=alice&password=alice-password"
+    ) as websocket:
+        client.post("/users/friends/send?sender=bob&recipient=alice")
+        # The section event of her changed profile comes first
+        events = [websocket.receive_json() for _ in range(2)]
+    assert {"type": "friend_request", "sender": "bob"} in events
+
+
+@pytest.mark.parametrize("versions", ["{", "[1, 2]", "3"])
+def test_bootstrap_rejects_versions_that_arent_an_object(client, users, versions):
+    response = client.get(
+        "/bootstrap", params={"username": "alice", "versions": versions}
+    )
+
+    assert response.status_code == 400
+
+
+def marathon_board(server, scores):
+    """A marathon board with a user for every score, named after their place in the list"""
+    from leaderboards import set_score
+
+    leaderboards = server.get_leaderboard_collection()
+    for index, score in enumerate(scores):
+        set_score(leaderboards, "marathon", f"user{index}", score)
+
+
+def test_boards_are_read_a_page_at_a_time(server, client):
+    marathon_board(server, range(10, 40))
+
+    default = client.get("/users/marathons").json()
+    page = client.get("/users/marathons?offset=3&limit=2").json()
+    past_the_end = client.get("/users/marathons?offset=100").json()
+    huge = client.get("/users/marathons?limit=1000").json()
+
+    assert len(default) == 25
+    assert default[0] == {"username": "user29", "marathon": 39}
+    assert page == [
+        {"username": "user26", "marathon": 36},
+        {"username": "user25", "marathon": 35},
+    ]
+    assert past_the_end == []
+    assert len(huge) == 30
+
+
+def test_rank_comes_with_the_users_around_it(server, client):
+    marathon_board(server, range(10, 40))
+
+    rank = client.get("/users/rank?score_type=marathon&username=user20&radius=2")
+
+    assert rank.json() == {
+        "rank": 10,
+        "offset": 7,
+        "entries": [
+            {"username": f"user{index}", "marathon": index + 10}
+            for index in range(22, 17, -1)
+        ],
+    }
+
+
+def test_the_best_player_is_ranked_first(server, client):
+    marathon_board(server, [5, 7])
+
+    rank = client.get("/users/rank?score_type=marathon&username=user1").json()
+
+    assert (rank["rank"], rank["offset"]) == (1, 0)
+    assert [entry["username"] for entry in rank["entries"]] == ["user1", "user0"]
+
+
+def test_users_off_the_board_have_no_rank(client, users):
+    assert client.get("/users/rank?score_type=40l&username=alice").json() == {
+        "rank": None,
+        "offset": 0,
+        "entries": [],
+    }
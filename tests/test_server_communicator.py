@@ -0,0 +1,81 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from database.server_communicator import ServerCommunicator
+
+
+class CountingHandler(BaseHTTPRequestHandler):
+    """Answers every GET with the same tagged json, and counts the connections made"""
+
+    protocol_version = "HTTP/1.1"
+    ETAG = '"board:1"'
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.server.requests += 1
+        if self.headers.get("If-None-Match") == self.ETAG:
+            self.send_response(304)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = json.dumps([{"username": "alice", "apm": 10}]).encode()
+        self.send_response(200)
+        self.send_header("ETag", self.ETAG)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def http_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CountingHandler)
+    server.daemon_threads = True
+    server.connections = 0
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def communicator(http_server):
+    communicator = ServerCommunicator()
+    communicator.SERVER_DOMAIN = f"http://127.0.0.1:{http_server.server_port}"
+    yield communicator
+    communicator.session.close()
+
+
+def test_requests_reuse_a_kept_alive_connection(http_server, communicator):
+    for _ in range(5):
+        communicator.get(f"{communicator.SERVER_DOMAIN}/users/apms")
+
+    async def get_twice():
+        for _ in range(2):
+            await communicator.async_get(f"{communicator.SERVER_DOMAIN}/users/apms")
+
+    asyncio.run(get_twice())
+
+    assert http_server.requests == 7
+    assert http_server.connections == 1
+
+
+def test_an_unchanged_resource_comes_from_the_kept_body(http_server, communicator):
+    url = f"{communicator.SERVER_DOMAIN}/users/apms"
+
+    first = communicator.get_validated(url)
+    first[0]["apm"] = 0
+    again = communicator.get_validated(url)
+
+    assert http_server.requests == 2
+    assert again == [{"username": "alice", "apm": 10}]
@@ -0,0 +1,62 @@
+from tetris_engine import rules
+from tetris_engine.tetris_engine import TetrisEngine
+
+
+def test_arr_zero_shifts_to_the_wall():
+    engine = TetrisEngine(das=100, arr=0, seed=1)
+    engine.press(TetrisEngine.RIGHT)
+    # Holding the direction past the DAS doesn't stop the clock with an ARR of 0
+    engine.advance(150)
+
+    assert engine.time == 150
+    assert max(column for _, column in engine.cur_piece.position) == 9
+    assert TetrisEngine.ARR_TIMER not in engine.timers
+
+
+def test_timers_always_move_the_clock():
+    engine = TetrisEngine(seed=1)
+    engine.set_timer(TetrisEngine.ARR_TIMER, 0)
+
+    assert engine.timers[TetrisEngine.ARR_TIMER][0] == engine.time + 1
+
+
+def test_arr_repeats_the_shift():
+    engine = TetrisEngine(das=100, arr=10, seed=1)
+    engine.press(TetrisEngine.RIGHT)
+    start_column = max(column for _, column in engine.cur_piece.position)
+    # One shift when the DAS passes and one for every ARR after it
+    engine.advance(120)
+
+    assert max(column for _, column in engine.cur_piece.position) == start_column + 3
+
+
+def test_arr_waits_at_the_wall():
+    engine = TetrisEngine(das=100, arr=10, seed=1)
+    engine.press(TetrisEngine.RIGHT)
+    # Long enough to reach the wall, but not for gravity to move the piece
+    engine.advance(200)
+
+    assert max(column for _, column in engine.cur_piece.position) == 9
+    # A held direction stops repeating once the piece can't move, until it moves some other way
+    assert TetrisEngine.ARR_TIMER not in engine.timers
+    engine.press(TetrisEngine.FLIP_CLOCK)
+    assert TetrisEngine.ARR_TIMER in engine.timers
+
+
+def test_the_level_goes_up_on_the_tenth_line():
+    engine = TetrisEngine("marathon", 0, seed="levels")
+    levels = []
+    for _ in range(11):
+        engine.grid.rows[-1] = engine.grid.full_row
+        engine.clear_lines()
+        levels.append(engine.level)
+
+    assert levels == [0] * 9 + [1, 1]
+    assert engine.gravity_time == rules.marathon_gravity_time(1)
+
+
+def test_level_up():
+    assert not rules.level_up(9, 1)
+    assert rules.level_up(10, 1)
+    assert rules.level_up(11, 4)
+    assert not rules.level_up(14, 4)
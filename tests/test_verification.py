@@ -0,0 +1,174 @@
+import socket
+import time
+
+import pytest
+
+import verification
+from tetris_engine.replay import Replay
+from tetris_engine.tetris_engine import TetrisEngine
+from verification import SEED_KEY, seed_issue_time, sign_seed, verify_replay
+
+
+def issued_seed(seconds_ago: int = 3600) -> str:
+    """A seed the server issued a while ago, the games here are played faster than real time"""
+    issued = int(time.time()) - seconds_ago
+    return f"nonce.{issued}.{sign_seed('nonce', issued, SEED_KEY)}"
+
+
+def hard_drops(seed: str, interval: int = 200, mode: str = "marathon") -> Replay:
+    """A game in which every piece is hard dropped where it spawns, until the stack tops out"""
+    engine = TetrisEngine(mode, 1, seed=seed)
+    engine.recorder = Replay(mode, seed, 1)
+    while engine.running:
+        engine.advance(interval)
+        engine.press(TetrisEngine.HARD_DROP)
+    engine.recorder.record_end(engine.time)
+    return engine.recorder
+
+
+def test_a_game_on_an_issued_seed_is_verified():
+    replay = hard_drops(issued_seed())
+    game = replay.play()
+
+    verdict = verify_replay(replay.to_bytes())
+
+    assert verdict["valid"], verdict["reason"]
+    assert verdict["seed"] == replay.seed
+    assert verdict["score"] == game.score > 0
+
+
+@pytest.mark.parametrize(
+    "seed",
+    [
+        "1234",
+        "nonce.1234.signature",
+        f"nonce.{int(time.time())}.{sign_seed('other', int(time.time()), SEED_KEY)}",
+    ],
+)
+def test_seeds_the_server_didnt_issue_are_rejected(seed):
+    verdict = verify_replay(hard_drops(seed).to_bytes())
+
+    assert verdict == verification.rejected(
+        "The game's seed wasn't issued by the server"
+    )
+
+
+def test_an_expired_seed_is_rejected():
+    seed = issued_seed(verification.SEED_TTL + 1)
+
+    assert verify_replay(hard_drops(seed).to_bytes())["reason"] == (
+        "The game's seed expired"
+    )
+
+
+def test_a_game_longer_than_its_seed_existed_is_rejected():
+    replay = hard_drops(issued_seed(10), interval=5000)
+
+    assert verify_replay(replay.to_bytes())["reason"] == "The game's seed expired"
+
+
+def test_pieces_placed_too_fast_are_rejected():
+    replay = hard_drops(issued_seed(), interval=verification.MIN_PIECE_TIME - 10)
+
+    assert verify_replay(replay.to_bytes())["reason"] == (
+        "Pieces were placed faster than the game allows"
+    )
+
+
+def test_a_hard_drop_right_after_a_gravity_lock_is_verified():
+    seed = issued_seed()
+    engine = TetrisEngine("marathon", 9, seed=seed)
+    engine.recorder = Replay("marathon", seed, 9)
+    # The first piece falls and locks on it's own
+    while engine.pieces_placed == 0:
+        engine.advance(1)
+    engine.advance(1)
+    engine.press(TetrisEngine.HARD_DROP)
+    engine.recorder.record_end(engine.time)
+
+    verdict = verify_replay(engine.recorder.to_bytes())
+
+    assert verdict["valid"], verdict["reason"]
+
+
+def test_marathons_on_levels_the_game_doesnt_have_are_rejected():
+    replay = Replay("marathon", issued_seed(), 10**6)
+    replay.record_press(100, TetrisEngine.HARD_DROP)
+    replay.record_end(200)
+
+    assert verify_replay(replay.to_bytes())["reason"] == (
+        "Unknown marathon level 1000000"
+    )
+
+
+def test_a_game_firing_too_many_timers_is_stopped(monkeypatch):
+    monkeypatch.setattr(verification, "TIMER_LIMIT", 10)
+    replay = Replay("marathon", issued_seed(), 1)
+    replay.record_press(0, TetrisEngine.DOWN)
+    replay.record_end(5000)
+
+    assert verify_replay(replay.to_bytes())["reason"] == "The game ran for too long"
+
+
+def test_garbage_outside_of_multiplayer_is_rejected():
+    replay = Replay("marathon", issued_seed(), 1)
+    replay.record_garbage(100, 4)
+    replay.record_end(200)
+
+    assert verify_replay(replay.to_bytes())["reason"] == (
+        "Garbage was received outside of a multiplayer game"
+    )
+
+
+def submit(client, replay: Replay, password: str = "alice-password"):
+    return client.post(
+        f"/replays?username=alice&password={password}",
+        content=replay.to_bytes(),
+        headers={"Content-Type": "application/octet-stream"},
+    )
+
+
+def test_replays_need_the_players_password(client, users):
+    response = submit(client, hard_drops(issued_seed()), password="wrong")
+
+    assert response.status_code == 401
+    assert users.find_one({"username": "alice"})["marathon"] == 0
+
+
+def test_the_server_issues_seeds(client):
+    seed = client.get("/games/seed").json()
+
+    assert abs(seed_issue_time(seed, SEED_KEY) - time.time()) < 5
+
+
+def test_a_seed_counts_once_per_player(server, client, users):
+    seed = issued_seed()
+    try:
+        first = submit(client, hard_drops(seed)).json()
+        # The same replay again gets the same verdict, without counting again
+        again = submit(client, hard_drops(seed)).json()
+        # Another game on the same seed isn't counted
+        other = submit(client, hard_drops(seed, interval=300)).json()
+    finally:
+        server.replay_verifier.close()
+
+    assert first["valid"] and first["new_top"]
+    assert again == {**first, "new_top": False}
+    assert other == {
+        **verification.rejected("Another game was counted on this seed already"),
+        "new_top": False,
+    }
+    assert users.find_one({"username": "alice"})["marathon"] == first["score"]
+
+
+def test_a_replay_the_server_cant_get_isnt_submitted():
+    from database.server_communicator import ServerCommunicator
+
+    communicator = ServerCommunicator()
+    # Nothing listens there
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        communicator.SERVER_DOMAIN = f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+    assert communicator.submit_replay("alice", b"replay") is None
+    assert communicator.get_seed() is None
@@ -0,0 +1,105 @@
+import requests
+
+from write_queue import WRITE_APPLIED, WRITE_FAILED, WRITE_REJECTED, WriteQueue
+
+
+class FakeServer:
+    def __init__(self):
+        self.batches = []
+        self.error = None
+        self.results = {}
+
+    def send_batch(self, batch):
+        if self.error:
+            raise self.error
+        self.batches.append(batch)
+        return [self.results.get(write["op"], WRITE_APPLIED) for write in batch]
+
+
+def http_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.HTTPError(f"{status_code} error", response=response)
+
+
+def create_queue(tmp_path, fake_server):
+    queue = WriteQueue(fake_server.send_batch, str(tmp_path / "journal.jsonl"))
+    # Let the writer's first run go by, so the test is the only one sending
+    queue.close()
+    return queue
+
+
+def test_connection_errors_are_journaled_and_retried(tmp_path):
+    fake_server = FakeServer()
+    queue = create_queue(tmp_path, fake_server)
+    fake_server.error = requests.ConnectionError("offline")
+    queue.send([{"op": "update_music", "args": {}}])
+
+    assert queue.read_journal() == [{"op": "update_music", "args": {}}]
+
+    fake_server.error = None
+    queue.send([{"op": "update_online", "args": {}}])
+    assert [write["op"] for write in fake_server.batches[0]] == [
+        "update_music",
+        "update_online",
+    ]
+    assert queue.read_journal() == []
+
+
+def test_server_errors_are_journaled(tmp_path):
+    fake_server = FakeServer()
+    queue = create_queue(tmp_path, fake_server)
+    fake_server.error = http_error(503)
+    queue.send([{"op": "add_game", "args": {}}])
+
+    assert queue.read_journal() == [{"op": "add_game", "args": {}}]
+
+
+def test_refused_batches_are_dropped(tmp_path):
+    fake_server = FakeServer()
+    queue = create_queue(tmp_path, fake_server)
+    fake_server.error = http_error(422)
+    queue.send([{"op": "add_game", "args": {}}])
+
+    assert queue.read_journal() == []
+
+
+def test_only_failed_writes_are_journaled(tmp_path):
+    fake_server = FakeServer()
+    queue = create_queue(tmp_path, fake_server)
+    fake_server.results = {"add_game": WRITE_FAILED, "update_music": WRITE_REJECTED}
+    queue.send(
+        [
+            {"op": "update_music", "args": {}},
+            {"op": "add_game", "args": {"game_id": "1"}},
+            {"op": "update_online", "args": {}},
+        ]
+    )
+
+    assert queue.read_journal() == [{"op": "add_game", "args": {"game_id": "1"}}]
+
+
+def test_writes_after_close_are_dropped(tmp_path):
+    fake_server = FakeServer()
+    queue = WriteQueue(fake_server.send_batch, str(tmp_path / "journal.jsonl"), 1)
+    queue.close()
+
+    # The queue is full and nothing drains it, this would block if it waited
+    queue.put("update_music", music=1)
+    queue.put("update_online", online=True)
+
+    assert not queue.pending
+
+
+def test_communicators_share_one_queue(tmp_path, monkeypatch):
+    from database.server_communicator import ServerCommunicator
+
+    monkeypatch.setattr(ServerCommunicator, "write_queue", None)
+    monkeypatch.setattr(
+        ServerCommunicator, "WRITE_JOURNAL_PATH", str(tmp_path / "journal.jsonl")
+    )
+    first = ServerCommunicator()
+    second = ServerCommunicator()
+    first.write_queue.close()
+
+    assert first.write_queue is second.write_queue is ServerCommunicator.write_queue
@@ -0,0 +1,107 @@
+import functools
+from typing import Dict, Optional, Tuple
+
+import pygame
+
+
+class AssetRegistry:
+    """Loads every sprite from the disk only once, and hands out the same surface to everyone
+    who asks for it - i.e. nothing is loaded during the game itself"""
+
+    RESOURCES_PATH = "tetris/tetris-resources"
+    # The file of every kind of asset, formatted with the skin
+    ASSET_FILES = {
+        "I": "ipiece-sprite{skin}.png",
+        "J": "jpiece-sprite{skin}.png",
+        "L": "lpiece-sprite{skin}.png",
+        "O": "opiece-sprite{skin}.png",
+        "S": "spiece-sprite{skin}.png",
+        "T": "tpiece-sprite{skin}.png",
+        "Z": "zpiece-sprite{skin}.png",
+        "G": "garbage_piece_sprite{skin}.png",
+        # The full pieces displayed in the next pieces queue
+        "next_I": "ipiece-full-sprite{skin}.png",
+        "next_J": "jpiece-full-sprite{skin}.png",
+        "next_L": "lpiece-full-sprite{skin}.png",
+        "next_O": "opiece-full-sprite{skin}.png",
+        "next_S": "spiece-full-sprite{skin}.png",
+        "next_T": "tpiece-full-sprite{skin}.png",
+        "next_Z": "zpiece-full-sprite{skin}.png",
+        "next_G": "garbage_piece_sprite{skin}.png",
+    }
+    PIECE_KINDS = ("I", "J", "L", "O", "S", "T", "Z")
+    # The alpha of the ghost piece - a bit transparent
+    GHOST_ALPHA = 125
+    # Every surface loaded so far, by (asset kind, skin, alpha)
+    surfaces: Dict[Tuple[str, int, Optional[int]], pygame.Surface] = {}
+    FONT_FILE = f"{RESOURCES_PATH}/joystix-monospace.ttf"
+    # Used for text which isn't ascii
+    SYMBOLS_FONT_FILE = f"{RESOURCES_PATH}/seguisym.ttf"
+    # Every font opened so far, by (font file, size)
+    fonts: Dict[Tuple[str, int], pygame.font.Font] = {}
+
+    @classmethod
+    def get(
+        cls, kind: str, skin: int = 0, alpha: Optional[int] = None
+    ) -> pygame.Surface:
+        """Returns the shared surface of an asset - the surface mustn't be changed"""
+        key = (kind, skin, alpha)
+        surface = cls.surfaces.get(key)
+        if surface is None:
+            if alpha is None:
+                surface = cls.load(kind, skin)
+            else:
+                # Copy the surface so the alpha won't change the original asset
+                surface = cls.get(kind, skin).copy()
+                surface.set_alpha(alpha)
+            cls.surfaces[key] = surface
+        return surface
+
+    @classmethod
+    def get_ghost(cls, kind: str, skin: int = 0) -> pygame.Surface:
+        return cls.get(kind, skin, cls.GHOST_ALPHA)
+
+    @classmethod
+    def load(cls, kind: str, skin: int) -> pygame.Surface:
+        """Loads an asset from the disk and converts it to the display's pixel format"""
+        surface = pygame.image.load(
+            f"{cls.RESOURCES_PATH}/{cls.ASSET_FILES[kind].format(skin=skin)}"
+        )
+        # Surfaces can only be converted once there is a display
+        if pygame.display.get_surface() is None:
+            return surface
+        if surface.get_flags() & pygame.SRCALPHA:
+            return surface.convert_alpha()
+        return surface.convert()
+
+    @classmethod
+    def preload_skin(cls, skin: int):
+        """Loads every asset of a skin, including the ghost pieces, before the game starts"""
+        for kind in cls.ASSET_FILES:
+            cls.get(kind, skin)
+        for kind in cls.PIECE_KINDS:
+            cls.get_ghost(kind, skin)
+
+    @classmethod
+    def get_font(cls, size: int, font_file: str = FONT_FILE) -> pygame.font.Font:
+        """Returns the shared font object of a font file in a given size"""
+        key = (font_file, size)
+        font = cls.fonts.get(key)
+        if font is None:
+            font = pygame.font.Font(font_file, size)
+            cls.fonts[key] = font
+        return font
+
+    @classmethod
+    def render_text(
+        cls, text: str, size: int, color: Tuple, font_file: str = FONT_FILE
+    ) -> pygame.Surface:
+        """Returns the shared surface of a rendered text - the surface mustn't be changed"""
+        return cls.render_cached_text(text, size, tuple(color), font_file)
+
+    @classmethod
+    @functools.lru_cache(maxsize=512)
+    def render_cached_text(
+        cls, text: str, size: int, color: Tuple, font_file: str
+    ) -> pygame.Surface:
+        return cls.get_font(size, font_file).render(text, True, color)
@@ -1,17 +1,16 @@
 from typing import List
 
-import pygame
-
+from tetris.asset_registry import AssetRegistry
+from tetris_engine.piece_data import PIVOT_POINTS
 from .tetris_piece import Piece
 
 
 class OPiece(Piece):
+    NAME = "O"
+    PIVOT_POINT = PIVOT_POINTS[NAME]
+
     def __init__(self, skin: int = 0, pos: List[List] = None):
-        self.sprite = pygame.image.load(
-            rf"tetris/tetris-resources/opiece-sprite{skin}.png"
-        )
-        if not pos:
-            pos = [[0, 4], [0, 5], [1, 5], [1, 4]]
+        self.sprite = AssetRegistry.get(self.NAME, skin)
         super().__init__(self.sprite, pos)
 
     def call_rotation_functions(self, key, grid):
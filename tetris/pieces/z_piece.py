@@ -1,17 +1,14 @@
 from typing import List
 
-import pygame
-
+from tetris.asset_registry import AssetRegistry
+from tetris_engine.piece_data import PIVOT_POINTS
 from .tetris_piece import Piece
 
 
 class ZPiece(Piece):
-    PIVOT_POINT = 2
+    NAME = "Z"
+    PIVOT_POINT = PIVOT_POINTS[NAME]
 
     def __init__(self, skin: int = 0, pos: List[List] = None):
-        self.sprite = pygame.image.load(
-            rf"tetris//tetris-resources/zpiece-sprite{skin}.png"
-        )
-        if not pos:
-            pos = [[0, 3], [0, 4], [1, 4], [1, 5]]
+        self.sprite = AssetRegistry.get(self.NAME, skin)
         super().__init__(self.sprite, pos)
@@ -1,5 +1,6 @@
-import pickle
 import socket
+
+from network import FramedSocket, BoardEncoder
 from tetris.tetris_game import TetrisGame
 
 
@@ -9,27 +10,38 @@ class TetrisClient:
     DST_PORT = 44444
 
     def __init__(
-        self, tetris_game: TetrisGame, server_ip: str, server_port: int, username: str
+        self,
+        tetris_game: TetrisGame,
+        server_ip: str,
+        server_port: int,
+        username: str,
+        match_id: int,
     ):
-        self.client_socket = socket.socket()
+        self.client_socket = FramedSocket(socket.socket())
         self.tetris_game = tetris_game
         self.server_ip = server_ip
         self.server_port = server_port
         self.username = username
+        # The match the room opened for us on the match server
+        self.match_id = match_id
 
     def connect_to_server(self):
         """Connects the socket to a server"""
         print(f"Connecting to {self.server_ip}:{self.server_port}")
         self.client_socket.connect((self.server_ip, self.server_port))
-        self.client_socket.send(self.username.encode())
+        self.client_socket.send_json(
+            {"match_id": self.match_id, "username": self.username}
+        )
 
     def run(self):
         """Setup and start the socket and the tetris game"""
         self.connect_to_server()
         # print(self.client_socket.recv(1024).decode())
-        self.client_socket.recv(1024)
-        data = pickle.dumps([[], 0, self.tetris_game.user["skin"]])
-        self.client_socket.send(data)
+        self.client_socket.recv_text()
+        # Send the opponent our empty board
+        empty_screen = [["N"] * 10 for _ in range(20)]
+        message = BoardEncoder().encode(empty_screen, 0, self.tetris_game.user["skin"])
+        self.client_socket.send_binary(message)
         print(self.client_socket.getpeername())
         self.tetris_game.server_socket = self.client_socket
         self.tetris_game.run()
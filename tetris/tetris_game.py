@@ -3,44 +3,43 @@ Hadar Dagan
 31.5.2020
 v1.0
 """
-import pickle
+
+import struct
 import threading
-import math
 import time
-from socket import socket
+from concurrent.futures import Future, TimeoutError
 from socket import timeout
-from typing import Tuple, Optional, Dict, List
-import random
+from typing import Tuple, Optional, Dict, List, Callable
 
 import pygame
 from pygame import USEREVENT
 from pygamepp.game import Game
 from pygamepp.game_object import GameObject
 from database.server_communicator import ServerCommunicator
+from network import board_protocol
+from network import FramedSocket, BoardEncoder, BoardDecoder, ProtocolError
+from network.framing import BINARY
+from tetris_engine.replay import Replay
+from tetris_engine.tetris_engine import TetrisEngine
 
 from tetris.pieces import *
 from tetris.pieces.tetris_piece import Piece
+from tetris.asset_registry import AssetRegistry
 from tetris.tetris_grid import TetrisGrid
 from tetris.colors import Colors
 
 
 class TetrisGame(Game):
     # Will be displayed when users lose
-    LOSE_TEXT = pygame.font.Font(
-        "tetris/tetris-resources/joystix-monospace.ttf", 60
-    ).render("YOU LOSE", True, Colors.WHITE)
+    LOSE_TEXT = AssetRegistry.render_text("YOU LOSE", 60, Colors.WHITE)
     # Will be displayed when users win
-    WIN_TEXT = pygame.font.Font(
-        "tetris/tetris-resources/joystix-monospace.ttf", 60
-    ).render("YOU WIN", True, Colors.WHITE)
+    WIN_TEXT = AssetRegistry.render_text("YOU WIN", 60, Colors.WHITE)
     # Will be displayed before the score
-    SCORE_TEXT = pygame.font.Font(
-        "tetris/tetris-resources/joystix-monospace.ttf", 19
-    ).render("SCORE:", True, Colors.WHITE)
+    SCORE_TEXT = AssetRegistry.render_text("SCORE:", 19, Colors.WHITE)
     # Will be displayed before the time
-    TIME_TEXT = pygame.font.Font(
-        "tetris/tetris-resources/joystix-monospace.ttf", 19
-    ).render("TIME:", True, Colors.WHITE)
+    TIME_TEXT = AssetRegistry.render_text("TIME:", 19, Colors.WHITE)
+    # Will be displayed during games the server didn't give a seed for
+    UNRANKED_TEXT = AssetRegistry.render_text("UNRANKED", 19, Colors.WHITE)
     SOUND_EFFECTS = {
         "1_lines": pygame.mixer.Sound("sounds/se_game_single.wav"),
         "2_lines": pygame.mixer.Sound("sounds/se_game_double.wav"),
@@ -63,17 +62,35 @@ class TetrisGame(Game):
         else:
             sound.set_volume(0.2)
 
-    GRAVITY_EVENT = USEREVENT + 1
-    DAS_EVENT = USEREVENT + 2
-    ARR_EVENT = USEREVENT + 3
-    MANUAL_DROP = USEREVENT + 4
-    LOCK_DELAY = USEREVENT + 5
     DATA_EVENT = USEREVENT + 6
     GAME_OVER_EVENT = USEREVENT + 7
-    LOWER_BORDER = 19
-    # The first - base - amount of time it takes for a piece to drop one block (in ms)
-    GRAVITY_BASE_TIME = 800
+    # The sound every action plays, if it has one
+    ACTION_SOUNDS = {
+        TetrisEngine.LEFT: "piece_move",
+        TetrisEngine.RIGHT: "piece_move",
+        TetrisEngine.FLIP_CLOCK: "piece_rotate",
+        TetrisEngine.FLIP_COUNTERCLOCK: "piece_rotate",
+    }
+    # Every piece class by it's name, the seven bag only holds the names
+    PIECE_CLASSES = {
+        "I": IPiece,
+        "J": JPiece,
+        "L": LPiece,
+        "O": OPiece,
+        "S": SPiece,
+        "T": TPiece,
+        "Z": ZPiece,
+    }
     BLOCK_SIZE = 50
+    # How long the game waits for the server's seed before it's played unranked (in seconds)
+    SEED_WAIT = 3
+    # Where the replay of the last game played is saved
+    REPLAY_PATH = "resources/last_game.replay"
+    # How often the board is sent to the opponent, and how long it can go unsent (in seconds)
+    SEND_INTERVAL = 0.05
+    HEARTBEAT_INTERVAL = 1
+    # The width of the area a score, time or lines value is displayed in
+    HUD_VALUE_WIDTH = 300
     BASE_SCREEN_SIZE = 700
     BORDER = 100
     SCREEN_START = BASE_SCREEN_SIZE + BORDER
@@ -88,136 +105,84 @@ class TetrisGame(Game):
         refresh_rate: int = 60,
         background_path: Optional[str] = None,
         lines_or_level: Optional[int] = None,
-        server_socket: Optional[socket] = None,
+        server_socket: Optional[FramedSocket] = None,
     ):
         if mode == "multiplayer":
             width = width + 900
         super().__init__(width + 100, height, refresh_rate, background_path)
 
         self.mode = mode
+        self.lines_or_level = lines_or_level
         self.user = user
         self.server_communicator = server_communicator
-        # The current piece the player is controlling
-        self.cur_piece: Optional[Piece] = None
         # The ghost piece of the current piece
         self.ghost_piece: Optional[Piece] = None
-        # The current time it takes a piece to drop one block
-        self.gravity_time = self.GRAVITY_BASE_TIME
-        # Game stats
-        self.lines_cleared = 0
-        self.total_attacks = 0
-        self.level = 0
-        self.score = 0
         self.starting_time = pygame.time.get_ticks()
-        # How many times gravity should be skipped due to fades
-        self.gravity_skips = 0
-        # Whether the current piece should be frozen
-        self.should_freeze = False
+        # The time the game was paused for, by the fades, which isn't game time (in ms)
+        self.paused_time = 0
+        # Only push the parts of the screen that changed every frame
+        self.dirty_rects_mode = True
         # Whether the screen was reset this loop, used for ghost piece
         self.reset = False
-        # How many 'gravity_time's the current piece touched the ground without being frozen
-        self.times_touching_ground = 0
-        # A bag containing the next 7 pieces - according to tetris guideline
-        self.cur_seven_bag = []
-        self.game_grid = TetrisGrid()
-        self.grids = [self.game_grid]
-        # Every variable that has to do with moving the pieces
-        self.move_variables: Dict[str, bool] = {
-            "right_das": False,
-            "left_das": False,
-            "arr": False,
-            "key_down": False,
-            "hard_drop": False,
-            "manual_drop": False,
-        }
-        # Bind all user controls
+        # Bind all user controls to the engine's actions
         user_controls = self.user["controls"]
-        self.key_events = {
-            user_controls["down"]: self.key_down,
-            user_controls["right"]: self.key_right,
-            user_controls["left"]: self.key_left,
-            user_controls["flip_clock"]: self.key_x,
-            user_controls["flip_counterclock"]: self.key_z,
+        self.key_actions = {
+            user_controls["down"]: TetrisEngine.DOWN,
+            user_controls["right"]: TetrisEngine.RIGHT,
+            user_controls["left"]: TetrisEngine.LEFT,
+            user_controls["flip_clock"]: TetrisEngine.FLIP_CLOCK,
+            user_controls["flip_counterclock"]: TetrisEngine.FLIP_COUNTERCLOCK,
         }
 
         self.skin = self.user["skin"]
 
-        self.pieces_and_next_sprites = {
-            "<class 'tetris.pieces.i_piece.IPiece'>": pygame.image.load(
-                f"tetris/tetris-resources/ipiece-full-sprite{self.skin}.png"
-            ),
-            "<class 'tetris.pieces.j_piece.JPiece'>": pygame.image.load(
-                f"tetris/tetris-resources/jpiece-full-sprite{self.skin}.png"
-            ),
-            "<class 'tetris.pieces.o_piece.OPiece'>": pygame.image.load(
-                f"tetris/tetris-resources/opiece-full-sprite{self.skin}.png"
-            ),
-            "<class 'tetris.pieces.l_piece.LPiece'>": pygame.image.load(
-                f"tetris/tetris-resources/lpiece-full-sprite{self.skin}.png"
-            ),
-            "<class 'tetris.pieces.t_piece.TPiece'>": pygame.image.load(
-                f"tetris/tetris-resources/tpiece-full-sprite{self.skin}.png"
-            ),
-            "<class 'tetris.pieces.s_piece.SPiece'>": pygame.image.load(
-                f"tetris/tetris-resources/spiece-full-sprite{self.skin}.png"
-            ),
-            "<class 'tetris.pieces.z_piece.ZPiece'>": pygame.image.load(
-                f"tetris/tetris-resources/zpiece-full-sprite{self.skin}.png"
-            ),
-            "<class 'tetris.pieces.garbage_piece.GarbagePiece'>": pygame.image.load(
-                rf"tetris/tetris-resources/garbage_piece_sprite{self.skin}.png"
-            ),
-        }
+        # Multiplayer games get their seed from the room. Solo games get it from the server,
+        # which only verifies games played on seeds it issued, while the game loads.
+        seed_request: Future = Future()
+        if self.mode != "multiplayer" and self.server_communicator:
+            threading.Thread(
+                target=lambda: seed_request.set_result(
+                    self.server_communicator.get_seed()
+                ),
+                daemon=True,
+            ).start()
+        else:
+            seed_request.set_result(None)
+
+        # Load every sprite of the player's skin before the game starts
+        AssetRegistry.preload_skin(self.skin)
         if self.mode == "multiplayer":
-            self.pieces = {
-                skin: {
-                    "I": pygame.image.load(
-                        f"tetris/tetris-resources/ipiece-sprite{skin}.png"
-                    ),
-                    "J": pygame.image.load(
-                        f"tetris/tetris-resources/jpiece-sprite{skin}.png"
-                    ),
-                    "O": pygame.image.load(
-                        f"tetris/tetris-resources/opiece-sprite{skin}.png"
-                    ),
-                    "L": pygame.image.load(
-                        f"tetris/tetris-resources/lpiece-sprite{skin}.png"
-                    ),
-                    "T": pygame.image.load(
-                        f"tetris/tetris-resources/tpiece-sprite{skin}.png"
-                    ),
-                    "S": pygame.image.load(
-                        f"tetris/tetris-resources/spiece-sprite{skin}.png"
-                    ),
-                    "Z": pygame.image.load(
-                        f"tetris/tetris-resources/zpiece-sprite{skin}.png"
-                    ),
-                    "G": pygame.image.load(
-                        f"tetris/tetris-resources/garbage_piece_sprite{skin}.png"
-                    ),
-                }
-                for skin in range(10)
-            }
+            # The opponent can use any of the skins
+            for skin in range(board_protocol.SKIN_COUNT):
+                AssetRegistry.preload_skin(skin)
+
+        # The game itself, everything else only displays it
+        self.engine: Optional[GameEngine] = None
+        self.grids: List[TetrisGrid] = []
+        self.replay: Optional[Replay] = None
+        try:
+            seed = seed_request.result(self.SEED_WAIT)
+        except TimeoutError:
+            print("The server didn't give a seed in time, the game won't be ranked")
+            seed = None
+        # A solo game on a seed of it's own won't be verified
+        self.ranked = self.mode == "multiplayer" or seed is not None
+        self.create_engine(seed)
 
         if self.mode == "sprint":
             # Sprint specific variables
-            self.lines_to_finish = lines_or_level
-            self.line_text = pygame.font.Font(
-                "tetris/tetris-resources/joystix-monospace.ttf", 19
-            ).render("LEFT:", True, Colors.WHITE)
+            self.line_text = AssetRegistry.render_text("LEFT:", 19, Colors.WHITE)
         if self.mode == "marathon":
             # Marathon specific variables
-            self.level = lines_or_level
-            self.gravity_time -= self.level * 83
-            self.line_text = pygame.font.Font(
-                "tetris/tetris-resources/joystix-monospace.ttf", 19
-            ).render("LINES:", True, Colors.WHITE)
+            self.line_text = AssetRegistry.render_text("LINES:", 19, Colors.WHITE)
         if self.mode == "multiplayer":
             # Multiplayer specific variables
             self.server_socket = server_socket
             self.lines_to_be_sent = 0
             self.lines_received = 0
             self.opp_screen = []
+            # Whether a new screen was received from the opponent since it was last displayed
+            self.opp_screen_changed = False
             self.grids.append(TetrisGrid(x_offset=self.SCREEN_START))
             self.win = False
 
@@ -228,14 +193,8 @@ class TetrisGame(Game):
             self.SOUND_EFFECTS["theme_start"].play(1000)
 
         self.running = True
-        # Every event that has to do with moving the piece
-        self.create_timer(self.GRAVITY_EVENT, self.gravity_time)
-        self.set_event_handler(self.GRAVITY_EVENT, self.gravitate)
-        self.create_timer(self.MANUAL_DROP, 20)
-        self.set_event_handler(self.MANUAL_DROP, self.manual_drop)
-        self.set_event_handler(self.DAS_EVENT, self.start_DAS)
-        self.set_event_handler(self.ARR_EVENT, self.start_ARR)
-        self.set_event_handler(self.LOCK_DELAY, self.freeze_piece)
+        # The game's clock starts now, not when the game was set up
+        self.starting_time = pygame.time.get_ticks()
         self.set_event_handler(pygame.KEYUP, self.key_up)
         self.set_event_handler(pygame.KEYDOWN, self.key_pressed)
         if self.mode == "multiplayer":
@@ -247,72 +206,171 @@ class TetrisGame(Game):
 
         super().run()
 
+    @property
+    def cur_piece(self) -> Optional[Piece]:
+        """The current piece the player is controlling"""
+        return self.engine.cur_piece
+
+    @property
+    def game_grid(self) -> TetrisGrid:
+        return self.engine.grid
+
+    def create_engine(self, seed=None):
+        """Starts the game over on a new engine, with a replay recording every input of it"""
+        self.engine = GameEngine(self, seed)
+        self.grids[:1] = [self.engine.grid]
+        self.replay = Replay(
+            self.mode,
+            self.engine.randomizer.seed,
+            self.lines_or_level,
+            self.user["DAS"],
+            self.user["ARR"],
+        )
+        self.engine.recorder = self.replay
+        if self.user["ghost"]:
+            self.initialize_ghost_piece()
+
     def start_of_loop(self):
         """Every action that is to be done at the start of the loop - before event handling"""
-        # Make sure we always have a current piece on the screen
-        if self.cur_piece is None:
-            self.clear_lines()
-            self.generate_new_piece()
-            # Clear the screen from the old next pieces
+        if self.mode == "multiplayer":
+            # The garbage goes in when the next piece locks, like on the server's engine
+            lines_received = self.lines_received
+            self.lines_received -= lines_received
+            self.engine.receive_garbage(lines_received)
+        # Run the game up to now, the inputs of this loop happen at this time
+        self.update_engine(
+            self.engine.advance, max(0, self.get_game_time_ms() - self.engine.time)
+        )
+
+    def update_engine(self, update: Callable, *args):
+        """Runs an update of the engine, then displays whatever it changed"""
+        engine = self.engine
+        pieces_placed = engine.pieces_placed
+        positions = [
+            piece.position for piece in (engine.cur_piece, self.ghost_piece) if piece
+        ]
+        update(*args)
+
+        if engine.pieces_placed != pieces_placed:
+            if self.user["music"]:
+                self.SOUND_EFFECTS["piece_lock"].play(0)
+            if engine.cur_piece and self.user["ghost"]:
+                self.initialize_ghost_piece()
+            # The locked piece, the lines cleared and the garbage are all on the grid's board
             self.reset_grids()
+        elif (
+            engine.cur_piece and positions and engine.cur_piece.position != positions[0]
+        ):
+            # Erase the piece and it's ghost where they were, instead of resetting the whole
+            # screen
+            for position in positions:
+                for pos in position:
+                    self.mark_dirty(self.game_grid.clear_block(self.screen, *pos))
+            self.update_ghost_position()
+            # The ghost piece has to be displayed again
+            self.reset = True
 
-    @staticmethod
-    def set_bag_seed(bag_seed):
+        if self.mode == "multiplayer":
+            self.lines_to_be_sent += engine.take_lines_to_send()
+        if not engine.running:
+            self.game_over(engine.win)
+
+    def set_bag_seed(self, bag_seed):
         """Set the bag seed for the game, so both multiplayer games will have the same seed"""
-        random.seed(bag_seed)
+        self.create_engine(bag_seed)
+
+    def save_replay(self):
+        try:
+            self.replay.save(self.REPLAY_PATH)
+        except OSError as e:
+            print(f"Couldn't save the replay: {e}")
+
+    def get_game_time_ms(self) -> int:
+        """Returns the amount of time in ms the game has been played for"""
+        return pygame.time.get_ticks() - self.starting_time - self.paused_time
 
     def reset_grids(self):
         self.screen.fill(Colors.BLACK)
         for grid in self.grids:
-            grid.display_borders(self.screen)
+            grid.display_board(self.screen)
         # Screen was reset
         self.reset = True
+        self.mark_full_update()
+
+    def display_objects(self):
+        """Only the current piece is displayed every loop, the locked pieces are displayed
+        as part of the grid's board when the screen is reset"""
+        if self.cur_piece:
+            self.cur_piece.display_object(self.screen)
+
+    def display_game_board(self):
+        self.game_grid.display_board(self.screen)
 
     def handle_connection(self):
         threading.Thread(target=self.send_data).start()
         threading.Thread(target=self.recv_data).start()
 
     def send_data(self):
+        board_encoder = BoardEncoder()
+        last_send_time = 0
         while self.running:
-            data = [self.get_my_screen(), self.lines_to_be_sent, self.skin]
-            # Send the screen, lines to be sent and skin to the opponent
-            self.server_socket.send(pickle.dumps(data))
-            self.lines_to_be_sent = 0
-            time.sleep(1)
+            screen = self.get_my_screen()
+            # Only send when something has changed, or as a heartbeat every once in a while
+            if (
+                self.lines_to_be_sent
+                or board_encoder.has_changed(screen)
+                or time.time() - last_send_time >= self.HEARTBEAT_INTERVAL
+            ):
+                # Send the screen, lines to be sent and skin to the opponent
+                lines_to_be_sent = self.lines_to_be_sent
+                self.lines_to_be_sent -= lines_to_be_sent
+                message = board_encoder.encode(screen, lines_to_be_sent, self.skin)
+                self.server_socket.send_binary(message)
+                last_send_time = time.time()
+            time.sleep(self.SEND_INTERVAL)
 
     def recv_data(self):
+        board_decoder = BoardDecoder()
+        self.server_socket.settimeout(2)
         while self.running:
             try:
-                self.server_socket.settimeout(2)
-                # Receive the screen and line data from the opponent
-                data_received = pickle.loads(self.server_socket.recv(25600))
-            except (pickle.UnpicklingError, ConnectionResetError, EOFError):
+                message = self.server_socket.recv_message()
+            except ConnectionResetError:
                 continue
             except timeout:
+                message = None
+            # The opponent is gone
+            if message is None:
                 self.running = False
                 self.win = True
                 self.create_timer(self.GAME_OVER_EVENT, 20)
                 self.set_event_handler(self.GAME_OVER_EVENT, self.game_over)
                 return
-            # Get the opponent screen
-            screen_received = data_received[0]
-            # Get the amount of lines to be received from the opponent
-            lines_received = data_received[1]
-            # Get the opponent's skin
-            opp_skin = data_received[2]
-            # In case the opponent topped out (lost)
-            if screen_received == "Win":
-                self.win = True
-                self.create_timer(self.GAME_OVER_EVENT, 20)
-                self.set_event_handler(self.GAME_OVER_EVENT, self.game_over)
-                return
-            elif screen_received == "Lose":
-                self.create_timer(self.GAME_OVER_EVENT, 20)
-                self.set_event_handler(self.GAME_OVER_EVENT, self.game_over)
-                return
-            else:
-                self.update_opp_screen(screen_received, opp_skin)
-                self.lines_received += int(lines_received)
+
+            message_type, message = message
+            if message_type != BINARY:
+                continue
+            try:
+                # In case the opponent topped out (lost)
+                if (
+                    board_protocol.get_message_type(message)
+                    == board_protocol.GAME_RESULT
+                ):
+                    self.win = (
+                        board_protocol.decode_result(message)
+                        == board_protocol.RESULT_WON
+                    )
+                    self.create_timer(self.GAME_OVER_EVENT, 20)
+                    self.set_event_handler(self.GAME_OVER_EVENT, self.game_over)
+                    return
+
+                board_update = board_decoder.decode(message)
+            except (ProtocolError, struct.error):
+                continue
+
+            if board_update.screen is not None:
+                self.update_opp_screen(board_update.screen, board_update.skin)
+            self.lines_received += board_update.garbage_lines
 
     def update_opp_screen(self, screen: List, skin):
         """Updates the opponent's screen"""
@@ -325,7 +383,7 @@ class TetrisGame(Game):
                 # No piece there
                 if piece == "N":
                     continue
-                piece_sprite = self.pieces[skin][piece]
+                piece_sprite = AssetRegistry.get(piece, skin)
                 # Create a game object representing the piece
                 piece_obj = GameObject(
                     piece_sprite,
@@ -336,47 +394,32 @@ class TetrisGame(Game):
                 )
                 cur_opp_screen.append(piece_obj)
         self.opp_screen = cur_opp_screen
+        self.opp_screen_changed = True
 
     def get_my_screen(self):
-        # 20 rows of 10 empty places - i.e. a default screen
-        screen_list = []
-        for row in range(20):
-            screen_list.append([])
-            for column in range(10):
-                screen_list[row].append("N")
-
-        # Populate the screen
-        for obj in self.game_objects:
-            if obj == self.cur_piece or obj == self.ghost_piece:
-                continue
-            for pos in obj.position:
-                piece_str = str(type(obj)).split(".")
-                piece_name = piece_str[-1][0]
-                screen_list[pos[0]][pos[1]] = piece_name
-
-        return screen_list
+        """Returns the locked blocks of the grid, the current piece isn't sent"""
+        return self.game_grid.get_screen()
 
     def show_next_pieces(self):
         """Show 5 of the next pieces"""
         step = 200
-        for i in range(5):
-            cur_next_piece = self.cur_seven_bag[i]
+        for i, cur_next_piece in enumerate(self.engine.randomizer.peek(5)):
             self.screen.blit(
-                self.pieces_and_next_sprites[str(cur_next_piece)], (600, 100 + step * i)
+                AssetRegistry.get(f"next_{cur_next_piece}", self.skin),
+                (600, 100 + step * i),
             )
 
     def initialize_ghost_piece(self):
-        """Create a ghost piece of the current piece""" ""
-        # Remove the last ghost piece
-        if self.ghost_piece in self.game_objects:
-            self.game_objects.remove(self.ghost_piece)
-
+        """Create a ghost piece of the current piece"""
         # Copy the current piece's type
         self.ghost_piece = type(self.cur_piece)(self.skin)
         # Make ghost a bit transparent
-        self.ghost_piece.sprite.set_alpha(125)
+        self.ghost_piece.sprite = AssetRegistry.get_ghost(
+            self.ghost_piece.NAME, self.skin
+        )
         self.update_ghost_position()
-        # self.game_objects.append(self.ghost_piece)
+        # The ghost piece has to be displayed
+        self.reset = True
 
     def update_ghost_position(self):
         """Changes the ghost position in accordance to the current piece position"""
@@ -392,23 +435,11 @@ class TetrisGame(Game):
             if self.reset and self.user["ghost"]:
                 self.ghost_piece.display_object(self.screen)
                 self.reset = False
-            self.should_freeze = self.should_freeze_piece()
-
-        elif self.mode == "multiplayer":
-            # Deduct the lines received from the lines we have to send, or the other way around
-            if self.lines_received > 0:
-                if self.lines_received > self.lines_to_be_sent:
-                    self.lines_received -= self.lines_to_be_sent
-                    self.lines_to_be_sent = 0
-                elif self.lines_to_be_sent > 0:
-                    self.lines_to_be_sent -= self.lines_received
-                    self.lines_received = 0
-                # Add the garbage to the screen
-                self.add_garbage()
+            self.mark_piece_dirty(self.cur_piece)
+            self.mark_piece_dirty(self.ghost_piece)
 
         if self.mode == "marathon":
             # Marathon specific functions
-            self.marathon()
             self.show_score()
             self.show_lines()
 
@@ -416,15 +447,20 @@ class TetrisGame(Game):
             # Sprint specific functions
             self.show_time()
             self.show_lines()
-            if self.lines_cleared >= self.lines_to_finish:
-                # If the player had cleared the amount of lines needed, he has won
-                self.game_over(True)
 
         elif self.mode == "multiplayer":
             self.display_opp_screen()
 
+        if not self.ranked:
+            self.screen.blit(self.UNRANKED_TEXT, (500, 90))
         self.show_next_pieces()
 
+    def mark_piece_dirty(self, piece: Optional[Piece]):
+        """Mark the blocks of a piece as changed, so they will be pushed to the display"""
+        if piece:
+            for pos in piece.position:
+                self.mark_dirty(self.game_grid.get_block_rect(*pos))
+
     def change_music(self, condition, old_music, new_music):
         """Stops the old music playing and starts the new one if the given condition is met"""
         # Condition is met and new music isn't playing
@@ -442,299 +478,65 @@ class TetrisGame(Game):
 
     def display_opp_screen(self):
         """Displays the opponent's screen on the board"""
+        # Erase the opponent's last screen
+        if self.opp_screen_changed:
+            opp_grid = self.grids[1]
+            opp_grid.display_borders(self.screen)
+            self.mark_dirty(opp_grid.get_rect())
+            self.opp_screen_changed = False
+
         for obj in self.opp_screen:
             obj.display_object(self.screen)
 
-    def add_garbage(self):
-        """Adds garbage to the board"""
-        # Selects a random column to be the garbage's hole
-        hole = random.randint(0, 10)
-        # If there is no garbage to receive
-        if self.lines_received == 0:
-            return
-
-        # Since we are about to move all the blocks on the screen up, we'll first unoccupy their
-        # current position
-        for line in self.game_grid.blocks:
-            for block in line:
-                block.occupied = False
-
-        # Move every piece on the screen (except the current piece and ghost piece) the needed
-        # amount of blocks up
-        for piece in self.game_objects:
-            if piece == self.cur_piece or piece == self.ghost_piece:
-                continue
-            new_pos = []
-            for pos in piece.position:
-                pos[0] -= self.lines_received
-                if pos[0] < 0:
-                    self.game_over(False)
-                new_pos.append(pos)
-            piece.position = new_pos
-
-        # Create the garbage pieces and add them to the game
-        for line in range(self.lines_received):
-            garbage_piece = GarbagePiece(self.LOWER_BORDER - line, hole, self.skin)
-            self.game_objects.append(garbage_piece)
-
-        # Reoccupy the blocks' positions
-        for piece in self.game_objects:
-            for pos in piece.position:
-                self.game_grid.occupy_block(pos)
-
-        # Reset the screen after the player has received garbage
-        if self.lines_received > 0:
-            self.reset_grids()
-        # Reset the amount of lines that need to be received
-        self.lines_received = 0
-
-    def marathon(self):
-        """Update the gravity time according to the current level"""
-        total_time_decrease = 0
-        # Tetris guideline is in frames - thus the numbers in ms will look weird
-        for i in range(self.level):
-            if i < 9:
-                total_time_decrease += 83
-            if i == 9:
-                total_time_decrease += 33
-            if 9 < i < 29:
-                total_time_decrease += 17
-
-        temp_gravity_time = self.GRAVITY_BASE_TIME - total_time_decrease
-
-        # In case the player has advanced a level - i.e. the gravity time has changed
-        if self.gravity_time != temp_gravity_time:
-            self.gravity_time = temp_gravity_time
-            self.create_timer(self.GRAVITY_EVENT, self.gravity_time)
-
-    def generate_new_piece(self):
-        """Generate a new current piece and update every variable that has to do with it"""
-        self.reset_move_variables()
-        self.generate_seven_bag()
-        self.cur_piece = self.cur_seven_bag.pop(0)(self.skin)
-        self.game_objects.append(self.cur_piece)
-        if self.user["ghost"]:
-            self.initialize_ghost_piece()
-
-    def reset_move_variables(self):
-        for key in self.move_variables:
-            self.move_variables[key] = False
-
-    def generate_seven_bag(self):
-        """Generates a new, or updates the current seven bag, according to the tetris guideline"""
-        seven_piece_set = [IPiece, TPiece, ZPiece, SPiece, LPiece, JPiece, OPiece]
-        # A 7 bag can't contain more than 2 S pieces or Z pieces
-        if self.cur_seven_bag.count(SPiece) == 2:
-            seven_piece_set.remove(SPiece)
-        if self.cur_seven_bag.count(ZPiece) == 2:
-            seven_piece_set.remove(ZPiece)
-
-        # Add pieces to the 7 bag until it's in the desired length
-        while len(self.cur_seven_bag) < 7:
-            self.cur_seven_bag.append(random.choice(seven_piece_set))
-
-    def get_current_time_since_start(self):
-        """Returns the amount of time in seconds since the game started"""
-        return (pygame.time.get_ticks() - self.starting_time) / 1000
-
     def show_score(self):
         """Displays the current score on the screen"""
-        text = self.render_input(20, str(self.score))
+        text = self.render_input(20, str(self.engine.score))
         self.screen.blit(self.SCORE_TEXT, (500, 10))
-        self.screen.blit(text, (500 + self.SCORE_TEXT.get_rect()[2], 10))
+        self.show_hud_value(text, (500 + self.SCORE_TEXT.get_rect()[2], 10))
 
     def show_time(self):
         """Displays the current amount of time since the start on the screen"""
-        seconds = self.render_input(20, str(round(self.get_current_time_since_start())))
-        self.screen.fill(
-            0x000000,
-            [
-                (500 + self.line_text.get_rect()[2], 10),
-                (500 + self.line_text.get_rect()[2] + 300, 40),
-            ],
+        seconds = self.render_input(
+            20, str(round(self.engine.get_current_time_since_start()))
         )
         self.screen.blit(self.TIME_TEXT, (500, 10))
-        self.screen.blit(seconds, (500 + self.line_text.get_rect()[2], 10))
+        self.show_hud_value(seconds, (500 + self.line_text.get_rect()[2], 10))
 
     def show_lines(self):
         """Displays the amount of lines cleared on the screen"""
-        lines = self.lines_cleared
+        lines = self.engine.lines_cleared
         # In case we are in sprint mode - we'll display the amount of lines left till victory
         if self.mode == "sprint":
-            lines = self.lines_to_finish - lines
+            lines = self.engine.lines_to_finish - lines
         text = self.render_input(20, str(lines))
         self.screen.blit(self.line_text, (500, 50))
-        self.screen.blit(text, (500 + self.line_text.get_rect()[2], 50))
+        self.show_hud_value(text, (500 + self.line_text.get_rect()[2], 50))
 
-    def hard_drop(self):
-        """Hard drop a piece - move it very fast all the way to the ground"""
-        # If the piece should already be frozen
-        if self.should_freeze:
-            self.freeze_piece()
-            return
-        drop = True
-        # Gravitate the piece very fast until it hits the ground
-        while drop:
-            self.gravitate()
-            self.score += 2
-            if self.should_freeze_piece():
-                self.freeze_piece()
-                drop = False
-        # Check if any lines need to be cleared
-        self.clear_lines()
-
-    def gravitate(self):
-        """Gravitate the current piece one block down"""
-        # We just faded
-        if self.gravity_skips:
-            self.gravity_skips -= 1
-            return
-        # If the piece doesn't need to be frozen and it's not None (i.e. we have a current piece) -
-        # gravitate it down
-        if not self.should_freeze and self.cur_piece:
-            self.reset_grids()
-            self.cur_piece.gravitate(self.game_grid)
-        # In order to give the player time to react and move the piece, the piece needs to gravitate
-        # down while touching the ground at least once before it's frozen
-        else:
-            if self.times_touching_ground > 0:
-                self.freeze_piece()
-                self.clear_lines()
-                self.should_freeze = False
-                self.times_touching_ground = 0
-            else:
-                self.times_touching_ground += 1
+    def show_hud_value(self, text: pygame.Surface, position: Tuple[int, int]):
+        """Displays a value next to it's title, erasing the last value displayed there"""
+        value_rect = pygame.Rect(position, (self.HUD_VALUE_WIDTH, text.get_height()))
+        self.screen.fill(Colors.BLACK, value_rect)
+        self.screen.blit(text, position)
+        self.mark_dirty(value_rect)
 
     def key_pressed(self, event: pygame.event):
-        """Handle a key press and call the relevant functions"""
+        """Handle a key press by passing it's action to the engine"""
         if event.key == pygame.K_SPACE:
-            self.hard_drop()
-
-        elif self.cur_piece:
-            event_func = self.key_events.get(event.key)
-            if event_func:
-                event_func()
-            if self.user["ghost"]:
-                self.update_ghost_position()
-
-    def key_down(self):
-        """If the down arrow is pressed, turn on the manual drop"""
-        self.move_variables["manual_drop"] = True
-
-    def manual_drop(self):
-        """Drop the piece manually one block down"""
-        if self.move_variables["manual_drop"]:
-            self.score += 1
-            if not self.should_freeze:
-                self.gravitate()
-
-    def key_up(self):
-        """In case a key is released change the relevant move variables"""
-        if self.last_pressed_key == self.user["controls"]["down"]:
-            self.move_variables["manual_drop"] = False
-        # When we've released a move button, check if we've activated the other direction's das
-        # before completely stopping all move variables.
-        elif (
-            self.last_pressed_key == pygame.K_RIGHT
-            and not self.move_variables["left_das"]
-            or self.last_pressed_key == pygame.K_LEFT
-            and not self.move_variables["right_das"]
-        ):
-            for key in self.move_variables:
-                self.move_variables[key] = False
-
-    def start_ARR(self):
-        """Start the ARR timer and turn on the ARR variable"""
-        # ARR - tetris term
-        if self.move_variables["key_down"]:
-            self.move_variables["arr"] = True
-            self.start_DAS()
-            # self.create_timer(self.DAS_EVENT, 30, True)
-
-    def start_DAS(self):
-        """Start the DAS"""
-        # DAS - tetris term
-        # If the arr timer already ended and there is a current piece to move
-        if self.move_variables["arr"] and self.cur_piece:
-            # Move the piece to the right every 5 milliseconds
-            if self.move_variables["right_das"]:
-                self.reset_grids()
-                self.cur_piece.move(pygame.K_RIGHT, self.game_grid)
-                self.create_timer(self.DAS_EVENT, self.user["ARR"], True)
-            # Move the piece to the left every 5 milliseconds
-            elif self.move_variables["left_das"]:
-                self.reset_grids()
-                self.cur_piece.move(pygame.K_LEFT, self.game_grid)
-                self.create_timer(self.DAS_EVENT, self.user["ARR"], True)
-        if self.user["ghost"]:
-            self.update_ghost_position()
-
-    def key_right(self):
-        """Move the piece one block to the right and start the ARR timer"""
-        if self.user["music"]:
-            self.SOUND_EFFECTS["piece_move"].play(0)
-        self.reset_grids()
-        self.reset_move_variables()
-        self.create_timer(self.ARR_EVENT, self.user["DAS"], True)
-        self.move_variables["key_down"] = True
-        self.move_variables["right_das"] = True
-        self.cur_piece.move(pygame.K_RIGHT, self.game_grid)
-
-    def key_left(self):
-        """Move the piece one block to the left and start the ARR timer"""
-        if self.user["music"]:
-            self.SOUND_EFFECTS["piece_move"].play(0)
-        self.reset_grids()
-        self.reset_move_variables()
-        self.create_timer(self.ARR_EVENT, self.user["DAS"], True)
-        self.move_variables["key_down"] = True
-        self.move_variables["left_das"] = True
-        self.cur_piece.move(pygame.K_LEFT, self.game_grid)
-
-    def key_z(self):
-        """Rotate the piece counter-clockwise"""
-        if self.user["music"]:
-            self.SOUND_EFFECTS["piece_rotate"].play(0)
-        self.reset_grids()
-        self.cur_piece.call_rotation_functions(pygame.K_z, self.game_grid)
-
-    def key_x(self):
-        """Rotate the piece clockwise"""
-        if self.user["music"]:
-            self.SOUND_EFFECTS["piece_rotate"].play(0)
-        self.reset_grids()
-        self.cur_piece.call_rotation_functions(pygame.K_x, self.game_grid)
-
-    def start_lock_delay(self):
-        # Lock delay - the time it takes the piece to freeze
-        if self.should_freeze_piece():
-            self.create_timer(self.LOCK_DELAY, self.gravity_time * 2, True)
-
-    def freeze_piece(self):
-        """Freezes the current piece"""
-        self.game_grid.freeze_piece(self.cur_piece)
-        self.cur_piece = None
-        self.should_freeze = False
-        if self.user["music"]:
-            self.SOUND_EFFECTS["piece_lock"].play(0)
-
-    def should_freeze_piece(self):
-        """Returns whether the current piece can, and should, be frozen"""
-        if not self.cur_piece:
+            action = TetrisEngine.HARD_DROP
+        else:
+            action = self.key_actions.get(event.key)
+        if action is None or not self.cur_piece:
             return
 
-        for pos in self.cur_piece.position:
-            if pos[0] >= self.LOWER_BORDER:
-                return True
+        if self.user["music"] and action in self.ACTION_SOUNDS:
+            self.SOUND_EFFECTS[self.ACTION_SOUNDS[action]].play(0)
+        self.update_engine(self.engine.press, action)
 
-            elif (
-                self.game_grid.blocks[pos[0] + 1][pos[1]].occupied
-                or self.game_grid.blocks[pos[0]][pos[1]].occupied
-            ):
-                if pos[0] <= 0:
-                    self.game_over(False)
-                return True
-        return False
+    def key_up(self):
+        """Handle a key release by passing it's action to the engine"""
+        action = self.key_actions.get(self.last_pressed_key)
+        if action is not None:
+            self.update_engine(self.engine.release, action)
 
     def game_over(self, win: bool = None):
         """End the game"""
@@ -742,52 +544,49 @@ class TetrisGame(Game):
         if not self.running:
             return
 
+        if self.mode == "multiplayer":
+            win = self.win
+        # No more inputs count, and the replay ends when the game did
+        if self.engine.running:
+            self.engine.game_over(bool(win))
+        self.replay.record_end(self.engine.time)
+
         # Stop all music
         pygame.mixer.stop()
         if self.user["music"]:
             self.SOUND_EFFECTS["theme_gameover"].play(0)
         # Calculate the end time
-        game_time = self.get_current_time_since_start()
+        game_time = self.engine.get_current_time_since_start()
         new_top = False
+        # Whether the server got the game, None if it wasn't sent
+        submitted = None
 
         if self.mode == "multiplayer":
             if not self.win:
                 # send the opponent the message that you've lost
-                self.server_socket.send(
-                    pickle.dumps(
-                        [
-                            "W",
-                        ]
-                    )
+                self.server_socket.send_binary(
+                    board_protocol.encode_result(board_protocol.RESULT_LOST)
                 )
 
-            threading.Thread(
-                target=self.server_communicator.add_game,
-                args=(
-                    self.user["username"],
-                    self.win,
-                ),
-            ).start()
-            threading.Thread(
-                target=self.server_communicator.update_apm,
-                args=(
-                    self.user["username"],
-                    self.total_attacks,
-                    game_time,
-                ),
-            ).start()
-
-        elif self.mode == "sprint" and win and self.server_communicator:
-            new_top = self.server_communicator.update_sprint(
-                self.user["username"], game_time, self.lines_to_finish
+            self.server_communicator.add_game(self.user["username"], self.win)
+            submitted = (
+                self.server_communicator.submit_replay(
+                    self.user["username"], self.replay.to_bytes()
+                )
+                is not None
             )
 
-        elif self.mode == "marathon" and self.server_communicator:
-            new_top = self.server_communicator.update_marathon(
-                self.user["username"], self.score
+        # The server only takes scores from replays, which it plays again to verify
+        elif self.server_communicator and (
+            self.mode == "marathon" or self.mode == "sprint" and win
+        ):
+            new_top = self.server_communicator.submit_replay(
+                self.user["username"], self.replay.to_bytes()
             )
+            submitted = new_top is not None
 
         self.running = False
+        self.save_replay()
 
         # Cinematic effects
         pygame.time.wait(1000)
@@ -831,8 +630,10 @@ class TetrisGame(Game):
         # Display mode specific end stats
         if self.mode == "marathon":
             self.screen.blit(self.render_input(50, "SCORE:"), (300, 75))
-            self.screen.blit(self.render_input(50, str(self.score)), (550, 75))
-            self.screen.blit(self.render_input(50, f"LEVEL:{self.level}"), (300, 150))
+            self.screen.blit(self.render_input(50, str(self.engine.score)), (550, 75))
+            self.screen.blit(
+                self.render_input(50, f"LEVEL:{self.engine.level}"), (300, 150)
+            )
             if new_top:
                 self.screen.blit(
                     self.render_input(70, "NEW HIGHSCORE!!"),
@@ -853,6 +654,11 @@ class TetrisGame(Game):
                     (self.width // 2 - 800, self.height // 2 - 200),
                 )
 
+        if submitted is False:
+            self.screen.blit(
+                self.render_input(50, "COULD NOT SUBMIT THE GAME"), (300, 225)
+            )
+
         pygame.display.flip()
         # Show the ending screen for 5 seconds
         if self.mode != "multiplayer":
@@ -863,9 +669,7 @@ class TetrisGame(Game):
     @staticmethod
     def render_input(font_size: int, inp):
         """Render a text given it's font and size"""
-        return pygame.font.Font(
-            "tetris/tetris-resources/joystix-monospace.ttf", font_size
-        ).render(inp, True, Colors.WHITE)
+        return AssetRegistry.render_text(inp, font_size, Colors.WHITE)
 
     def fade(
         self,
@@ -890,7 +694,11 @@ class TetrisGame(Game):
         # Setup the functions to display the other parts of the screen
         screen_funcs = []
         if show_stats:
-            screen_funcs = [self.display_objects, self.show_next_pieces]
+            screen_funcs = [
+                self.display_game_board,
+                self.display_objects,
+                self.show_next_pieces,
+            ]
             if self.mode == "marathon":
                 screen_funcs += [self.show_score, self.show_lines]
             elif self.mode == "sprint":
@@ -916,32 +724,17 @@ class TetrisGame(Game):
         """Returns the center position the text should be in"""
         return max(0, x_space), max(0, y_space)
 
-    def clear_lines(self):
-        """Clear the lines needed to be cleared"""
-        lines_cleared = []
-        for index, line in enumerate(self.game_grid.blocks):
-            should_clear = True
-            for block in line:
-                # If a block in a line isn't occupied the line shouldn't be cleared
-                if not block.occupied:
-                    should_clear = False
-            if should_clear:
-                lines_cleared.append(index)
-
-        self.lines_cleared += len(lines_cleared)
-
-        # Update the marathon level if needed
-        if self.lines_cleared // 10 < (self.lines_cleared + len(lines_cleared)) // 10:
-            self.level += 1
-
+    def clear_lines(self, lines_cleared: List[int]):
+        """Fade the lines about to be cleared, and play the music and sounds for them"""
+        engine = self.engine
         # Play the appropriate music
         if self.mode == "sprint":
             threading.Thread(
                 target=self.change_music,
                 args=(
-                    self.lines_to_finish // 3
-                    <= self.lines_cleared
-                    < self.lines_to_finish // 3 * 2,
+                    engine.lines_to_finish // 3
+                    <= engine.lines_cleared
+                    < engine.lines_to_finish // 3 * 2,
                     "theme_start",
                     "theme_mid",
                 ),
@@ -949,7 +742,7 @@ class TetrisGame(Game):
             threading.Thread(
                 target=self.change_music,
                 args=(
-                    self.lines_cleared >= self.lines_to_finish // 3 * 2,
+                    engine.lines_cleared >= engine.lines_to_finish // 3 * 2,
                     "theme_mid",
                     "theme_end",
                 ),
@@ -958,11 +751,11 @@ class TetrisGame(Game):
         elif self.mode == "marathon":
             threading.Thread(
                 target=self.change_music,
-                args=(self.level == 5, "theme_start", "theme_mid"),
+                args=(engine.level == 5, "theme_start", "theme_mid"),
             ).start()
             threading.Thread(
                 target=self.change_music,
-                args=(self.level == 9, "theme_mid", "theme_end"),
+                args=(engine.level == 9, "theme_mid", "theme_end"),
             ).start()
 
         # Fade the lines cleared
@@ -985,54 +778,29 @@ class TetrisGame(Game):
                 # Delay between fades
                 pygame.time.delay(10)
 
-            # Measure time it took to fade
-            time_faded = pygame.time.get_ticks() - fade_start_time
-            # If I ever don't want to let fading impact game time
-            # self.starting_time += time_faded
-            # Amount of gravity events accumulated while fading
-            self.gravity_skips += time_faded // self.gravity_time
-
-        # Remove all cleared lines
-        for line in lines_cleared:
-            self.clear_line(line)
+            # The game's clock stops while fading, the server's engine never fades
+            self.paused_time += pygame.time.get_ticks() - fade_start_time
 
-        # If there are any lines to be cleared, reset the screen
-        if len(lines_cleared) != 0:
-            print("reset!")
-            self.reset_grids()
-
-        # Update the score according to the amount of lines cleared
         if len(lines_cleared) > 0 and self.user["music"]:
             self.SOUND_EFFECTS[f"{min(4, len(lines_cleared))}_lines"].play(0)
-        if len(lines_cleared) == 1:
-            self.score += 40 * (self.level + 1)
-        elif len(lines_cleared) == 2:
-            self.score += 100 * (self.level + 1)
-        elif len(lines_cleared) == 3:
-            self.score += 300 * (self.level + 1)
-        elif len(lines_cleared) == 4:
-            self.score += 1200 * (self.level + 1)
-
-        # Update the amount of lines needed to be sent according to the amount of lines cleared
-        if self.mode == "multiplayer":
-            # Just a more elegant way to send 1 line for 2 cleared, 2 for 3, and 4 for 4
-            self.lines_to_be_sent += math.floor((len(lines_cleared) / 2) ** 2)
-            self.total_attacks += self.lines_to_be_sent
-
-    def clear_line(self, line_num):
-        """Clear a single line"""
-        for piece in self.game_objects:
-            # The new generated position of the current piece
-            new_pos = []
-            for pos in piece.position:
-                # Unoccupy the block's position
-                self.game_grid.blocks[pos[0]][pos[1]].occupied = False
-                if pos[0] != line_num:
-                    # Move every block above the line one space down
-                    if pos[0] < line_num:
-                        pos[0] += 1
-                    new_pos.append(pos)
-            # Update the piece's position
-            piece.position = new_pos
-            for pos in piece.position:
-                self.game_grid.occupy_block(pos)
+
+
+class GameEngine(TetrisEngine):
+    """The engine a TetrisGame runs on, with the game's grid and pieces so they can be
+    displayed"""
+
+    def __init__(self, game: TetrisGame, seed=None):
+        self.game = game
+        super().__init__(
+            game.mode, game.lines_or_level, game.user["DAS"], game.user["ARR"], seed
+        )
+
+    def create_grid(self) -> TetrisGrid:
+        return TetrisGrid(skin=self.game.skin)
+
+    def create_piece(self, name: str) -> Piece:
+        return self.game.PIECE_CLASSES[name](self.game.skin)
+
+    def clear_rows(self, rows: List[int]):
+        self.game.clear_lines(rows)
+        super().clear_rows(rows)
@@ -3,37 +3,150 @@ Hadar Dagan
 31.5.2020
 v1.0
 """
+from typing import Dict, List, Optional, Tuple
+
 import pygame
-from pygamepp.grid import Grid
+from tetris_engine.bitboard_grid import BitboardGrid
 
+from tetris.asset_registry import AssetRegistry
 from tetris.colors import Colors
-from tetris.pieces.tetris_piece import Piece
 
 
-class TetrisGrid(Grid):
-    def __init__(self, x_offset=0, y_offset=0):
-        super().__init__(20, 10, 50)
+class TetrisGrid(BitboardGrid):
+    # The rendered borders of every grid, by (width, height, block size)
+    BACKGROUNDS: Dict[Tuple[int, int, int], pygame.Surface] = {}
+
+    # The kind of the garbage blocks, as the opponent's screen names them
+    GARBAGE = "G"
+    # An empty cell, as the opponent's screen names it
+    EMPTY = "N"
+
+    def __init__(self, x_offset=0, y_offset=0, skin: int = 0):
+        super().__init__(20, 10)
         self.x_offset = x_offset
         self.y_offset = y_offset
         self.block_size = 50
+        self.skin = skin
+        # The kind of block locked in every cell, row by row - None for an empty cell.
+        # Rows are only ever replaced as a whole, so other threads can read them at any time.
+        self.cells: List[List[Optional[str]]] = self.empty_rows(self.height)
+        # The background along with every locked block, only changed when blocks are locked
+        # or moved
+        self.board_layer: Optional[pygame.Surface] = None
 
     def display_borders(self, screen: pygame.Surface):
         """Displays the border of every block in the grid"""
-        for row in self.blocks:
-            for block in row:
-                x = self.x_offset + block.x
-                y = self.y_offset + block.y
+        screen.blit(self.get_background(), (self.x_offset, self.y_offset))
+
+    def get_background(self) -> pygame.Surface:
+        """Returns the grid's borders rendered on an empty surface, the surface is rendered
+        once and shared by every grid of the same size"""
+        key = (self.width, self.height, self.block_size)
+        background = self.BACKGROUNDS.get(key)
+        if background is None:
+            background = pygame.Surface(
+                (self.width * self.block_size + 1, self.height * self.block_size)
+            )
+            # Surfaces can only be converted once there is a display
+            if pygame.display.get_surface() is not None:
+                background = background.convert()
+            background.fill(Colors.BLACK)
+            self.render_borders(background)
+            self.BACKGROUNDS[key] = background
+        return background
+
+    def render_borders(self, surface: pygame.Surface):
+        """Draws the border of every block in the grid on a surface, starting at it's corner"""
+        for row in range(self.height):
+            for column in range(self.width):
+                x = column * self.block_size
+                y = row * self.block_size
 
-                self.draw_horizontal_line(x, y, screen)
+                self.draw_horizontal_line(x, y, surface)
 
                 self.draw_vertical_line(
-                    x + self.block_size, y + self.block_size, screen
+                    x + self.block_size, y + self.block_size, surface
                 )
 
                 # Draw the right line only if it's the first column,
                 # performance sake as to not draw it many times over.
-                if row[0] == block:
-                    self.draw_vertical_line(x, y, screen)
+                if column == 0:
+                    self.draw_vertical_line(x, y, surface)
+
+    def empty_rows(self, amount: int) -> List[List[Optional[str]]]:
+        return [[None] * self.width for _ in range(amount)]
+
+    def display_board(self, screen: pygame.Surface):
+        """Displays the grid's borders along with every locked block"""
+        if self.board_layer is None:
+            self.rebuild_board_layer()
+        screen.blit(self.board_layer, (self.x_offset, self.y_offset))
+
+    def rebuild_board_layer(self):
+        """Renders the locked blocks on top of the background, needed whenever locked blocks
+        move - i.e. when lines are cleared or garbage is received"""
+        self.board_layer = self.get_background().copy()
+        for row, cells in enumerate(self.cells):
+            for column, kind in enumerate(cells):
+                if kind is not None:
+                    self.blit_block(kind, row, column)
+
+    def blit_block(self, kind: str, row: int, column: int):
+        self.board_layer.blit(
+            AssetRegistry.get(kind, self.skin),
+            (column * self.block_size, row * self.block_size),
+        )
+
+    def freeze_piece(self, piece):
+        """Freezes a piece on the grid and renders it's blocks on the board layer"""
+        super().freeze_piece(piece)
+        if self.board_layer is None:
+            self.rebuild_board_layer()
+        for row, column in piece.position:
+            # Blocks above the grid aren't kept, the game is over anyway
+            if 0 <= row < self.height:
+                self.cells[row] = self.cells[row].copy()
+                self.cells[row][column] = piece.NAME
+                self.blit_block(piece.NAME, row, column)
+
+    def clear_rows(self, rows_to_clear: List[int]):
+        """Removes the given rows and moves every row above them down, in one pass over the
+        rows no matter how many are cleared"""
+        if not rows_to_clear:
+            return
+        super().clear_rows(rows_to_clear)
+        rows_to_clear = set(rows_to_clear)
+        kept_rows = [
+            cells for index, cells in enumerate(self.cells) if index not in rows_to_clear
+        ]
+        self.cells = self.empty_rows(len(rows_to_clear)) + kept_rows
+        self.rebuild_board_layer()
+
+    def add_garbage(self, lines: int, hole: int) -> bool:
+        """Moves every row up and fills the bottom with garbage lines.
+        Returns whether any block was pushed out of the top of the grid."""
+        topped_out = super().add_garbage(lines, hole)
+        if lines > 0:
+            lines = min(lines, self.height)
+            garbage_row = [
+                None if column == hole else self.GARBAGE for column in range(self.width)
+            ]
+            self.cells = self.cells[lines:] + [garbage_row.copy() for _ in range(lines)]
+            self.rebuild_board_layer()
+        return topped_out
+
+    def clear(self):
+        """Unoccupies every block on the grid"""
+        super().clear()
+        self.cells = self.empty_rows(self.height)
+        self.board_layer = None
+
+    def get_screen(self) -> List[List[str]]:
+        """Returns the kind of block locked in every cell, the way it's sent to the opponent"""
+        return [
+            [self.EMPTY if kind is None else kind for kind in cells]
+            for cells in self.cells
+        ]
 
     def draw_horizontal_line(self, x, y, screen):
         """Draws a horizontal block separator"""
@@ -67,12 +180,36 @@ class TetrisGrid(Grid):
         second_coords = [first_coords[0], first_coords[1] + 10]
         pygame.draw.line(screen, Colors.GREY, first_coords, second_coords)
 
+    def get_rect(self) -> pygame.Rect:
+        """Returns the part of the screen the grid is displayed on"""
+        return pygame.Rect(
+            self.x_offset,
+            self.y_offset,
+            self.width * self.block_size + 1,
+            self.height * self.block_size,
+        )
+
+    def get_block_rect(self, row: int, column: int) -> pygame.Rect:
+        """Returns the part of the screen a single block is displayed on"""
+        return pygame.Rect(
+            self.x_offset + column * self.block_size,
+            self.y_offset + row * self.block_size,
+            self.block_size,
+            self.block_size,
+        )
+
+    def clear_block(self, screen: pygame.Surface, row: int, column: int) -> pygame.Rect:
+        """Erases a single block from the screen and redraws it's borders.
+        Returns the part of the screen that was changed."""
+        rect = self.get_block_rect(row, column)
+        screen.blit(
+            self.get_background(),
+            rect,
+            rect.move(-self.x_offset, -self.y_offset),
+        )
+        return rect
+
     def reset_screen(self, screen: pygame.Surface):
         """Shows a screen containing only a grid of blocks"""
         screen.fill(Colors.BLACK)
         self.display_borders(screen)
-
-    def freeze_piece(self, piece: Piece):
-        """Freezes a piece on the grid"""
-        for pos in piece.position:
-            self.blocks[pos[0]][pos[1]].occupied = True
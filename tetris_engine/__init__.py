@@ -0,0 +1,5 @@
+from .bitboard_grid import BitboardGrid
+from .piece_logic import PieceLogic, EnginePiece
+from .tetris_engine import TetrisEngine
+from .randomizer import PieceRandomizer
+from .replay import Replay
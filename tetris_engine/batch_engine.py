@@ -0,0 +1,303 @@
+"""Many headless games advanced in lock-step, for sweeping the game's rules over a lot of games.
+
+Every board is a row of an (N, 20) uint16 array, each row a bitmask of its occupied columns like
+in BitboardGrid, and every step places one piece on each of the boards at once. A placement is
+a rotation and a column, and the piece is dropped straight down from the top of the grid, so
+placements which need the piece to slide under an overhang aren't simulated.
+Requires numpy, which the rest of the game doesn't need, so it isn't imported by the package.
+"""
+
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+from tetris_engine import rules
+from tetris_engine.piece_data import ROTATION_STATES
+from tetris_engine.randomizer import PieceRandomizer
+
+HEIGHT = 20
+WIDTH = rules.GRID_WIDTH
+FULL_ROW = (1 << WIDTH) - 1
+# The most rows a piece takes
+PIECE_HEIGHT = 4
+# The pieces are numbered by their index in the seven piece set
+PIECES = rules.SEVEN_PIECE_SET
+S_PIECE = PIECES.index("S")
+Z_PIECE = PIECES.index("Z")
+# The score for clearing lines, indexed by the amount of lines cleared at once
+LINE_CLEAR_TABLE = np.array(
+    [rules.LINE_CLEAR_SCORES.get(lines, 0) for lines in range(PIECE_HEIGHT + 1)],
+    dtype=np.int64,
+)
+# The garbage lines sent for clearing lines, indexed by the amount of lines cleared at once
+ATTACK_TABLE = np.array(
+    [rules.attack_lines(lines) for lines in range(PIECE_HEIGHT + 1)], dtype=np.int64
+)
+# Gravity stops speeding up after this level
+MAX_GRAVITY_LEVEL = 30
+
+
+def get_shape_tables():
+    """Returns the row masks of every piece in every rotation state, pushed to the top left
+    corner, along with the width of each"""
+    masks = np.zeros((len(PIECES), 4, PIECE_HEIGHT), dtype=np.uint16)
+    widths = np.zeros((len(PIECES), 4), dtype=np.int64)
+    for piece, name in enumerate(PIECES):
+        for rotation, offsets in enumerate(ROTATION_STATES[name]):
+            top = min(offset[0] for offset in offsets)
+            left = min(offset[1] for offset in offsets)
+            for row, column in offsets:
+                masks[piece, rotation, row - top] |= 1 << (column - left)
+            widths[piece, rotation] = max(offset[1] for offset in offsets) - left + 1
+    return masks, widths
+
+
+SHAPE_MASKS, SHAPE_WIDTHS = get_shape_tables()
+
+
+def get_bag_tables():
+    """Returns the pieces a bag can be filled with, for each combination of whether the bag
+    has 2 S pieces and 2 Z pieces before it's filled, along with the amount of pieces in each"""
+    choices = np.zeros((2, 2, len(PIECES)), dtype=np.int8)
+    sizes = np.zeros((2, 2), dtype=np.int64)
+    for no_s in range(2):
+        for no_z in range(2):
+            allowed = [
+                piece
+                for piece in range(len(PIECES))
+                if not (no_s and piece == S_PIECE or no_z and piece == Z_PIECE)
+            ]
+            choices[no_s, no_z, : len(allowed)] = allowed
+            sizes[no_s, no_z] = len(allowed)
+    return choices, sizes
+
+
+BAG_CHOICES, BAG_SIZES = get_bag_tables()
+
+
+class BatchEngine:
+    """N games of tetris without any display, played one piece at a time on all of them.
+    Follows the same rules as TetrisEngine.
+
+    The pieces and garbage holes of every game are drawn from one numpy generator. Given seeds,
+    every game draws them from a PieceRandomizer of it's own instead, one game at a time, which
+    plays the same games TetrisEngine plays on those seeds."""
+
+    def __init__(
+        self,
+        games: int,
+        mode: str = "marathon",
+        lines_or_level: Optional[int] = None,
+        seed=None,
+        attack_table: np.ndarray = ATTACK_TABLE,
+        gravity_formula: Callable[[int], int] = rules.marathon_gravity_time,
+        seeds: Optional[Sequence] = None,
+    ):
+        self.games = games
+        self.mode = mode
+        self.rng = np.random.default_rng(seed)
+        self.randomizers: Optional[List[PieceRandomizer]] = None
+        if seeds is not None:
+            if len(seeds) != games:
+                raise ValueError(f"Got {len(seeds)} seeds for {games} games")
+            self.randomizers = [PieceRandomizer(game_seed) for game_seed in seeds]
+        self.attack_table = np.asarray(attack_table, dtype=np.int64)
+        # The gravity time of every level, so changing levels is a lookup
+        self.gravity_table = np.array(
+            [gravity_formula(level) for level in range(MAX_GRAVITY_LEVEL + 1)],
+            dtype=np.int64,
+        )
+        self.boards = np.zeros((games, HEIGHT), dtype=np.uint16)
+        # The next 7 pieces of every game - according to tetris guideline
+        self.bags = self.fill_bags(np.zeros((games, 0), dtype=np.int8))
+        self.cur_pieces = np.zeros(games, dtype=np.int8)
+        # Every game's clock (in ms since the start of the game)
+        self.time = np.zeros(games, dtype=np.int64)
+        # Game stats
+        self.lines_cleared = np.zeros(games, dtype=np.int64)
+        self.total_attacks = np.zeros(games, dtype=np.int64)
+        self.level = np.zeros(games, dtype=np.int64)
+        self.score = np.zeros(games, dtype=np.int64)
+        self.pieces_placed = np.zeros(games, dtype=np.int64)
+        self.lines_to_be_sent = np.zeros(games, dtype=np.int64)
+        self.lines_received = np.zeros(games, dtype=np.int64)
+        self.running = np.ones(games, dtype=bool)
+        self.win = np.zeros(games, dtype=bool)
+
+        if self.mode == "sprint":
+            self.lines_to_finish = lines_or_level
+        if self.mode == "marathon":
+            self.level[:] = lines_or_level or 0
+
+        self.generate_new_pieces(self.running)
+
+    @property
+    def gravity_time(self) -> np.ndarray:
+        """The current time it takes a piece to drop one block in every game"""
+        return self.gravity_table[np.minimum(self.level, MAX_GRAVITY_LEVEL)]
+
+    def fill_bags(self, bags: np.ndarray) -> np.ndarray:
+        """Fills every bag up to 7 pieces, like generate_seven_bag - the pieces a bag can be
+        filled with are picked once, by the pieces it has before it's filled"""
+        # A 7 bag can't contain more than 2 S pieces or Z pieces
+        no_s = ((bags == S_PIECE).sum(axis=1) == 2).astype(np.int64)
+        no_z = ((bags == Z_PIECE).sum(axis=1) == 2).astype(np.int64)
+        missing = len(PIECES) - bags.shape[1]
+        choice = (
+            self.rng.random((self.games, missing)) * BAG_SIZES[no_s, no_z][:, None]
+        ).astype(np.int64)
+        return np.concatenate(
+            [bags, BAG_CHOICES[no_s[:, None], no_z[:, None], choice]], axis=1
+        )
+
+    def generate_new_pieces(self, games: np.ndarray):
+        """Takes the next piece out of the bag of every given game and fills the bag back up"""
+        if self.randomizers is not None:
+            for game in np.flatnonzero(games):
+                self.cur_pieces[game] = PIECES.index(
+                    self.randomizers[game].next_piece()
+                )
+            return
+
+        self.cur_pieces = np.where(games, self.bags[:, 0], self.cur_pieces)
+        refilled = self.fill_bags(self.bags[:, 1:])
+        self.bags = np.where(games[:, None], refilled, self.bags)
+
+    def step(
+        self, rotations: np.ndarray, columns: np.ndarray, hard_drop: bool = True
+    ) -> np.ndarray:
+        """Places the current piece of every running game, in the given rotation state with its
+        leftmost block in the given column, and brings in the next pieces.
+        A hard dropped piece locks at once, otherwise it falls under gravity.
+        Returns the amount of lines each game cleared."""
+        games = np.arange(self.games)
+        rotations = np.asarray(rotations, dtype=np.int64) % 4
+        widths = SHAPE_WIDTHS[self.cur_pieces, rotations]
+        columns = np.clip(np.asarray(columns, dtype=np.int64), 0, WIDTH - widths)
+        # (N, 4) - the rows of every piece, already in their column
+        masks = SHAPE_MASKS[self.cur_pieces, rotations] << columns[:, None].astype(
+            np.uint16
+        )
+
+        # Pad the boards with empty rows above the grid and full rows below it, so that
+        # every piece collides somewhere below where it spawns
+        padded = np.concatenate(
+            [
+                np.zeros((self.games, PIECE_HEIGHT), dtype=np.uint16),
+                self.boards,
+                np.full((self.games, PIECE_HEIGHT), FULL_ROW, dtype=np.uint16),
+            ],
+            axis=1,
+        )
+        # (N, rows) - whether a piece whose top row is at that padded row overlaps the stack
+        tops = np.arange(HEIGHT + PIECE_HEIGHT + 1)
+        rows = tops[:, None] + np.arange(PIECE_HEIGHT)
+        collisions = (padded[:, rows] & masks[:, None, :]).any(axis=2)
+        # Pieces spawn with their top at the grid's top row
+        spawn = PIECE_HEIGHT
+        collisions = collisions[:, spawn:]
+        # The stack reached the spawn position
+        topped_out = collisions[:, 0] & self.running
+        distance = collisions.argmax(axis=1) - 1
+        placing = self.running & ~topped_out
+
+        landing = spawn + np.maximum(distance, 0)
+        for row in range(PIECE_HEIGHT):
+            padded[games, landing + row] |= np.where(placing, masks[:, row], 0).astype(
+                np.uint16
+            )
+        self.boards = padded[:, PIECE_HEIGHT : PIECE_HEIGHT + HEIGHT]
+
+        if hard_drop:
+            self.score += np.where(placing, rules.HARD_DROP_SCORE * distance, 0)
+        else:
+            # The piece touches the ground for one more gravity time before it's frozen
+            self.time += np.where(placing, (distance + 2) * self.gravity_time, 0)
+        self.pieces_placed += placing
+
+        lines_cleared = self.clear_lines(placing)
+
+        if self.mode == "multiplayer":
+            self.handle_garbage(placing, self.attack_table[lines_cleared])
+
+        self.game_over(topped_out, False)
+        self.generate_new_pieces(self.running)
+        return lines_cleared
+
+    def clear_lines(self, games: np.ndarray) -> np.ndarray:
+        """Clears the full lines of the given games and updates the stats accordingly.
+        The full rows of a board are removed in one stable pass which keeps the order of the
+        rest of the rows."""
+        full = (self.boards == FULL_ROW) & games[:, None]
+        lines = full.sum(axis=1)
+        # Sort the full rows to the top, keeping the rest of the rows in order, then empty them
+        order = np.argsort(~full, axis=1, kind="stable")
+        self.boards = np.take_along_axis(self.boards, order, axis=1)
+        self.boards[np.arange(HEIGHT) < lines[:, None]] = 0
+
+        self.lines_cleared += lines
+        # Update the marathon level if needed, with the same check as the engine
+        self.level += rules.level_up(self.lines_cleared, lines)
+        self.score += LINE_CLEAR_TABLE[lines] * (self.level + 1)
+
+        if self.mode == "multiplayer":
+            attack = self.attack_table[lines]
+            self.lines_to_be_sent += attack
+            self.total_attacks += attack
+
+        elif self.mode == "sprint":
+            # If the player had cleared the amount of lines needed, he has won
+            self.game_over(games & (self.lines_cleared >= self.lines_to_finish), True)
+
+        return lines
+
+    def receive_garbage(self, lines: np.ndarray):
+        """Queue garbage lines for every game, they're added when the next piece locks"""
+        self.lines_received += np.asarray(lines, dtype=np.int64)
+
+    def take_lines_to_send(self) -> np.ndarray:
+        """Returns the amount of lines every game has to send since the last time"""
+        lines_to_send = self.lines_to_be_sent
+        self.lines_to_be_sent = np.zeros(self.games, dtype=np.int64)
+        return lines_to_send
+
+    def handle_garbage(self, games: np.ndarray, attack: np.ndarray):
+        """The attack of the lines just cleared cancels out the garbage received first, and the
+        rest of the garbage is added to the grids, like the engine"""
+        cancelled = np.where(games, np.minimum(attack, self.lines_received), 0)
+        self.lines_to_be_sent -= cancelled
+        self.lines_received -= cancelled
+
+        lines = np.where(games, self.lines_received, 0)
+        # Selects a random column to be the garbage's hole, like the engine
+        if self.randomizers is not None:
+            holes = np.zeros(self.games, dtype=np.int64)
+            for game in np.flatnonzero(lines):
+                holes[game] = self.randomizers[game].garbage_hole()
+        else:
+            holes = self.rng.integers(0, WIDTH, self.games)
+        self.game_over(self.add_garbage(lines, holes), False)
+        self.lines_received = np.where(games, 0, self.lines_received)
+
+    def add_garbage(self, lines: np.ndarray, holes: np.ndarray) -> np.ndarray:
+        """Moves every row up and fills the bottom with garbage lines, on every board at once.
+        Returns whether each board had a block pushed out of the top of the grid."""
+        lines = np.clip(np.asarray(lines, dtype=np.int64), 0, HEIGHT)
+        row_indexes = np.arange(HEIGHT)
+        topped_out = ((self.boards != 0) & (row_indexes < lines[:, None])).any(axis=1)
+        source = row_indexes + lines[:, None]
+        garbage_rows = (FULL_ROW & ~(1 << np.asarray(holes, dtype=np.int64))).astype(
+            np.uint16
+        )
+        self.boards = np.where(
+            source < HEIGHT,
+            np.take_along_axis(self.boards, np.minimum(source, HEIGHT - 1), axis=1),
+            garbage_rows[:, None],
+        )
+        return topped_out
+
+    def game_over(self, games: np.ndarray, win: bool = False):
+        """End the given games"""
+        games = games & self.running
+        self.running &= ~games
+        self.win |= games & win
@@ -0,0 +1,84 @@
+from typing import List, Dict
+
+
+class BitboardGrid:
+    """A grid in which every row is stored as a bitmask of its occupied columns"""
+
+    def __init__(self, height: int = 20, width: int = 10):
+        self.height = height
+        self.width = width
+        # A row in which every column is occupied (0x3FF for a 10 blocks wide grid)
+        self.full_row = (1 << width) - 1
+        self.rows: List[int] = [0] * height
+
+    def is_occupied(self, row: int, column: int) -> bool:
+        """Returns whether an object already occupies a given block"""
+        return bool(self.rows[row] >> column & 1)
+
+    def is_a_legal_move(self, position: List[int]) -> bool:
+        """Returns whether a position is inside the grid and isn't occupied"""
+        return (
+            0 <= position[0] < self.height
+            and 0 <= position[1] < self.width
+            and not self.rows[position[0]] >> position[1] & 1
+        )
+
+    def occupy_block(self, block_num):
+        self.rows[block_num[0]] |= 1 << block_num[1]
+
+    def unoccupy_block(self, block_num):
+        self.rows[block_num[0]] &= ~(1 << block_num[1])
+
+    @staticmethod
+    def get_row_masks(position: List[List[int]]) -> Dict[int, int]:
+        """Returns the mask of the columns a position occupies in each of it's rows"""
+        row_masks = {}
+        for pos in position:
+            row_masks[pos[0]] = row_masks.get(pos[0], 0) | 1 << pos[1]
+        return row_masks
+
+    def fits(self, position: List[List[int]]) -> bool:
+        """Returns whether a position can be placed on the grid.
+        Rows above the grid are considered empty, so pieces can stick out of the top."""
+        for pos in position:
+            if not 0 <= pos[1] < self.width:
+                return False
+
+        for row, mask in self.get_row_masks(position).items():
+            if row >= self.height or row >= 0 and self.rows[row] & mask:
+                return False
+        return True
+
+    def freeze_piece(self, piece):
+        """Freezes a piece on the grid"""
+        for row, mask in self.get_row_masks(piece.position).items():
+            self.rows[row] |= mask
+
+    def full_rows(self) -> List[int]:
+        """Returns the indexes of all the rows which should be cleared, from top to bottom"""
+        return [index for index, row in enumerate(self.rows) if row == self.full_row]
+
+    def clear_rows(self, rows_to_clear: List[int]):
+        """Removes the given rows and moves every row above them down"""
+        if not rows_to_clear:
+            return
+        rows_to_clear = set(rows_to_clear)
+        kept_rows = [
+            row for index, row in enumerate(self.rows) if index not in rows_to_clear
+        ]
+        self.rows = [0] * len(rows_to_clear) + kept_rows
+
+    def add_garbage(self, lines: int, hole: int) -> bool:
+        """Moves every row up and fills the bottom with garbage lines.
+        Returns whether any block was pushed out of the top of the grid."""
+        if lines <= 0:
+            return False
+        lines = min(lines, self.height)
+        topped_out = any(self.rows[:lines])
+        garbage_row = self.full_row & ~(1 << hole)
+        self.rows = self.rows[lines:] + [garbage_row] * lines
+        return topped_out
+
+    def clear(self):
+        """Unoccupies every block on the grid"""
+        self.rows = [0] * self.height
@@ -0,0 +1,69 @@
+"""The shape of every piece, shared by the pygame client and the headless engine"""
+from typing import Dict, List, Optional, Tuple
+
+# The position every piece spawns in, as [row, column] of each of it's blocks
+SPAWN_POSITIONS: Dict[str, List[List[int]]] = {
+    "I": [[0, 4], [1, 4], [2, 4], [3, 4]],
+    "J": [[0, 3], [1, 3], [1, 4], [1, 5]],
+    "L": [[0, 5], [1, 5], [1, 4], [1, 3]],
+    "O": [[0, 4], [0, 5], [1, 5], [1, 4]],
+    "S": [[1, 3], [1, 4], [0, 4], [0, 5]],
+    "T": [[0, 4], [1, 3], [1, 4], [1, 5]],
+    "Z": [[0, 3], [0, 4], [1, 4], [1, 5]],
+}
+
+# The index of the block every piece rotates around, the O piece doesn't rotate
+PIVOT_POINTS: Dict[str, Optional[int]] = {
+    "I": 2,
+    "J": 2,
+    "L": 2,
+    "O": None,
+    "S": 1,
+    "T": 2,
+    "Z": 2,
+}
+
+# The matrix which rotates a block's offset from the pivot point 90 degrees clockwise
+CLOCKWISE_TRANSFORMATION_MATRIX = ((0, 1), (-1, 0))
+
+# The moves made, in order, while a rotated piece doesn't fit - TGM style wall kicks.
+# Before every try the piece is moved on from where the last try was, a block at a time and
+# only while it fits, like the arrow keys move it. First in place, then one block left, one
+# right and one more right, then two left. A move into a wall doesn't happen, so the tries
+# after it go further out of the wall - which the I piece needs because of it's pivot point.
+TGM_WALL_KICKS = ((), (-1,), (1,), (1,), (-1, -1))
+
+
+def get_rotation_states(name: str) -> Tuple[Tuple[Tuple[int, int], ...], ...]:
+    """Returns the offsets of every block from the pivot point, in each of the 4 rotation
+    states, starting from the spawn state and going clockwise"""
+    spawn_position = SPAWN_POSITIONS[name]
+    pivot_row, pivot_column = spawn_position[PIVOT_POINTS[name] or 0]
+    offsets = tuple(
+        (row - pivot_row, column - pivot_column) for row, column in spawn_position
+    )
+    matrix = CLOCKWISE_TRANSFORMATION_MATRIX
+
+    rotation_states = []
+    for _ in range(4):
+        rotation_states.append(offsets)
+        offsets = tuple(
+            (
+                matrix[0][0] * row + matrix[0][1] * column,
+                matrix[1][0] * row + matrix[1][1] * column,
+            )
+            for row, column in offsets
+        )
+    return tuple(rotation_states)
+
+
+# The offsets of every piece's blocks in each rotation state - a rotation is a lookup
+ROTATION_STATES: Dict[str, Tuple[Tuple[Tuple[int, int], ...], ...]] = {
+    name: get_rotation_states(name) for name in SPAWN_POSITIONS
+}
+
+# The wall kicks of every piece, the O piece doesn't rotate so it has none
+WALL_KICKS: Dict[str, Tuple[Tuple[int, ...], ...]] = {
+    name: () if PIVOT_POINTS[name] is None else TGM_WALL_KICKS
+    for name in SPAWN_POSITIONS
+}
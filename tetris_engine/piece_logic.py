@@ -0,0 +1,107 @@
+import copy
+from typing import List, Optional
+
+from tetris_engine.bitboard_grid import BitboardGrid
+from tetris_engine.piece_data import (
+    SPAWN_POSITIONS,
+    PIVOT_POINTS,
+    ROTATION_STATES,
+    WALL_KICKS,
+)
+
+
+class PieceLogic:
+    """Moves and rotates a piece on the grid, without anything to do with displaying it"""
+
+    CLOCKWISE = 1
+    COUNTER_CLOCKWISE = -1
+    LEFT = -1
+    RIGHT = 1
+    RIGHT_BORDER = 9
+    LEFT_BORDER = 0
+    LOWER_BORDER = 19
+    NAME: str
+    PIVOT_POINT: Optional[int]
+    position: List[List[int]]
+    # The index of the piece's current rotation state, 0 is the spawn state
+    rotation_state = 0
+
+    def get_spawn_position(self) -> List[List[int]]:
+        """Returns a new copy of the position the piece spawns in"""
+        return copy.deepcopy(SPAWN_POSITIONS[self.NAME])
+
+    def shift(self, direction: int, grid: BitboardGrid) -> bool:
+        """Try and move the piece one block in the given direction, returns whether it moved"""
+        moved_position = [[pos[0], pos[1] + direction] for pos in self.position]
+        # If the move can be executed
+        if grid.fits(moved_position):
+            self.position = moved_position
+            return True
+        return False
+
+    def rotate(self, grid: BitboardGrid, direction: int):
+        """Try and rotate the piece in the given direction, kicking it off the floor and the
+        walls if needed. If no kick fits the piece stays as it was."""
+        wall_kicks = WALL_KICKS[self.NAME]
+        if not wall_kicks:
+            return
+
+        rotation_state = (self.rotation_state + direction) % 4
+        offsets = ROTATION_STATES[self.NAME][rotation_state]
+        pivot_row, pivot_column = self.position[self.PIVOT_POINT]
+        # In case the piece will be underground after the rotation, move it up
+        lowest_row = pivot_row + max(offset[0] for offset in offsets)
+        lift = max(0, lowest_row - self.LOWER_BORDER)
+        pivot_row -= lift
+
+        # The piece as it is, moved by the kicks
+        position = [[row - lift, column] for row, column in self.position]
+        for moves in wall_kicks:
+            for move in moves:
+                moved_position = [[row, column + move] for row, column in position]
+                if grid.fits(moved_position):
+                    position = moved_position
+                    pivot_column += move
+            rotated_position = [
+                [pivot_row + row, pivot_column + column] for row, column in offsets
+            ]
+            if grid.fits(rotated_position):
+                self.position = rotated_position
+                self.rotation_state = rotation_state
+                return
+
+    def gravitate(self, grid: BitboardGrid):
+        """Gravitate the piece"""
+        self.position = self.move_down(grid, self.position)
+
+    def move_down(self, grid: BitboardGrid, position: List[List[int]]):
+        """Try and move the piece one block down"""
+        illegal_move = False
+        old_position = copy.deepcopy(position)
+        changed_position = copy.deepcopy(position)
+        for pos in changed_position:
+            pos[0] += 1
+            if not grid.is_a_legal_move(pos):
+                illegal_move = True
+        if illegal_move:
+            return old_position
+        return changed_position
+
+    def get_lowest_position(self, grid: BitboardGrid):
+        """Returns the lowest position the piece can get to if it retains it's current
+        position on the x axis"""
+        old_position = copy.deepcopy(self.position)
+        changed_position = self.move_down(grid, self.position)
+        while old_position != changed_position:
+            old_position = changed_position
+            changed_position = self.move_down(grid, changed_position)
+        return changed_position
+
+
+class EnginePiece(PieceLogic):
+    """A piece which only exists on the grid, used by the headless engine"""
+
+    def __init__(self, name: str):
+        self.NAME = name
+        self.PIVOT_POINT = PIVOT_POINTS[name]
+        self.position = self.get_spawn_position()
@@ -0,0 +1,78 @@
+import random
+from collections import deque
+from typing import Deque, Dict, List
+
+from tetris_engine import rules
+
+
+class PieceRandomizer:
+    """The source of every random choice in one game - the pieces and the garbage holes.
+    Every randomizer has it's own random state, so games with the same seed get the same pieces
+    no matter what else runs in the process. The pieces and the garbage holes come from
+    separate streams, so garbage received by only one of the players doesn't change the pieces
+    either of them gets."""
+
+    # The amount of pieces generated at a time
+    CHUNK_SIZE = 70
+
+    def __init__(self, seed=None):
+        if seed is None:
+            seed = random.SystemRandom().getrandbits(32)
+        self.seed = seed
+        # String seeds are hashed the same in every process, unlike most other objects
+        self.piece_random = random.Random(f"pieces:{seed}")
+        self.garbage_random = random.Random(f"garbage:{seed}")
+        # The bag the pieces are generated from, according to tetris guideline
+        self.seven_bag: List[str] = []
+        # The pieces which were generated and not drawn yet
+        self.upcoming: Deque[str] = deque()
+        self.pieces_drawn = 0
+        self.holes_drawn = 0
+
+    def generate_chunk(self):
+        """Generates the next chunk of pieces, in the order they're drawn"""
+        for _ in range(self.CHUNK_SIZE):
+            rules.generate_seven_bag(self.seven_bag, self.piece_random)
+            self.upcoming.append(self.seven_bag.pop(0))
+
+    def peek(self, count: int) -> List[str]:
+        """Returns the next pieces to be drawn without drawing them"""
+        while len(self.upcoming) < count:
+            self.generate_chunk()
+        return [self.upcoming[i] for i in range(count)]
+
+    def next_piece(self) -> str:
+        if not self.upcoming:
+            self.generate_chunk()
+        self.pieces_drawn += 1
+        return self.upcoming.popleft()
+
+    def garbage_hole(self) -> int:
+        """Selects a random column to be the garbage's hole"""
+        self.holes_drawn += 1
+        return self.garbage_random.randint(0, rules.GRID_WIDTH - 1)
+
+    def fast_forward(self, pieces: int = 0, holes: int = 0):
+        """Skips the given amount of pieces and garbage holes"""
+        while len(self.upcoming) < pieces:
+            self.generate_chunk()
+        for _ in range(pieces):
+            self.upcoming.popleft()
+        self.pieces_drawn += pieces
+        for _ in range(holes):
+            self.garbage_random.randint(0, rules.GRID_WIDTH - 1)
+        self.holes_drawn += holes
+
+    def to_dict(self) -> Dict:
+        """Returns the randomizer's state, which from_dict brings back in any process"""
+        return {
+            "seed": self.seed,
+            "pieces_drawn": self.pieces_drawn,
+            "holes_drawn": self.holes_drawn,
+        }
+
+    @classmethod
+    def from_dict(cls, state: Dict) -> "PieceRandomizer":
+        randomizer = cls(state["seed"])
+        randomizer.fast_forward(state["pieces_drawn"], state["holes_drawn"])
+        return randomizer
@@ -0,0 +1,201 @@
+"""Input-log replays.
+
+A replay is everything needed to play a game again on the headless engine - the game's settings,
+it's seed, and every input of the player and garbage line received during it, with the time on
+the engine's clock it happened at, and the time the game ended at. The timers aren't recorded,
+the engine runs them again between the inputs - the client runs on the same engine, so they
+fire at the same times there.
+
+The file is a header followed by the events, every number in it a varint:
+    magic, version, mode, seed, lines_or_level + 1 (0 for None), das, arr
+and for every event:
+    ms since the last event, value * 4 + kind
+Strings are their length followed by their utf-8 bytes. Most events take 2 or 3 bytes, so a
+replay of a whole game is a few KB.
+"""
+from typing import Iterator, List, Optional, Tuple
+
+from tetris_engine.tetris_engine import TetrisEngine
+
+MAGIC = 0x54524C  # "TRL"
+VERSION = 2
+
+# The kinds of events, the value of each is what it's about
+PRESS = 0
+RELEASE = 1
+# The game ended, the last event of every replay
+END = 2
+GARBAGE = 3
+
+ACTIONS = (
+    TetrisEngine.LEFT,
+    TetrisEngine.RIGHT,
+    TetrisEngine.DOWN,
+    TetrisEngine.HARD_DROP,
+    TetrisEngine.FLIP_CLOCK,
+    TetrisEngine.FLIP_COUNTERCLOCK,
+)
+
+
+def write_varint(out: bytearray, value: int):
+    """Appends a non-negative number, 7 bits per byte with the high bit marking that more follow"""
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data: bytes, offset: int) -> Tuple[int, int]:
+    """Returns the number at the offset and the offset right after it"""
+    value = 0
+    shift = 0
+    while True:
+        if offset >= len(data):
+            raise ValueError("Replay ended in the middle of a number")
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
+
+
+def write_string(out: bytearray, string: str):
+    encoded = string.encode()
+    write_varint(out, len(encoded))
+    out.extend(encoded)
+
+
+def read_string(data: bytes, offset: int) -> Tuple[str, int]:
+    length, offset = read_varint(data, offset)
+    if offset + length > len(data):
+        raise ValueError("Replay ended in the middle of a string")
+    return data[offset : offset + length].decode(), offset + length
+
+
+class Replay:
+    def __init__(
+        self,
+        mode: str,
+        seed,
+        lines_or_level: Optional[int] = None,
+        das: int = 130,
+        arr: int = 1,
+    ):
+        self.mode = mode
+        # Kept as the string the randomizer hashes, so every process gets the same pieces
+        self.seed = str(seed)
+        self.lines_or_level = lines_or_level
+        self.das = das
+        self.arr = arr
+        # Every event as (ms since the start of the game, kind, value)
+        self.events: List[Tuple[int, int, int]] = []
+
+    def record(self, time: int, kind: int, value: int = 0):
+        # The clock can't go back, even if the events came from another thread
+        if self.events:
+            time = max(time, self.events[-1][0])
+        self.events.append((max(0, int(time)), kind, value))
+
+    def record_press(self, time: int, action: str):
+        self.record(time, PRESS, ACTIONS.index(action))
+
+    def record_release(self, time: int, action: str):
+        self.record(time, RELEASE, ACTIONS.index(action))
+
+    def record_garbage(self, time: int, lines: int):
+        self.record(time, GARBAGE, lines)
+
+    def record_end(self, time: int):
+        if not self.ended:
+            self.record(time, END)
+
+    @property
+    def ended(self) -> bool:
+        return bool(self.events) and self.events[-1][1] == END
+
+    def to_bytes(self) -> bytes:
+        out = bytearray()
+        write_varint(out, MAGIC)
+        write_varint(out, VERSION)
+        write_string(out, self.mode)
+        write_string(out, self.seed)
+        write_varint(out, 0 if self.lines_or_level is None else self.lines_or_level + 1)
+        write_varint(out, self.das)
+        write_varint(out, self.arr)
+        last_time = 0
+        for time, kind, value in self.events:
+            write_varint(out, time - last_time)
+            write_varint(out, value << 2 | kind)
+            last_time = time
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Replay":
+        """Parses a replay, raises ValueError if it isn't a valid one"""
+        magic, offset = read_varint(data, 0)
+        version, offset = read_varint(data, offset)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a replay, or a replay of an unknown version")
+        mode, offset = read_string(data, offset)
+        seed, offset = read_string(data, offset)
+        lines_or_level, offset = read_varint(data, offset)
+        das, offset = read_varint(data, offset)
+        arr, offset = read_varint(data, offset)
+        replay = cls(
+            mode, seed, lines_or_level - 1 if lines_or_level else None, das, arr
+        )
+
+        time = 0
+        while offset < len(data):
+            delta, offset = read_varint(data, offset)
+            code, offset = read_varint(data, offset)
+            kind, value = code & 3, code >> 2
+            if replay.ended:
+                raise ValueError("Events after the end of the game")
+            if kind in (PRESS, RELEASE) and value >= len(ACTIONS):
+                raise ValueError(f"Unknown action {value}")
+            time += delta
+            replay.events.append((time, kind, value))
+        if not replay.ended:
+            raise ValueError("The replay doesn't end")
+        return replay
+
+    def save(self, path: str):
+        with open(path, "wb") as replay_file:
+            replay_file.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str) -> "Replay":
+        with open(path, "rb") as replay_file:
+            return cls.from_bytes(replay_file.read())
+
+    def create_engine(self) -> TetrisEngine:
+        return TetrisEngine(
+            self.mode, self.lines_or_level, self.das, self.arr, self.seed
+        )
+
+    def steps(self, engine: TetrisEngine) -> Iterator[TetrisEngine]:
+        """Plays the replay on the engine one event at a time, running the engine's timers
+        until each event's time before applying it. Yields the engine after every event.
+        """
+        for time, kind, value in self.events:
+            if not engine.running:
+                break
+            engine.advance(time - engine.time)
+            if kind == PRESS:
+                engine.press(ACTIONS[value])
+            elif kind == RELEASE:
+                engine.release(ACTIONS[value])
+            elif kind == GARBAGE:
+                engine.receive_garbage(value)
+            yield engine
+
+    def play(self, engine: Optional[TetrisEngine] = None) -> TetrisEngine:
+        """Runs the replay on the headless engine as fast as possible, and returns the engine
+        in the state the game ended in"""
+        if engine is None:
+            engine = self.create_engine()
+        for _ in self.steps(engine):
+            pass
+        return engine
@@ -0,0 +1,63 @@
+"""The rules of the game, shared by the pygame client and the headless engine"""
+import math
+from typing import List
+
+# The amount of columns of the grid, every garbage line has a hole in one of them
+GRID_WIDTH = 10
+# The first - base - amount of time it takes for a piece to drop one block (in ms)
+GRAVITY_BASE_TIME = 800
+# The amount of time between every block the piece drops while the down key is held (in ms)
+MANUAL_DROP_TIME = 20
+# The score given for every block a piece is dropped
+HARD_DROP_SCORE = 2
+MANUAL_DROP_SCORE = 1
+# The order matters - a seeded bag has to produce the same pieces on every client
+SEVEN_PIECE_SET = ("I", "T", "Z", "S", "L", "J", "O")
+# The score for clearing lines, multiplied by the level + 1
+LINE_CLEAR_SCORES = {1: 40, 2: 100, 3: 300, 4: 1200}
+
+
+def generate_seven_bag(cur_seven_bag: List[str], rng):
+    """Generates a new, or updates the current seven bag, according to the tetris guideline"""
+    seven_piece_set = list(SEVEN_PIECE_SET)
+    # A 7 bag can't contain more than 2 S pieces or Z pieces
+    if cur_seven_bag.count("S") == 2:
+        seven_piece_set.remove("S")
+    if cur_seven_bag.count("Z") == 2:
+        seven_piece_set.remove("Z")
+
+    # Add pieces to the 7 bag until it's in the desired length
+    while len(cur_seven_bag) < 7:
+        cur_seven_bag.append(rng.choice(seven_piece_set))
+
+
+def marathon_gravity_time(level: int) -> int:
+    """Returns the amount of time it takes a piece to drop one block in a given level"""
+    total_time_decrease = 0
+    # Tetris guideline is in frames - thus the numbers in ms will look weird
+    for i in range(level):
+        if i < 9:
+            total_time_decrease += 83
+        if i == 9:
+            total_time_decrease += 33
+        if 9 < i < 29:
+            total_time_decrease += 17
+
+    return GRAVITY_BASE_TIME - total_time_decrease
+
+
+def level_up(lines_cleared: int, new_lines: int) -> bool:
+    """Returns whether the level should go up, given the total amount of lines cleared
+    (including the new lines) and the amount of lines that were just cleared"""
+    return (lines_cleared - new_lines) // 10 < lines_cleared // 10
+
+
+def line_clear_score(lines: int, level: int) -> int:
+    """Returns the score given for clearing an amount of lines at once"""
+    return LINE_CLEAR_SCORES.get(lines, 0) * (level + 1)
+
+
+def attack_lines(lines: int) -> int:
+    """Returns the amount of garbage lines sent to the opponent for clearing lines at once"""
+    # Just a more elegant way to send 1 line for 2 cleared, 2 for 3, and 4 for 4
+    return math.floor((lines / 2) ** 2)
@@ -0,0 +1,397 @@
+from typing import Optional, Dict, List
+
+from tetris_engine import rules
+from tetris_engine.bitboard_grid import BitboardGrid
+from tetris_engine.piece_logic import EnginePiece, PieceLogic
+from tetris_engine.randomizer import PieceRandomizer
+
+
+class TimerLimitExceeded(Exception):
+    """More timers fired than the engine's timer limit allows"""
+
+
+class TetrisEngine:
+    """A game of tetris without any display, audio or event queue.
+    The game's clock only moves when advance is called, so games can be simulated as fast as
+    needed. TetrisGame runs on it too, so a game plays out the same on the client and on the
+    server no matter how the client's frames split the time.
+    Where the game is displayed, the grid and the pieces are created by the subclass."""
+
+    # The actions a player can take, named after the user's controls
+    LEFT = "left"
+    RIGHT = "right"
+    DOWN = "down"
+    HARD_DROP = "hard_drop"
+    FLIP_CLOCK = "flip_clock"
+    FLIP_COUNTERCLOCK = "flip_counterclock"
+
+    # The timers which replace TetrisGame's pygame timer events
+    GRAVITY_TIMER = "gravity"
+    MANUAL_DROP_TIMER = "manual_drop"
+    DAS_TIMER = "das"
+    ARR_TIMER = "arr"
+
+    def __init__(
+        self,
+        mode: str = "marathon",
+        lines_or_level: Optional[int] = None,
+        das: int = 130,
+        arr: int = 1,
+        seed=None,
+    ):
+        self.mode = mode
+        # The user's DAS and ARR settings (in ms)
+        self.das = das
+        self.arr = arr
+        self.randomizer = PieceRandomizer(seed)
+        self.grid = self.create_grid()
+        # Every input is recorded to it if set, e.g. a Replay
+        self.recorder = None
+        # The current piece the player is controlling
+        self.cur_piece: Optional[EnginePiece] = None
+        # The game's clock (in ms since the start of the game)
+        self.time = 0
+        # Every running timer's name, mapped to it's [firing time, interval, repeat]
+        self.timers: Dict[str, List] = {}
+        # The amount of timers that fired since the start of the game
+        self.timers_fired = 0
+        # If set, advance raises TimerLimitExceeded once more timers than this fired, so a game
+        # played from an untrusted replay can't run for too long
+        self.timer_limit: Optional[int] = None
+        self.timer_handlers = {
+            self.GRAVITY_TIMER: self.gravitate,
+            self.MANUAL_DROP_TIMER: self.manual_drop,
+            self.DAS_TIMER: self.start_arr,
+            self.ARR_TIMER: self.start_das,
+        }
+        self.action_handlers = {
+            self.LEFT: self.key_left,
+            self.RIGHT: self.key_right,
+            self.DOWN: self.key_down,
+            self.FLIP_CLOCK: self.key_flip_clock,
+            self.FLIP_COUNTERCLOCK: self.key_flip_counterclock,
+        }
+        # The current time it takes a piece to drop one block
+        self.gravity_time = rules.GRAVITY_BASE_TIME
+        # Game stats
+        self.lines_cleared = 0
+        self.total_attacks = 0
+        self.level = 0
+        self.score = 0
+        self.pieces_placed = 0
+        # Whether the current piece should be frozen
+        self.should_freeze = False
+        # How many 'gravity_time's the current piece touched the ground without being frozen
+        self.times_touching_ground = 0
+        # Every variable that has to do with moving the pieces
+        self.move_variables: Dict[str, bool] = {
+            "right_das": False,
+            "left_das": False,
+            "arr": False,
+            "key_down": False,
+            "manual_drop": False,
+        }
+        self.running = True
+        self.win = False
+
+        if self.mode == "sprint":
+            self.lines_to_finish = lines_or_level
+        if self.mode == "marathon":
+            self.level = lines_or_level or 0
+            self.gravity_time = rules.marathon_gravity_time(self.level)
+        if self.mode == "multiplayer":
+            self.lines_to_be_sent = 0
+            self.lines_received = 0
+
+        self.set_timer(self.GRAVITY_TIMER, self.gravity_time, repeat=True)
+        self.generate_new_piece()
+        self.update_should_freeze()
+
+    def create_grid(self) -> BitboardGrid:
+        return BitboardGrid()
+
+    def create_piece(self, name: str) -> PieceLogic:
+        return EnginePiece(name)
+
+    def set_timer(self, name: str, interval: int, repeat: bool = False):
+        """Start a timer which fires after the given interval, replacing the last one with
+        the same name"""
+        # A timer that fires without the clock moving would never let advance finish
+        interval = max(1, interval)
+        self.timers[name] = [self.time + interval, interval, repeat]
+
+    def stop_timer(self, name: str):
+        self.timers.pop(name, None)
+
+    def advance(self, ms: int):
+        """Move the game's clock forward, firing every timer that's due on the way"""
+        end_time = self.time + ms
+        while self.running and self.timers:
+            name = min(self.timers, key=lambda timer: self.timers[timer][0])
+            fire_time, interval, repeat = self.timers[name]
+            if fire_time > end_time:
+                break
+
+            self.time = fire_time
+            self.timers_fired += 1
+            if self.timer_limit is not None and self.timers_fired > self.timer_limit:
+                raise TimerLimitExceeded(f"More than {self.timer_limit} timers fired")
+            if repeat:
+                self.timers[name][0] += interval
+            else:
+                self.timers.pop(name)
+            self.timer_handlers[name]()
+            self.update_should_freeze()
+
+        self.time = end_time
+
+    def press(self, action: str):
+        """Handle a key press and call the relevant functions"""
+        if not self.running:
+            return
+
+        if self.recorder:
+            self.recorder.record_press(self.time, action)
+        if action == self.HARD_DROP:
+            self.hard_drop()
+        elif self.cur_piece:
+            self.action_handlers[action]()
+        self.update_should_freeze()
+
+    def release(self, action: str):
+        """In case a key is released change the relevant move variables"""
+        if not self.running:
+            return
+
+        if self.recorder:
+            self.recorder.record_release(self.time, action)
+        if action == self.DOWN:
+            self.move_variables["manual_drop"] = False
+            self.stop_timer(self.MANUAL_DROP_TIMER)
+        # When we've released a move button, check if we've activated the other direction's das
+        # before completely stopping all move variables.
+        elif (
+            action == self.RIGHT
+            and not self.move_variables["left_das"]
+            or action == self.LEFT
+            and not self.move_variables["right_das"]
+        ):
+            self.reset_move_variables()
+
+    def reset_move_variables(self):
+        for key in self.move_variables:
+            self.move_variables[key] = False
+        self.stop_timer(self.MANUAL_DROP_TIMER)
+        self.stop_timer(self.DAS_TIMER)
+        self.stop_timer(self.ARR_TIMER)
+
+    def key_down(self):
+        """Turn on the manual drop"""
+        self.move_variables["manual_drop"] = True
+        if self.MANUAL_DROP_TIMER not in self.timers:
+            self.set_timer(self.MANUAL_DROP_TIMER, rules.MANUAL_DROP_TIME, repeat=True)
+
+    def key_right(self):
+        """Move the piece one block to the right and start the DAS timer"""
+        self.start_move(self.cur_piece.RIGHT, "right_das")
+
+    def key_left(self):
+        """Move the piece one block to the left and start the DAS timer"""
+        self.start_move(self.cur_piece.LEFT, "left_das")
+
+    def start_move(self, direction: int, das_variable: str):
+        self.reset_move_variables()
+        self.set_timer(self.DAS_TIMER, self.das)
+        self.move_variables["key_down"] = True
+        self.move_variables[das_variable] = True
+        self.cur_piece.shift(direction, self.grid)
+
+    def key_flip_clock(self):
+        """Rotate the piece clockwise"""
+        self.cur_piece.rotate(self.grid, self.cur_piece.CLOCKWISE)
+        self.resume_arr()
+
+    def key_flip_counterclock(self):
+        """Rotate the piece counter-clockwise"""
+        self.cur_piece.rotate(self.grid, self.cur_piece.COUNTER_CLOCKWISE)
+        self.resume_arr()
+
+    def start_arr(self):
+        """The DAS has passed while the key is still held, start repeating the move"""
+        if self.move_variables["key_down"]:
+            self.move_variables["arr"] = True
+            self.start_das()
+
+    def start_das(self):
+        """Move the piece once more in the held direction"""
+        if self.move_variables["arr"] and self.cur_piece:
+            if self.move_variables["right_das"]:
+                self.repeat_shift(self.cur_piece.RIGHT)
+            elif self.move_variables["left_das"]:
+                self.repeat_shift(self.cur_piece.LEFT)
+
+    def repeat_shift(self, direction: int):
+        # An ARR of 0 moves the piece all the way to the wall at once
+        if self.arr == 0:
+            while self.cur_piece.shift(direction, self.grid):
+                pass
+        # Once the piece is stuck the ARR waits for it to move some other way
+        elif self.cur_piece.shift(direction, self.grid):
+            self.set_timer(self.ARR_TIMER, self.arr)
+
+    def resume_arr(self):
+        """The piece moved, so a held direction may be able to move it again"""
+        if self.move_variables["arr"] and self.ARR_TIMER not in self.timers:
+            self.set_timer(self.ARR_TIMER, self.arr)
+
+    def manual_drop(self):
+        """Drop the piece manually one block down"""
+        if self.move_variables["manual_drop"]:
+            self.score += rules.MANUAL_DROP_SCORE
+            if not self.should_freeze:
+                self.gravitate()
+
+    def hard_drop(self):
+        """Hard drop a piece - move it all the way to the ground and freeze it"""
+        if not self.cur_piece:
+            return
+        # If the piece should already be frozen
+        if not self.should_freeze:
+            # Gravitate the piece until it hits the ground
+            while True:
+                self.cur_piece.gravitate(self.grid)
+                self.score += rules.HARD_DROP_SCORE
+                if self.should_freeze_piece():
+                    break
+        self.lock_piece()
+
+    def gravitate(self):
+        """Gravitate the current piece one block down"""
+        # If the piece doesn't need to be frozen gravitate it down
+        if not self.should_freeze and self.cur_piece:
+            self.cur_piece.gravitate(self.grid)
+            self.resume_arr()
+        # In order to give the player time to react and move the piece, the piece needs to gravitate
+        # down while touching the ground at least once before it's frozen
+        elif self.times_touching_ground > 0:
+            self.times_touching_ground = 0
+            self.lock_piece()
+        else:
+            self.times_touching_ground += 1
+
+    def lock_piece(self):
+        """Freeze the current piece, clear the full lines and bring in the next piece"""
+        self.grid.freeze_piece(self.cur_piece)
+        self.cur_piece = None
+        self.should_freeze = False
+        self.pieces_placed += 1
+        attack = self.clear_lines()
+
+        if self.mode == "multiplayer":
+            self.handle_garbage(attack)
+
+        if self.running:
+            self.generate_new_piece()
+
+    def clear_lines(self) -> int:
+        """Clear the lines needed to be cleared and update the stats accordingly.
+        Returns the amount of lines the clear attacks with."""
+        lines_cleared = self.grid.full_rows()
+        self.lines_cleared += len(lines_cleared)
+
+        # Update the marathon level if needed
+        if rules.level_up(self.lines_cleared, len(lines_cleared)):
+            self.level += 1
+
+        self.clear_rows(lines_cleared)
+        self.score += rules.line_clear_score(len(lines_cleared), self.level)
+        attack = 0
+
+        if self.mode == "multiplayer":
+            attack = rules.attack_lines(len(lines_cleared))
+            self.lines_to_be_sent += attack
+            self.total_attacks += attack
+
+        elif self.mode == "marathon":
+            gravity_time = rules.marathon_gravity_time(self.level)
+            # In case the player has advanced a level - i.e. the gravity time has changed
+            if self.gravity_time != gravity_time:
+                self.gravity_time = gravity_time
+                self.set_timer(self.GRAVITY_TIMER, self.gravity_time, repeat=True)
+
+        elif self.mode == "sprint" and self.lines_cleared >= self.lines_to_finish:
+            # If the player had cleared the amount of lines needed, he has won
+            self.game_over(True)
+
+        return attack
+
+    def clear_rows(self, rows: List[int]):
+        """Removes the full rows from the grid"""
+        self.grid.clear_rows(rows)
+
+    def receive_garbage(self, lines: int):
+        """Queue garbage lines sent by the opponent, they're added when the next piece locks"""
+        if not self.running or lines <= 0:
+            return
+
+        if self.recorder:
+            self.recorder.record_garbage(self.time, lines)
+        self.lines_received += lines
+
+    def take_lines_to_send(self) -> int:
+        """Returns the amount of lines to send to the opponent since the last time"""
+        lines_to_send = self.lines_to_be_sent
+        self.lines_to_be_sent = 0
+        return lines_to_send
+
+    def handle_garbage(self, attack: int):
+        """The attack of the lines just cleared cancels out the garbage received first, and the
+        rest of the garbage is added to the grid. Only the attack of the piece that locked
+        cancels, so it doesn't matter how often the lines to send are taken."""
+        cancelled = min(attack, self.lines_received)
+        self.lines_to_be_sent -= cancelled
+        self.lines_received -= cancelled
+
+        if self.lines_received > 0:
+            self.add_garbage(self.lines_received)
+            self.lines_received = 0
+
+    def add_garbage(self, lines: int):
+        """Add garbage lines to the grid right away"""
+        hole = self.randomizer.garbage_hole()
+        if self.grid.add_garbage(lines, hole):
+            self.game_over(False)
+
+    def generate_new_piece(self):
+        """Generate a new current piece and update every variable that has to do with it"""
+        self.reset_move_variables()
+        self.cur_piece = self.create_piece(self.randomizer.next_piece())
+
+    def update_should_freeze(self):
+        if self.running and self.cur_piece:
+            self.should_freeze = self.should_freeze_piece()
+
+    def should_freeze_piece(self) -> bool:
+        """Returns whether the current piece can, and should, be frozen"""
+        for pos in self.cur_piece.position:
+            if pos[0] >= self.cur_piece.LOWER_BORDER:
+                return True
+
+            elif self.grid.is_occupied(pos[0] + 1, pos[1]) or self.grid.is_occupied(
+                pos[0], pos[1]
+            ):
+                # The stack reached the top of the grid
+                if pos[0] <= 0:
+                    self.game_over(False)
+                return True
+        return False
+
+    def game_over(self, win: bool = False):
+        """End the game"""
+        self.running = False
+        self.win = win
+        self.timers = {}
+
+    def get_current_time_since_start(self) -> float:
+        """Returns the amount of time in seconds since the game started"""
+        return self.time / 1000